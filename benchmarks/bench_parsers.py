@@ -0,0 +1,71 @@
+"""
+Benchmark of the parser backends on saved subcategory pages.
+
+Usage:
+    python benchmarks/bench_parsers.py [PAGE ...] [--repeat N] [--cards N]
+
+The pages can be HTML files or gzip bodies of the response cache (data/.cache/bodies/**/*.gz).
+Without pages, a synthetic listing is built by repeating the product cards of the test fixture.
+"""
+import argparse
+import gzip
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+from parsers import PARSER_BACKENDS
+
+FIXTURE_PATH = os.path.join(os.path.dirname(__file__), '..', 'tests', 'fixtures', 'subcategory_page.html')
+BASE_URL = "https://www.compraonline.bonpreuesclat.cat"
+
+
+def read_page(path) -> str:
+    """Reads a saved page, decompressing it if it is a cached gzip body."""
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8') as f:
+        return f.read()
+
+
+def synthetic_page(n_cards) -> str:
+    """Builds a listing page with `n_cards` product cards taken from the test fixture."""
+    html = read_page(FIXTURE_PATH)
+    start = html.index('<div class="product-card-container">')
+    end = html.index('</div>\n  </main>')
+    cards = re.findall(r'<div class="product-card-container">.*?\n      </div>\n', html[start:end], re.S)
+    return html[:start] + ''.join(cards[i % len(cards)] for i in range(n_cards)) + html[end:]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark of the parser backends.')
+    parser.add_argument('pages', nargs='*', help='Saved subcategory pages (HTML or cached .gz bodies).')
+    parser.add_argument('--repeat', type=int, default=20, help='Number of times every page is parsed (default: 20).')
+    parser.add_argument('--cards', type=int, default=600, help='Product cards of the synthetic page (default: 600).')
+    args = parser.parse_args()
+
+    pages = [read_page(path) for path in args.pages] if args.pages else [synthetic_page(args.cards)]
+    print(f"{len(pages)} pages, {sum(len(page) for page in pages) / 1e6:.1f} MB, {args.repeat} repetitions")
+
+    reference = None
+    timings = {}
+    for name, extract_products in PARSER_BACKENDS.items():
+        products = [extract_products(page, BASE_URL) for page in pages]
+        if reference is None:
+            reference = products
+        elif products != reference:
+            print(f"Warning: the {name} backend extracts different products")
+
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            for page in pages:
+                extract_products(page, BASE_URL)
+        timings[name] = (time.perf_counter() - start) / (args.repeat * len(pages))
+
+    slowest = max(timings.values())
+    for name, seconds in timings.items():
+        print(f"{name:>10}: {seconds * 1000:8.2f} ms/page  ({slowest / seconds:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+"""
+End-to-end benchmark of the scraper: runs the full main.py pipeline against the local fixture site
+and reports pages/s, products/s, peak RSS and the wall-clock and CPU time of every stage.
+
+Every run is a separate process, so its peak RSS and CPU time are measured on their own.
+The results are saved as JSON with the commit they were measured on, and can be compared
+with the results of another commit.
+
+Usage:
+    python benchmarks/bench_pipeline.py [--categories Frescos ...] [--breadth 3] [--depth 2] [--cards 40]
+                                        [--page-kb 200] [--latency 0.02] [--workers 8] [--repeat 3]
+                                        [--output results.json] [--compare baseline.json] [-- MAIN_OPTIONS ...]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from fixture_site import FixtureSite, FixtureServer
+
+SRC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+# Metrics compared across commits, and whether higher values are better
+SUMMARY_METRICS = {
+    'wall_seconds': False,
+    'pages_per_second': True,
+    'products_per_second': True,
+    'cpu_seconds': False,
+    'peak_rss_mb': False,
+}
+
+
+def git_commit() -> str:
+    """Short hash of the current commit, with a "+" if the tree has uncommitted changes."""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                check=True, cwd=SRC_DIR).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], capture_output=True,
+                               text=True, cwd=SRC_DIR).stdout.strip()
+        return commit + ('+' if dirty else '')
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_pipeline(base_url, categories, workers, main_options) -> dict:
+    """
+    Runs main.py in a child process against the fixture site.
+
+    Returns:
+        dict: Wall time, CPU time and peak RSS of the process, and the metrics report of the run.
+    """
+    with tempfile.TemporaryDirectory() as data_dir:
+        report_path = os.path.join(data_dir, 'metrics.json')
+        command = [sys.executable, 'main.py', '--base-url', base_url, '--category', *categories,
+                   '--workers', str(workers), '--rate', '0', '--no-cache', '--data-dir', data_dir,
+                   '--metrics-report', report_path, '--log-level', 'WARNING', *main_options]
+        start = time.perf_counter()
+        process = subprocess.Popen(command, cwd=SRC_DIR, stdout=subprocess.DEVNULL)
+        # wait4 gives the resource usage of this child only
+        _, status, usage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(status)
+        wall_seconds = time.perf_counter() - start
+        if process.returncode:
+            raise subprocess.CalledProcessError(process.returncode, command)
+        with open(report_path) as f:
+            report = json.load(f)
+
+    # The throughput is measured over the crawl, without the start-up of the interpreter
+    return {
+        'wall_seconds': round(wall_seconds, 3),
+        'pages_per_second': report['throughput']['pages_per_second'],
+        'products_per_second': report['throughput']['products_per_second'],
+        'cpu_seconds': round(usage.ru_utime + usage.ru_stime, 3),
+        # ru_maxrss is in kilobytes on Linux
+        'peak_rss_mb': round(usage.ru_maxrss / 1024, 1),
+        'counters': report['counters'],
+        'stages': {stage: {key: values[key] for key in ('count', 'total_seconds', 'cpu_seconds', 'p50_seconds', 'p95_seconds')}
+                   for stage, values in report['stages'].items()},
+    }
+
+
+def summarize(runs) -> dict:
+    """Median of every summary metric and of the time of every stage across the runs."""
+    summary = {metric: statistics.median(run[metric] for run in runs) for metric in SUMMARY_METRICS}
+    stages = sorted({stage for run in runs for stage in run['stages']})
+    summary['stages'] = {
+        stage: {key: statistics.median(run['stages'].get(stage, {}).get(key, 0) for run in runs)
+                for key in ('total_seconds', 'cpu_seconds')}
+        for stage in stages
+    }
+    return summary
+
+
+def print_summary(summary, baseline=None):
+    """Prints the summary, with the change relative to the baseline if given."""
+    def change(value, reference, higher_is_better=False):
+        if not reference:
+            return ""
+        relative = (value - reference) / reference
+        verdict = "better" if (relative > 0) == higher_is_better else "worse"
+        return f"  ({relative * 100:+.1f}%, {verdict})" if abs(relative) >= 0.005 else "  (=)"
+
+    reference = baseline['summary'] if baseline else {}
+    if baseline:
+        print(f"Compared with {baseline.get('commit')} ({baseline.get('date')}):")
+    for metric, higher_is_better in SUMMARY_METRICS.items():
+        print(f"{metric:>20}: {summary[metric]:10.2f}{change(summary[metric], reference.get(metric), higher_is_better)}")
+    print(f"{'stage':>20}  {'wall (s)':>10}  {'cpu (s)':>10}")
+    for stage, values in summary['stages'].items():
+        reference_stage = reference.get('stages', {}).get(stage, {})
+        print(f"{stage:>20}  {values['total_seconds']:10.3f}  {values['cpu_seconds']:10.3f}"
+              f"{change(values['total_seconds'], reference_stage.get('total_seconds'))}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='End-to-end benchmark of the scraper against a local fixture site.')
+    parser.add_argument('--categories', nargs='+', default=['Frescos'], help='Categories to scrape (default: Frescos).')
+    parser.add_argument('--breadth', type=int, default=3, help='Subcategories of every menu (default: 3).')
+    parser.add_argument('--depth', type=int, default=2, help='Subcategory levels below the categories (default: 2).')
+    parser.add_argument('--cards', type=int, default=40, help='Products of every listing page (default: 40).')
+    parser.add_argument('--page-kb', type=int, default=0, help='Kilobytes of filler added to every page (default: 0).')
+    parser.add_argument('--latency', type=float, default=0.02, help='Seconds every response is delayed (default: 0.02).')
+    parser.add_argument('--jitter', type=float, default=0, help='Maximum random seconds added to the latency (default: 0).')
+    parser.add_argument('--workers', type=int, default=8, help='Value of the --workers option of main.py (default: 8).')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of runs, the median is reported (default: 3).')
+    parser.add_argument('--output', type=str, help='Save the results to this JSON file.')
+    parser.add_argument('--compare', type=str, help='JSON results of a previous benchmark to compare with.')
+    parser.add_argument('main_options', nargs=argparse.REMAINDER,
+                        help='Other options of main.py, after "--" (e.g. -- --parser bs4 --output-format parquet).')
+    args = parser.parse_args()
+    main_options = [option for option in args.main_options if option != '--']
+
+    site = FixtureSite(categories=args.categories, breadth=args.breadth, depth=args.depth,
+                       cards=args.cards, page_kb=args.page_kb)
+    settings = {key: value for key, value in vars(args).items() if key not in ('output', 'compare', 'main_options')}
+    settings['main_options'] = main_options
+    print(f"{len(args.categories)} categories, {site.n_listing_pages} listing pages "
+          f"of {args.cards} products, {args.latency * 1000:.0f} ms latency, {args.workers} workers")
+
+    runs = []
+    with FixtureServer(site, latency=args.latency, jitter=args.jitter) as server:
+        for i in range(args.repeat):
+            runs.append(run_pipeline(server.url, args.categories, args.workers, main_options))
+            print(f"Run {i + 1}/{args.repeat}: {runs[-1]['wall_seconds']:.2f} s, "
+                  f"{runs[-1]['counters'].get('products', 0)} products")
+
+    results = {
+        'commit': git_commit(),
+        'date': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'python': sys.version.split()[0],
+        'settings': settings,
+        'summary': summarize(runs),
+        'runs': runs,
+    }
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline.get('settings') != settings:
+            print("Warning: the baseline was measured with different settings.")
+    print_summary(results['summary'], baseline)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results saved to {args.output}.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,302 @@
+"""
+Local copy of the Bonpreu website, served over HTTP for the benchmarks.
+
+The synthetic site has the same markup as the real one (navigation menu, subcategory menus, product cards
+and product detail pages), with a tunable category tree, number of products per page and page size.
+The recorded site serves the pages stored in the response cache of a previous crawl instead.
+
+Usage:
+    python benchmarks/fixture_site.py [--port 8000] [--breadth 3] [--depth 2] [--cards 40] [--page-kb 0] [--latency 0.05]
+    python benchmarks/fixture_site.py --recorded data/.cache [--port 8000]
+"""
+import argparse
+import hashlib
+import html
+import os
+import random
+import re
+import sys
+import threading
+import time
+import unicodedata
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+from scraper import BonpreuScraper
+
+LIVE_BASE_URL = "https://www.compraonline.bonpreuesclat.cat"
+
+PAGE_TEMPLATE = """<!DOCTYPE html>
+<html lang="ca">
+<head>
+  <meta charset="utf-8">
+  <title>{title} | Bonpreu i Esclat</title>
+</head>
+<body>
+  <header>
+    <ul id="nav-menu" aria-labelledby="nav-menu-button" role="menu" class="sc-1w5m3ly-0 aIFnR">
+      <li><a href="/categories">Supermercat</a></li>
+      <li><a href="/offers">Ofertes</a></li>
+    </ul>
+  </header>
+  <main>
+{menu}    <div class="sc-grid product-list">
+{cards}    </div>
+  </main>
+  <footer><a href="/help">Ajuda</a></footer>
+{padding}</body>
+</html>
+"""
+
+MENU_TEMPLATE = """    <div class="sc-1wz1hmv-0 cmTtoc">
+{links}    </div>
+"""
+
+CARD_TEMPLATE = """      <div class="product-card-container">
+        <div class="image"><a aria-label="{name}" href="/products/{slug}/{product_id}"><img src="/img/{product_id}.jpg" alt=""></a></div>
+        <div class="details">
+          <a href="/products/{slug}/{product_id}">{name}</a>
+          <span class="_text_16wi0_1 _text--m_16wi0_23 sc-1fkdssq-0 bwsVzh">{price}&nbsp;€</span>
+          <span class="_text_16wi0_1 _text--m_16wi0_23 sc-1sjeki5-0 asqfi">{quantity}</span>
+        </div>
+      </div>
+"""
+
+PRODUCT_TEMPLATE = """<!DOCTYPE html>
+<html lang="ca">
+<head>
+  <meta charset="utf-8">
+  <title>Producte {product_id} | Bonpreu i Esclat</title>
+  <script type="application/ld+json">{{"@context": "https://schema.org", "@type": "Product", "gtin13": "{ean}", "brand": {{"@type": "Brand", "name": "{brand}"}}}}</script>
+</head>
+<body>
+  <main>
+    <span class="_text_16wi0_1 _text--s_16wi0_13">{unit_price}&nbsp;€/kg</span>
+  </main>
+{padding}</body>
+</html>
+"""
+
+PRODUCT_WORDS = ["Poma", "Pera", "Llet", "Formatge", "Iogurt", "Oli", "Arròs", "Cafè", "Aigua", "Vi", "Pa", "Tomàquet"]
+QUANTITIES = ["1kg", "0.5kg", "250g", "1L", "0.75L", "33cl", "6 x 1L", "4 x 125g", "12 per paquet"]
+
+
+def _slugify(text) -> str:
+    """Converts a name to the lowercase ASCII form used in the URLs."""
+    text = unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode('ascii')
+    return re.sub(r'[^a-z0-9]+', '-', text.lower()).strip('-')
+
+
+class FixtureSite():
+    """
+    Synthetic copy of the website. Every page is generated from its path, so the same settings
+    always give the same site and the results of the benchmarks can be compared across commits.
+
+    Attributes:
+        categories (list): Names of the categories.
+        breadth (int): Number of subcategories of every menu.
+        depth (int): Number of subcategory levels below the categories (1 to 4).
+        cards (int): Number of product cards of every listing page.
+        page_kb (int): Kilobytes of filler added to every page, to mimic the size of the real pages.
+        seed (int): Seed of the generated prices and quantities.
+    """
+    def __init__(self, categories=None, breadth=3, depth=2, cards=40, page_kb=0, seed=0):
+        if not 1 <= depth <= BonpreuScraper.max_subcat_depth:
+            raise ValueError(f"The depth must be between 1 and {BonpreuScraper.max_subcat_depth}.")
+        self.categories = categories or BonpreuScraper.categories()
+        self.breadth = breadth
+        self.depth = depth
+        self.cards = cards
+        self.page_kb = page_kb
+        self.seed = seed
+        self._category_slugs = {_slugify(category): category for category in self.categories}
+        self._padding = self._filler(page_kb)
+
+    @property
+    def n_listing_pages(self) -> int:
+        """Number of leaf pages with products of the whole site."""
+        return len(self.categories) * self.breadth ** self.depth
+
+    @staticmethod
+    def _filler(page_kb) -> str:
+        """Inline script of about `page_kb` kilobytes, like the scripts and styles of the real pages."""
+        if not page_kb:
+            return ""
+        line = "  window.__tracking__.push({\"event\": \"view\", \"id\": 0});\n"
+        return "<script>\n" + line * (page_kb * 1024 // len(line)) + "</script>\n"
+
+    def _page(self, title, links=None, cards=""):
+        menu = MENU_TEMPLATE.format(links="".join(f'      <a href="{href}">{html.escape(text)}</a>\n'
+                                                  for text, href in links)) if links else ""
+        return PAGE_TEMPLATE.format(title=html.escape(title), menu=menu, cards=cards, padding=self._padding)
+
+    def _cards(self, path) -> str:
+        """Product cards of a listing page, generated from its path."""
+        rng = random.Random(f"{self.seed}:{path}")
+        cards = []
+        for i in range(self.cards):
+            product_id = int(hashlib.md5(f"{path}:{i}".encode()).hexdigest()[:6], 16)
+            name = f"{rng.choice(PRODUCT_WORDS)} {rng.choice(PRODUCT_WORDS).lower()} {product_id % 1000}"
+            price = f"{rng.uniform(0.3, 30):.2f}".replace('.', ',')
+            cards.append(CARD_TEMPLATE.format(name=html.escape(name), slug=_slugify(name), product_id=f"{product_id:08d}",
+                                              price=price, quantity=rng.choice(QUANTITIES)))
+        return "".join(cards)
+
+    def page(self, path) -> str:
+        """
+        Gets a page of the site.
+
+        Args:
+            path (str): Path of the page (e.g. "/categories/frescos/0/1").
+
+        Returns:
+            str: HTML content of the page, or None if the page does not exist.
+        """
+        parts = [part for part in path.split('?')[0].split('/') if part]
+        if not parts:
+            return self._page("Inici")
+        if parts[0] == "products" and len(parts) == 3 and parts[2].isdigit():
+            rng = random.Random(f"{self.seed}:{parts[2]}")
+            return PRODUCT_TEMPLATE.format(product_id=parts[2], ean=f"84{int(parts[2]):011d}", brand=rng.choice(PRODUCT_WORDS),
+                                           unit_price=f"{rng.uniform(0.5, 50):.2f}".replace('.', ','), padding=self._padding)
+        if parts[0] != "categories":
+            return None
+        if len(parts) == 1:
+            return self._page("Supermercat", [(category, f"/categories/{slug}")
+                                              for slug, category in self._category_slugs.items()])
+        if parts[1] not in self._category_slugs or not all(part.isdigit() and int(part) < self.breadth for part in parts[2:]):
+            return None
+
+        level = len(parts) - 2
+        if level > self.depth:
+            return None
+        title = self._category_slugs[parts[1]] if level == 0 else f"Subcategoria {'.'.join(parts[2:])}"
+        base_path = "/" + "/".join(parts)
+        if level < self.depth:
+            prefix = "" if level == 0 else f"{'.'.join(parts[2:])}."
+            return self._page(title, [(f"Subcategoria {prefix}{i}", f"{base_path}/{i}") for i in range(self.breadth)])
+        return self._page(title, cards=self._cards(base_path))
+
+
+class RecordedSite():
+    """
+    Recorded copy of the website: serves the pages stored in the response cache of a previous crawl.
+
+    Attributes:
+        cache (ResponseCache): Cache of the recorded crawl, opened in offline mode.
+        base_url (str): Main URL of the recorded website.
+    """
+    def __init__(self, cache_dir, base_url=LIVE_BASE_URL):
+        from response_cache import ResponseCache
+        self.cache = ResponseCache(cache_dir, offline=True)
+        self.base_url = base_url
+
+    def page(self, path) -> str:
+        entry = self.cache.lookup(self.base_url + (path if path != "/" else ""))
+        if entry is None:
+            return None
+        return entry.body.decode(entry.encoding or 'utf-8', errors='replace')
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        if server.latency or server.jitter:
+            time.sleep(server.latency + random.uniform(0, server.jitter))
+        page = server.site.page(self.path)
+        body = (page if page is not None else "Not found").encode('utf-8')
+        self.send_response(200 if page is not None else 404)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        with server.lock:
+            server.requests += 1
+            server.bytes_sent += len(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FixtureServer():
+    """
+    Threaded HTTP server of a fixture site, with a simulated network latency.
+
+    Attributes:
+        site (FixtureSite | RecordedSite): Site served.
+        latency (float): Seconds every response is delayed.
+        jitter (float): Maximum random seconds added to the latency.
+    """
+    def __init__(self, site, host="127.0.0.1", port=0, latency=0, jitter=0):
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        self._server.site = site
+        self._server.latency = latency
+        self._server.jitter = jitter
+        self._server.lock = threading.Lock()
+        self._server.requests = 0
+        self._server.bytes_sent = 0
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def requests(self) -> int:
+        """Number of requests served."""
+        return self._server.requests
+
+    @property
+    def bytes_sent(self) -> int:
+        """Number of body bytes sent."""
+        return self._server.bytes_sent
+
+    def start(self):
+        """Starts serving in a background thread."""
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stops the server."""
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve a local copy of the Bonpreu website.')
+    parser.add_argument('--port', type=int, default=8000, help='Port of the server (default: 8000).')
+    parser.add_argument('--breadth', type=int, default=3, help='Subcategories of every menu (default: 3).')
+    parser.add_argument('--depth', type=int, default=2, help='Subcategory levels below the categories (default: 2).')
+    parser.add_argument('--cards', type=int, default=40, help='Products of every listing page (default: 40).')
+    parser.add_argument('--page-kb', type=int, default=0, help='Kilobytes of filler added to every page (default: 0).')
+    parser.add_argument('--latency', type=float, default=0, help='Seconds every response is delayed (default: 0).')
+    parser.add_argument('--jitter', type=float, default=0, help='Maximum random seconds added to the latency (default: 0).')
+    parser.add_argument('--recorded', type=str, metavar='CACHE_DIR',
+                        help='Serve the pages of the response cache of a previous crawl instead of a synthetic site.')
+    args = parser.parse_args()
+
+    site = RecordedSite(args.recorded) if args.recorded else \
+        FixtureSite(breadth=args.breadth, depth=args.depth, cards=args.cards, page_kb=args.page_kb)
+    server = FixtureServer(site, port=args.port, latency=args.latency, jitter=args.jitter)
+    print(f"Serving the fixture site on {server.url} (Ctrl+C to stop).")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server._server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,445 @@
+import argparse
+import csv
+import json
+import logging
+import warnings
+from itertools import chain
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from logging_config import configure_logging
+from sinks import COLUMNS, LEGACY_COLUMNS, DEFAULT_DATA_DIR, PRODUCT_ID_PATTERN, snapshot_files
+
+logger = logging.getLogger(__name__)
+
+# Version of the format of the cached days, increased when it changes so old caches are rebuilt
+CACHE_VERSION = 1
+
+# Columns read from the snapshots
+SNAPSHOT_COLUMNS = ['Category', 'Subcategory_1', 'Product Name', 'Date', 'Price', 'URL']
+
+# Information kept of every product
+PRODUCT_COLUMNS = ['Product Name', 'Category', 'Subcategory_1', 'URL']
+
+
+def read_snapshot(path, product_ids=None) -> pd.DataFrame:
+    """
+    Reads the products of a CSV snapshot, identified by the numeric ID of their URL
+    (or by the URL itself when it has none). The rows without URL are left out.
+
+    Args:
+        path (str | Path): Path of the file.
+        product_ids (dict): IDs of the URLs already seen, updated with the new ones.
+            Most products are listed every day, so their IDs are only extracted once.
+
+    Returns:
+        pd.DataFrame: Product ID and SNAPSHOT_COLUMNS columns, or None if the file is not a snapshot.
+    """
+    with open(path, newline='', encoding='utf-8') as f:
+        columns = next(csv.reader(f), [])
+    if columns not in (COLUMNS, LEGACY_COLUMNS):
+        return None
+    snapshot = pd.read_csv(path, usecols=SNAPSHOT_COLUMNS, dtype={column: object for column in SNAPSHOT_COLUMNS},
+                           keep_default_na=False)
+    # The rows without URL can not be followed across days
+    snapshot = snapshot[snapshot['URL'] != ''].reset_index(drop=True)
+    snapshot['Price'] = pd.to_numeric(snapshot['Price'], errors='coerce')
+    # Extract the IDs of the new URLs only, most products are listed every day
+    product_ids = product_ids if product_ids is not None else {}
+    urls = snapshot['URL'].to_numpy(dtype=object)
+    ids = np.array([product_ids.get(url) for url in urls], dtype=object)
+    missing = pd.isna(ids)
+    if missing.any():
+        new_urls = pd.Series(pd.unique(urls[missing]), dtype=object)
+        new_ids = new_urls.str.extract(PRODUCT_ID_PATTERN, expand=False).fillna(new_urls)
+        product_ids.update(zip(new_urls, new_ids))
+        ids[missing] = [product_ids[url] for url in urls[missing]]
+    snapshot.insert(0, 'Product ID', ids)
+    return snapshot
+
+
+class SnapshotCache():
+    """
+    Cache of the CSV snapshots as compact per-day arrays: the code and price of every product listed on that day,
+    once per product (the first row, as `merge_csv`), and the code of its category.
+
+    The products are kept in a table indexed by their ID, where the position of every product is its code,
+    with their name, category, subcategory and URL on the last day they were seen. A manifest keeps the size,
+    modification time and days of every snapshot read, so updating the cache only reads the new or modified
+    files (and the other files of the days they touch).
+
+    Attributes:
+        data_dir (Path): Directory of the exported CSV files.
+        cache_dir (Path): Directory of the cache.
+        products (pd.DataFrame): Table of the products, indexed by product ID.
+        categories (list): Names of the categories, in the order of their codes.
+    """
+    def __init__(self, data_dir=DEFAULT_DATA_DIR, cache_dir=None):
+        self.data_dir = Path(data_dir)
+        self.cache_dir = Path(cache_dir) if cache_dir else self.data_dir / ".analytics"
+        self._manifest_path = self.cache_dir / "manifest.json"
+        self._products_path = self.cache_dir / "products.csv"
+        self._manifest = {'version': CACHE_VERSION, 'files': {}, 'categories': []}
+        self.products = pd.DataFrame(columns=PRODUCT_COLUMNS + ['Last Date'], index=pd.Index([], name='Product ID', dtype=object))
+        if self._manifest_path.exists():
+            manifest = json.loads(self._manifest_path.read_text())
+            if manifest.get('version') == CACHE_VERSION:
+                self._manifest = manifest
+                self.products = pd.read_csv(self._products_path, dtype=object, keep_default_na=False).set_index('Product ID')
+        self.categories = self._manifest['categories']
+
+    def _day_path(self, day) -> Path:
+        return self.cache_dir / f"{day}.npz"
+
+    def days(self) -> list:
+        """Cached days (YYYYmmdd), in chronological order."""
+        return sorted({day for entry in self._manifest['files'].values() for day in entry['days']})
+
+    def _index_rows(self, snapshot) -> dict:
+        """
+        Adds the products of a snapshot to the product table (`_ids` and `_info` during an update),
+        keeping the names and categories of the last day every product was seen.
+
+        Args:
+            snapshot (pd.DataFrame): Rows read by `read_snapshot`.
+
+        Returns:
+            dict: Dict mapping every day of the snapshot to the (product codes, category codes, prices) of its rows.
+        """
+        partials = {}
+        for day, frame in snapshot.groupby('Date', sort=True):
+            frame = frame.drop_duplicates('Product ID')
+            codes = self._ids.get_indexer(frame['Product ID'])
+            if (codes < 0).any():
+                self._ids = self._ids.append(pd.Index(frame['Product ID'].to_numpy(dtype=object)[codes < 0], name='Product ID'))
+                self._info = np.vstack([self._info, np.full(((codes < 0).sum(), self._info.shape[1]), '', dtype=object)])
+                codes = self._ids.get_indexer(frame['Product ID'])
+            latest = self._info[codes, -1] <= day
+            self._info[codes[latest], :-1] = frame[PRODUCT_COLUMNS].to_numpy(dtype=object)[latest]
+            self._info[codes[latest], -1] = day
+
+            for category in pd.unique(frame['Category']):
+                if category not in self.categories:
+                    self.categories.append(category)
+            category_codes = pd.Index(self.categories).get_indexer(frame['Category'])
+            partials[day] = (codes.astype(np.int32), category_codes.astype(np.int16), frame['Price'].to_numpy(dtype=np.float32))
+        return partials
+
+    def update(self) -> list:
+        """
+        Updates the cache with the new, modified and removed snapshots.
+        Every snapshot read is reduced to arrays of codes and prices right away, so the memory used
+        does not depend on the number of snapshots.
+
+        Returns:
+            list: Days rebuilt.
+        """
+        files = self._manifest['files']
+        sources = {}
+        for name in snapshot_files(self.data_dir):
+            stat = (self.data_dir / name).stat()
+            sources[name] = [stat.st_size, stat.st_mtime_ns]
+        changed = [name for name in sources if files.get(name, {}).get('stat') != sources[name]]
+        removed = [name for name in files if name not in sources]
+        if not changed and not removed:
+            return []
+
+        self._ids, self._info = self.products.index, self.products.to_numpy(dtype=object)
+        product_ids = {}
+        partials = {}
+
+        def read(name):
+            snapshot = read_snapshot(self.data_dir / name, product_ids)
+            partials[name] = self._index_rows(snapshot) if snapshot is not None else {}
+
+        for name in changed:
+            read(name)
+        affected = set(chain(*partials.values()))
+        for name in changed + removed:
+            affected.update(files.get(name, {}).get('days', []))
+        # The unchanged snapshots of the affected days are read again, to keep the first row of every product
+        for name in sources:
+            if name not in partials and affected & set(files[name]['days']):
+                read(name)
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        for day in sorted(affected):
+            day_partials = [partials[name][day] for name in sources if day in partials.get(name, {})]
+            if not day_partials:
+                self._day_path(day).unlink(missing_ok=True)
+                continue
+            codes, category_codes, prices = (np.concatenate(arrays) for arrays in zip(*day_partials))
+            # First row of every product, in the order of the files (re-extractions first)
+            _, first = np.unique(codes, return_index=True)
+            first.sort()
+            np.savez(self._day_path(day), products=codes[first], categories=category_codes[first], prices=prices[first])
+        self.products = pd.DataFrame(self._info, index=self._ids, columns=self.products.columns)
+
+        for name in removed:
+            del files[name]
+        for name in changed:
+            files[name] = {'stat': sources[name], 'days': sorted(partials[name])}
+        # The manifest is replaced last, so an interrupted update is done again by the next one
+        self.products.to_csv(self._products_path)
+        tmp_path = self._manifest_path.with_suffix('.tmp')
+        tmp_path.write_text(json.dumps(self._manifest))
+        tmp_path.replace(self._manifest_path)
+        return sorted(affected)
+
+    def load(self, start_date=None, end_date=None) -> pd.DataFrame:
+        """
+        Loads the cached days as a columnar frame.
+
+        Args:
+            start_date (str): First date, with the format YYYYmmdd. If None, from the first day.
+            end_date (str): Last date, with the format YYYYmmdd. If None, until the last day.
+
+        Returns:
+            pd.DataFrame: Date, Product ID and Category columns as categoricals (the codes of the Product ID
+            are the positions in `products`) and a Price column, sorted by date.
+        """
+        days = [day for day in self.days() if (not start_date or day >= start_date) and (not end_date or day <= end_date)]
+        arrays = [np.load(self._day_path(day)) for day in days]
+        def concat(key, dtype):
+            return np.concatenate([day_arrays[key] for day_arrays in arrays]) if arrays else np.empty(0, dtype)
+        return pd.DataFrame({
+            'Date': pd.Categorical.from_codes(np.repeat(np.arange(len(days)), [len(a['prices']) for a in arrays]), days),
+            'Product ID': pd.Categorical.from_codes(concat('products', np.int32), self.products.index),
+            'Category': pd.Categorical.from_codes(concat('categories', np.int16), self.categories),
+            'Price': concat('prices', np.float32),
+        })
+
+
+class PriceHistory():
+    """
+    Price history of the products as a day x product matrix, for computing the reports with array operations.
+
+    Attributes:
+        dates (list): Days of the history (YYYYmmdd), in chronological order.
+        products (pd.DataFrame): Product Name, Category, Subcategory_1 and URL of every product on the last day
+            it was seen, indexed by product ID in the order of the columns of `prices`.
+        prices (np.ndarray): Price of every product on every day, NaN when it was not listed.
+        crawled (np.ndarray): Whether every category was crawled on every day (days x categories),
+            so the categories missing from a day do not count as delisted products.
+        categories (list): Names of the categories, in the order of the columns of `crawled`.
+    """
+    def __init__(self, frame, products):
+        self.dates = list(frame['Date'].cat.categories)
+        day_codes = frame['Date'].cat.codes.to_numpy()
+        # Only the products listed in the frame get a column
+        product_ids, product_codes = np.unique(frame['Product ID'].cat.codes.to_numpy(), return_inverse=True)
+        self.products = products.iloc[product_ids][PRODUCT_COLUMNS]
+
+        self.prices = np.full((len(self.dates), len(product_ids)), np.nan, dtype=np.float32)
+        self.prices[day_codes, product_codes] = frame['Price'].to_numpy()
+
+        self.categories = list(frame['Category'].cat.categories)
+        self._category_codes = pd.Index(self.categories).get_indexer(self.products['Category'])
+        self.crawled = np.zeros((len(self.dates), len(self.categories)), dtype=bool)
+        self.crawled[day_codes, frame['Category'].cat.codes.to_numpy()] = True
+
+    @classmethod
+    def load(cls, data_dir=DEFAULT_DATA_DIR, cache_dir=None, start_date=None, end_date=None, categories=None):
+        """
+        Loads the price history from the CSV snapshots, updating their cache first.
+
+        Args:
+            data_dir (str | Path): Directory of the exported CSV files.
+            cache_dir (str | Path): Directory of the cached days. If None, DATA_DIR/.analytics.
+            start_date (str): First date, with the format YYYYmmdd. If None, from the first snapshot.
+            end_date (str): Last date, with the format YYYYmmdd. If None, until the last snapshot.
+            categories (list): Normalized names of the categories. If None, all of them.
+
+        Returns:
+            PriceHistory: The price history.
+        """
+        cache = SnapshotCache(data_dir, cache_dir)
+        cache.update()
+        frame = cache.load(start_date, end_date)
+        if categories:
+            frame = frame[frame['Category'].isin(categories)]
+            frame = frame.assign(**{column: frame[column].cat.remove_unused_categories() for column in ['Date', 'Category']})
+        return cls(frame, cache.products)
+
+    def _day(self, date, default) -> int:
+        """Position of a date in the history, or of the default position (e.g. -1, the last day) if None."""
+        if date is None:
+            if not self.dates:
+                raise ValueError("The price history is empty.")
+            return default % len(self.dates)
+        if date not in self.dates:
+            raise ValueError(f"There are no snapshots of {date}.")
+        return self.dates.index(date)
+
+    def _days(self, date, previous_date) -> tuple:
+        """Positions of a day (the last one if None) and of a previous day (the day before it if None)."""
+        day = self._day(date, -1)
+        if previous_date is None and day == 0:
+            raise ValueError(f"There are no snapshots before {self.dates[0]}.")
+        return day, self._day(previous_date, day - 1)
+
+    def _report(self, mask, **columns) -> pd.DataFrame:
+        """Information of the selected products with the given columns of values."""
+        report = self.products[mask].copy()
+        for name, values in columns.items():
+            report[name.replace('_', ' ')] = values[mask]
+        return report
+
+    def _comparable(self, day, previous) -> np.ndarray:
+        """Mask of the products whose category was crawled on both days."""
+        return (self.crawled[day] & self.crawled[previous])[self._category_codes]
+
+    def price_changes(self, date=None, previous_date=None) -> pd.DataFrame:
+        """
+        Products whose price changed between two days.
+
+        Args:
+            date (str): Day of the new prices (YYYYmmdd). If None, the last day.
+            previous_date (str): Day of the old prices. If None, the day before `date` in the history.
+
+        Returns:
+            pd.DataFrame: Product information, Previous Price, Price, Change and Change (%) columns,
+            sorted by relative change.
+        """
+        day, previous = self._days(date, previous_date)
+        old, new = self.prices[previous], self.prices[day]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mask = (old != new) & ~np.isnan(old) & ~np.isnan(new)
+            report = self._report(mask, Previous_Price=old, Price=new, Change=new - old,
+                                  **{'Change_(%)': (new / old - 1) * 100})
+        return report.sort_values('Change (%)')
+
+    def new_products(self, date=None, previous_date=None) -> pd.DataFrame:
+        """
+        Products listed on a day but not on a previous one, in the categories crawled on both.
+
+        Args:
+            date (str): Day (YYYYmmdd). If None, the last day.
+            previous_date (str): Previous day. If None, the day before `date` in the history.
+
+        Returns:
+            pd.DataFrame: Product information and Price columns.
+        """
+        day, previous = self._days(date, previous_date)
+        mask = np.isnan(self.prices[previous]) & ~np.isnan(self.prices[day]) & self._comparable(day, previous)
+        return self._report(mask, Price=self.prices[day])
+
+    def delisted_products(self, date=None, previous_date=None) -> pd.DataFrame:
+        """
+        Products listed on a previous day but no longer on a day, in the categories crawled on both.
+
+        Args:
+            date (str): Day (YYYYmmdd). If None, the last day.
+            previous_date (str): Previous day. If None, the day before `date` in the history.
+
+        Returns:
+            pd.DataFrame: Product information and Previous Price columns.
+        """
+        day, previous = self._days(date, previous_date)
+        mask = ~np.isnan(self.prices[previous]) & np.isnan(self.prices[day]) & self._comparable(day, previous)
+        return self._report(mask, Previous_Price=self.prices[previous])
+
+    def category_index(self, base=100) -> pd.DataFrame:
+        """
+        Chained price index of every category: every day, the index moves by the geometric mean of the
+        price ratios of the products listed that day and the day before (Jevons index), so the products
+        that appear or disappear do not move it.
+
+        Args:
+            base (float): Value of the index on the first day.
+
+        Returns:
+            pd.DataFrame: One row per day and one column per category, plus an "All" column with every product.
+        """
+        with np.errstate(invalid='ignore', divide='ignore'):
+            log_prices = np.log(np.where(self.prices > 0, self.prices, np.nan).astype(np.float64))
+        ratios = np.diff(log_prices, axis=0)
+        both = ~np.isnan(ratios)
+        ratios[~both] = 0
+
+        # Sum and count of the log ratios of every category, as products with a one-hot matrix
+        membership = np.zeros((len(self._category_codes), len(self.categories) + 1))
+        membership[np.arange(len(self._category_codes)), self._category_codes] = 1
+        membership[:, -1] = 1
+        sums, counts = ratios @ membership, both.astype(np.float64) @ membership
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean_ratios = np.where(counts > 0, sums / counts, 0)
+        index = base * np.exp(np.vstack([np.zeros((1, membership.shape[1])), np.cumsum(mean_ratios, axis=0)]))
+        return pd.DataFrame(index, index=pd.Index(self.dates, name='Date'), columns=self.categories + ['All'])
+
+    def promotions(self, date=None, window=28, min_discount=0.1, min_days=3) -> pd.DataFrame:
+        """
+        Products sold below their regular price, the median price of the previous days.
+
+        Args:
+            date (str): Day (YYYYmmdd). If None, the last day.
+            window (int): Number of previous days of the regular price.
+            min_discount (float): Minimum discount, as a fraction of the regular price.
+            min_days (int): Minimum number of previous days with a price.
+
+        Returns:
+            pd.DataFrame: Product information, Regular Price, Price and Discount (%) columns,
+            sorted by discount, the largest first.
+        """
+        day = self._day(date, -1)
+        previous = self.prices[max(0, day - window):day]
+        price = self.prices[day]
+        with warnings.catch_warnings(), np.errstate(invalid='ignore', divide='ignore'):
+            # Products without any price in the window
+            warnings.simplefilter('ignore', category=RuntimeWarning)
+            regular = np.nanmedian(previous, axis=0) if len(previous) else np.full_like(price, np.nan)
+            discount = 1 - price / regular
+            mask = ((~np.isnan(previous)).sum(axis=0) >= min_days) & (discount >= min_discount)
+        report = self._report(mask, Regular_Price=regular, Price=price, **{'Discount_(%)': discount * 100})
+        return report.sort_values('Discount (%)', ascending=False)
+
+
+REPORTS = {
+    'changes': PriceHistory.price_changes,
+    'new': PriceHistory.new_products,
+    'delisted': PriceHistory.delisted_products,
+    'index': PriceHistory.category_index,
+    'promotions': PriceHistory.promotions,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compute price reports from the CSV files exported by the scraper.')
+    parser.add_argument('report', choices=list(REPORTS),
+                        help='Report: price changes, new or delisted products, price index of the categories or promotions.')
+    parser.add_argument('--data-dir', type=str, default=str(DEFAULT_DATA_DIR),
+                        help='Directory of the exported CSV files (default: data).')
+    parser.add_argument('--cache-dir', type=str, help='Directory of the cached days (default: DATA_DIR/.analytics).')
+    parser.add_argument('--start-date', type=str, help='First date loaded (YYYYmmdd).')
+    parser.add_argument('--end-date', type=str, help='Last date loaded (YYYYmmdd).')
+    parser.add_argument('--category', type=str, nargs='+', help='Normalized names of the categories (e.g. Frescos Alimentacio).')
+    parser.add_argument('--date', type=str, help='Day of the report (default: the last one loaded).')
+    parser.add_argument('--previous-date', type=str,
+                        help='Day compared by the changes, new and delisted reports (default: the day before --date).')
+    parser.add_argument('--window', type=int, default=28,
+                        help='Previous days of the regular price of the promotions (default: 28).')
+    parser.add_argument('--min-discount', type=float, default=0.1,
+                        help='Minimum discount of the promotions, as a fraction (default: 0.1).')
+    parser.add_argument('--output', type=str, help='Save the report to this CSV file instead of printing it.')
+    args = parser.parse_args()
+    configure_logging()
+
+    history = PriceHistory.load(args.data_dir, args.cache_dir, args.start_date, args.end_date, args.category)
+    if args.report == 'index':
+        report = history.category_index()
+    elif args.report == 'promotions':
+        report = history.promotions(args.date, args.window, args.min_discount)
+    else:
+        report = REPORTS[args.report](history, args.date, args.previous_date)
+
+    if args.output:
+        report.to_csv(args.output)
+        logger.info(f"Saved {len(report)} rows to {args.output}.")
+    else:
+        print(report.to_string())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+import logging
+import threading
+import time
+from itertools import chain
+
+from navigation import SiteNavigation
+from rate_control import TokenBucket
+from scheduler import products_signature
+from sinks import DEFAULT_DATA_DIR, open_sinks
+
+logger = logging.getLogger(__name__)
+
+
+class Daemon():
+    """
+    Long-running crawl that visits every leaf page when the revisit scheduler says it is due,
+    instead of crawling whole categories at fixed times.
+
+    The category tree is crawled again every `rediscover_interval` seconds to pick up new and removed pages.
+    The due pages are fetched in batches, never faster than the hourly budget of the scheduler,
+    and their rows are appended to one output file per category and day.
+
+    Attributes:
+        scheduler (RevisitScheduler): Scheduler of the visits.
+        scraper_factory (callable): Function creating the scraper of a category, given its name.
+        categories (list): Names of the categories crawled.
+        formats (tuple): Output formats.
+        data_dir (Path): Directory of the output files.
+        batch_size (int): Maximum number of due pages fetched at once.
+        rediscover_interval (float): Seconds between two crawls of the category tree.
+        max_sleep (float): Maximum seconds waited between two checks of the due pages.
+        history (dict): Changes observed in past snapshots, used to seed the new pages (see `scheduler.history_stats`).
+        normalize (callable): Function normalizing the names of the categories as in the snapshots.
+    """
+    def __init__(self, scheduler, scraper_factory, categories, formats=("csv",), data_dir=DEFAULT_DATA_DIR,
+                 batch_size=16, rediscover_interval=24 * 3600, max_sleep=60, history=None, normalize=None):
+        self.scheduler = scheduler
+        self.scraper_factory = scraper_factory
+        self.categories = list(categories)
+        self.formats = formats
+        self.data_dir = data_dir
+        self.batch_size = batch_size
+        self.rediscover_interval = rediscover_interval
+        self.max_sleep = max_sleep
+        self.history = history
+        self.normalize = normalize
+        # Hard limit of the visits, in case the intervals of the scheduler are bounded below their share
+        self._budget = TokenBucket(scheduler.budget / 3600, burst=batch_size)
+        self._scrapers = {}
+        self._sinks = {}
+        self._day = None
+        self._next_discovery = 0
+
+    def _scraper(self, category):
+        if category not in self._scrapers:
+            self._scrapers[category] = self.scraper_factory(category)
+        return self._scrapers[category]
+
+    def _sink(self, category):
+        """Output of a category for the current day, opened on its first rows."""
+        day = time.strftime("%Y%m%d")
+        if day != self._day:
+            self._close_sinks()
+            self._day = day
+        if category not in self._sinks:
+            self._sinks[category] = open_sinks(self._scraper(category)._output_name(), self.formats,
+                                               data_dir=self.data_dir, timestamp=f"{day}_{time.strftime('%H%M%S')}")
+        return self._sinks[category]
+
+    def _close_sinks(self):
+        for sink in self._sinks.values():
+            sink.close()
+        self._sinks = {}
+
+    def discover(self, now=None):
+        """
+        Crawls the category trees again and updates the pages of the scheduler.
+
+        Args:
+            now (float): Current time. If None, the current time.
+        """
+        now = now if now is not None else time.time()
+        # Fresh category tree, the menus may have changed since the previous discovery
+        navigation = None
+        for category in self.categories:
+            scraper = self._scraper(category)
+            if navigation is None:
+                navigation = SiteNavigation(scraper.base_url)
+            scraper.navigation = navigation
+            try:
+                leaves = list(chain(*[scraper._extract_subcat_structure(subcategory)
+                                      for subcategory in scraper.get_subcategories_names()]))
+            except Exception as e:
+                logger.warning(f"Could not crawl the tree of the {category} category, keeping its pages: {e}")
+                continue
+            self.scheduler.sync_leaves(category, leaves, now)
+        if self.history:
+            n_seeded = self.scheduler.seed(self.history, self.normalize)
+            if n_seeded:
+                logger.info(f"Seeded the change rate of {n_seeded} pages with the past snapshots.")
+        for category, summary in self.scheduler.summary().items():
+            logger.info(f"{category}: {summary['pages']} pages, {summary['changes_per_day']:.1f} changes "
+                        f"and {summary['visits_per_day']:.0f} visits per day.")
+        self._next_discovery = now + self.rediscover_interval
+
+    def run_once(self, now=None) -> int:
+        """
+        Visits the pages that are due.
+
+        Args:
+            now (float): Current time. If None, the current time.
+
+        Returns:
+            int: Number of pages visited.
+        """
+        now = now if now is not None else time.time()
+        pages = self.scheduler.due(now, self.batch_size)
+        n_changed = 0
+        for category in sorted({page.category for page in pages}):
+            category_pages = [page for page in pages if page.category == category]
+            # The due pages are taken from the schedule, each one must be recorded or it is never visited again
+            recorded = set()
+            try:
+                scraper = self._scraper(category)
+                scraper.clear_failed_urls()
+
+                def urls():
+                    for page in category_pages:
+                        self._budget.acquire()
+                        yield page.url
+
+                for page, products in zip(category_pages, scraper._iter_product_pages(urls())):
+                    visited_at = time.time()
+                    if page.url in scraper.failed_reasons:
+                        self.scheduler.record_failure(page.url, visited_at)
+                        recorded.add(page.url)
+                        continue
+                    n_changed += self.scheduler.record_visit(page.url, products_signature(products), visited_at)
+                    recorded.add(page.url)
+                    self._sink(category).write_rows(scraper._page_rows(page.structure, products))
+            except Exception as e:
+                logger.error(f"Could not visit the pages of the {category} category, trying again later: {e}")
+                failed_at = time.time()
+                for page in category_pages:
+                    if page.url not in recorded:
+                        self.scheduler.record_failure(page.url, failed_at)
+        if pages:
+            logger.info(f"Visited {len(pages)} pages, {n_changed} changed since their previous visit.")
+        return len(pages)
+
+    def run(self, stop_event=None, max_cycles=None):
+        """
+        Visits the due pages until stopped.
+
+        Args:
+            stop_event (threading.Event): Event stopping the daemon when set, e.g. from a signal handler.
+            max_cycles (int): Maximum number of batches visited. If None, runs until stop_event is set.
+        """
+        stop_event = stop_event or threading.Event()
+        n_cycles = 0
+        try:
+            while not stop_event.is_set() and (max_cycles is None or n_cycles < max_cycles):
+                if time.time() >= self._next_discovery:
+                    self.discover()
+                if self.run_once():
+                    n_cycles += 1
+                    continue
+                # Nothing due: sleep until the next page is due or the next discovery
+                next_due = self.scheduler.next_due()
+                wake_up = min(self._next_discovery, next_due if next_due is not None else self._next_discovery)
+                stop_event.wait(min(self.max_sleep, max(0, wake_up - time.time())))
+        finally:
+            self._close_sinks()
@@ -0,0 +1,188 @@
+import logging
+import os
+import socket
+import time
+from itertools import chain
+from pathlib import Path
+
+from journal import CategoryJournal
+from sinks import DEFAULT_DATA_DIR, open_sinks
+from work_queue import PENDING, LEASED
+
+logger = logging.getLogger(__name__)
+
+# Default location of the work queue of the distributed runs
+DEFAULT_QUEUE_PATH = DEFAULT_DATA_DIR / "queue.sqlite"
+
+# Default directory of the partial outputs of the workers
+DEFAULT_PARTS_DIR = DEFAULT_DATA_DIR / ".parts"
+
+
+def enqueue_category(scraper, queue, subcategories=None, formats=("csv",)) -> str:
+    """
+    Discovers the leaf pages of a category and adds them to the work queue as a new job.
+
+    Args:
+        scraper (BonpreuScraper): Scraper of the category, used to crawl the category tree.
+        queue (WorkQueue): Work queue of the run.
+        subcategories (list): Names of the subcategories. If None, all the subcategories of the category.
+        formats (tuple): Output formats of the merged files.
+
+    Returns:
+        str: Identifier of the job.
+    """
+    if isinstance(subcategories, str):
+        subcategories = [subcategories]
+    elif not subcategories:
+        subcategories = scraper.get_subcategories_names()
+    leaves = list(chain(*[scraper._extract_subcat_structure(subcategory) for subcategory in subcategories]))
+
+    timestamp = time.strftime("%Y%m%d_%H%M%S")
+    output_name = scraper._output_name()
+    job = f"{output_name}_{timestamp}"
+    queue.add_job(job, scraper.category, {'output_name': output_name, 'formats': list(formats), 'timestamp': timestamp},
+                  leaves)
+    logger.info(f"Queued {len(leaves)} pages of the {scraper.category} category as the job {job}.")
+    return job
+
+
+class Worker():
+    """
+    Worker of a distributed run: leases leaf pages from the work queue, fetches and parses them,
+    and appends their rows to its partial output (one CategoryJournal per job and worker).
+
+    The lease of the pages still in progress is renewed after every page, so only the pages of a worker
+    that stops responding are given to another worker. A page whose lease was lost is written anyway,
+    but only the rows of the worker that completed it in the queue are merged.
+
+    Attributes:
+        queue (WorkQueue): Work queue of the run.
+        scraper_factory (callable): Function creating the scraper of a category, given its name.
+        worker_id (str): Identifier of the worker, unique across the processes and hosts of the run.
+        batch_size (int): Number of pages leased at once.
+        lease_seconds (float): Duration of the leases.
+        parts_dir (Path): Directory of the partial outputs.
+        poll_interval (float): Seconds waited before checking again when the other workers hold all the pages left.
+    """
+    def __init__(self, queue, scraper_factory, worker_id=None, batch_size=16, lease_seconds=300,
+                 parts_dir=DEFAULT_PARTS_DIR, poll_interval=5):
+        self.queue = queue
+        self.scraper_factory = scraper_factory
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.batch_size = batch_size
+        self.lease_seconds = lease_seconds
+        self.parts_dir = Path(parts_dir)
+        self.poll_interval = poll_interval
+        self._scrapers = {}
+        self._journals = {}
+
+    def _scraper(self, category):
+        if category not in self._scrapers:
+            self._scrapers[category] = self.scraper_factory(category)
+        return self._scrapers[category]
+
+    def _journal(self, job) -> CategoryJournal:
+        if job not in self._journals:
+            self._journals[job] = CategoryJournal(self.parts_dir / job / self.worker_id)
+        return self._journals[job]
+
+    def _process(self, category, tasks) -> int:
+        """Crawls the leased pages of a job. Returns the number of pages completed."""
+        scraper = self._scraper(category)
+        journal = self._journal(tasks[0].job)
+        scraper.clear_failed_urls()
+        n_completed = 0
+        for i, products in enumerate(scraper._iter_product_pages([task.url for task in tasks])):
+            task = tasks[i]
+            if task.url in scraper.failed_reasons:
+                self.queue.fail(task, self.worker_id, scraper.failed_reasons[task.url])
+            else:
+                journal.record_page(task.index, task.url, scraper._page_rows(task.structure, products))
+                if self.queue.complete(task, self.worker_id):
+                    n_completed += 1
+                else:
+                    logger.warning(f"The lease of {task.url} expired, another worker will crawl it.")
+            self.queue.renew(tasks[i + 1:], self.worker_id, self.lease_seconds)
+        return n_completed
+
+    def run(self, wait=True) -> int:
+        """
+        Processes pages until the queue is empty.
+
+        Args:
+            wait (bool): If True, waits while other workers hold the pages left, in case their leases expire.
+                Otherwise, stops as soon as there is no page to lease.
+
+        Returns:
+            int: Number of pages completed by this worker.
+        """
+        jobs = {}
+        n_completed = 0
+        try:
+            while True:
+                tasks = self.queue.lease(self.worker_id, self.batch_size, self.lease_seconds)
+                if not tasks:
+                    progress = self.queue.progress()
+                    if not wait or not (progress[PENDING] or progress[LEASED]):
+                        break
+                    time.sleep(self.poll_interval)
+                    continue
+
+                if {task.job for task in tasks} - set(jobs):
+                    # New jobs were queued since the last lease
+                    jobs = self.queue.jobs()
+                for job in sorted({task.job for task in tasks}):
+                    category, _ = jobs[job]
+                    n_completed += self._process(category, [task for task in tasks if task.job == job])
+                logger.info(f"Worker {self.worker_id}: {n_completed} pages completed.")
+        finally:
+            for journal in self._journals.values():
+                journal.close()
+        return n_completed
+
+
+def merge_job(queue, job, parts_dir=DEFAULT_PARTS_DIR, data_dir=DEFAULT_DATA_DIR, allow_partial=False) -> int:
+    """
+    Merges the partial outputs of the workers of a job into the usual output files of the category,
+    with the rows in the same order as a single-machine run.
+
+    Args:
+        queue (WorkQueue): Work queue of the run.
+        job (str): Identifier of the job.
+        parts_dir (str | Path): Directory of the partial outputs.
+        data_dir (str | Path): Directory of the output files.
+        allow_partial (bool): If True, merges the pages completed so far even if others are still pending.
+
+    Returns:
+        int: Number of rows written.
+
+    Raises:
+        RuntimeError: If pages of the job are still pending and allow_partial is False.
+    """
+    progress = queue.progress(job)
+    if (progress[PENDING] or progress[LEASED]) and not allow_partial:
+        raise RuntimeError(f"The job {job} still has {progress[PENDING] + progress[LEASED]} pages in progress.")
+    _, settings = queue.jobs()[job]
+
+    # Keep only the rows of the worker that completed every page
+    owners = queue.owners(job)
+    pages = {}
+    job_dir = Path(parts_dir) / job
+    for worker_dir in sorted(job_dir.iterdir()) if job_dir.exists() else []:
+        for index, (rows, _) in CategoryJournal(worker_dir).completed_pages().items():
+            if owners.get(index) == worker_dir.name:
+                pages[index] = rows
+
+    n_rows = 0
+    with open_sinks(settings['output_name'], settings['formats'], data_dir=data_dir, timestamp=settings['timestamp']) as sink:
+        for index in sorted(pages):
+            sink.write_rows(pages[index])
+            n_rows += len(pages[index])
+
+    logger.info(f"Merged {len(pages)} pages and {n_rows} products of the job {job}.")
+    failures = queue.failures(job)
+    if failures:
+        logger.warning(f"{len(failures)} pages could not be downloaded:")
+        for url, reason in failures:
+            logger.warning(f"- {url} ({reason})")
+    return n_rows
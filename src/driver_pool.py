@@ -0,0 +1,198 @@
+import logging
+import queue
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from selenium import webdriver
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+
+logger = logging.getLogger(__name__)
+
+
+class DriverPool():
+    """
+    Pool of warm headless Chrome drivers used to load the pages with dynamic content.
+
+    Each driver is started once, accepts the cookies popup on the base URL and is then reused
+    for many pages. A driver is replaced after `max_pages` pages or as soon as it fails.
+
+    Attributes:
+        base_url (str): The main URL of the Bonpreu website, opened to accept the cookies.
+        size (int): Maximum number of drivers alive at the same time.
+        max_pages (int): Number of pages loaded by a driver before it is recycled.
+        load_timeout (float): Maximum number of seconds spent scrolling a page.
+        idle_time (float): Seconds without new product cards nor network requests after which a page is considered loaded.
+        poll_interval (float): Seconds between two readiness checks.
+        cookie_timeout (float): Maximum number of seconds to wait for the cookies popup.
+    """
+    # Script returning the number of product cards and of network requests made by the page
+    readiness_script = (
+        "return [document.querySelectorAll('div.product-card-container').length,"
+        " performance.getEntriesByType('resource').length];"
+    )
+
+    def __init__(self, base_url, size=2, max_pages=50, load_timeout=120, idle_time=1.0, poll_interval=0.2,
+                 cookie_timeout=10, user_agents=None, driver_factory=None):
+        self.base_url = base_url
+        self.size = max(1, size)
+        self.max_pages = max_pages
+        self.load_timeout = load_timeout
+        self.idle_time = idle_time
+        self.poll_interval = poll_interval
+        self.cookie_timeout = cookie_timeout
+        self.user_agents = user_agents or []
+        self._driver_factory = driver_factory or self._create_driver
+
+        # Idle drivers, most recently used first, and number of pages loaded by each driver
+        self._idle = queue.LifoQueue()
+        self._pages = {}
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._lock = threading.Lock()
+
+    def _create_driver(self):
+        """
+        Starts a new headless Chrome driver.
+
+        Returns:
+            webdriver.Chrome: The new driver.
+        """
+        # Set the options for the Chrome driver
+        options = webdriver.ChromeOptions()
+        if self.user_agents:
+            options.add_argument(f"--User-Agent={random.choice(self.user_agents)}")
+        options.add_argument("--headless")
+        options.add_argument("--disable-blink-features=AutomationControlled")
+        options.add_argument("disable-gpu")
+        options.add_argument("--blink-settings=imagesEnabled=false")  # Avoid images and other media types
+
+        return webdriver.Chrome(options=options)
+
+    def _start_driver(self):
+        """
+        Starts a driver and accepts the cookies popup, so it does not have to be closed on every page.
+
+        Returns:
+            webdriver.Chrome: The warm driver.
+        """
+        driver = self._driver_factory()
+        try:
+            driver.get(self.base_url)
+
+            # Waiting popup
+            try:
+                cookie_accept_button = WebDriverWait(driver, self.cookie_timeout).until(
+                    EC.element_to_be_clickable((By.ID, "onetrust-accept-btn-handler"))
+                )
+                # Click on Accept button
+                cookie_accept_button.click()
+                logger.info("Popup de cookies cerrado.")
+            except Exception:
+                logger.info("No se encontró el popup de cookies o ya estaba cerrado.")
+        except BaseException:
+            # Do not leave the browser process running
+            driver.quit()
+            raise
+
+        with self._lock:
+            self._pages[driver] = 0
+        return driver
+
+    def _discard(self, driver):
+        """Quits a driver and forgets it."""
+        with self._lock:
+            self._pages.pop(driver, None)
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+    @contextmanager
+    def driver(self):
+        """
+        Checks out a driver from the pool, starting a new one if none is idle.
+        The driver is returned to the pool afterwards, unless it failed or reached `max_pages`.
+
+        Yields:
+            webdriver.Chrome: A driver with the cookies already accepted.
+        """
+        self._slots.acquire()
+        try:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                driver = self._start_driver()
+
+            try:
+                yield driver
+            except Exception:
+                # The driver may be in a broken state, replace it
+                self._discard(driver)
+                raise
+
+            with self._lock:
+                self._pages[driver] += 1
+                worn_out = self._pages[driver] >= self.max_pages
+            if worn_out:
+                self._discard(driver)
+            else:
+                self._idle.put(driver)
+        finally:
+            self._slots.release()
+
+    def _wait_until_loaded(self, driver):
+        """
+        Scrolls the page until all the products are loaded.
+        After every scroll, the page is considered loaded when neither the number of product cards
+        nor the number of network requests has changed for `idle_time` seconds.
+
+        Args:
+            driver (webdriver.Chrome): Driver with the page opened.
+        """
+        deadline = time.monotonic() + self.load_timeout
+        last_state = driver.execute_script(self.readiness_script)
+
+        while time.monotonic() < deadline:
+            # Scrolls to the bottom of the page
+            driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
+
+            # Waits until new cards appear or the page goes idle
+            quiet_until = time.monotonic() + self.idle_time
+            while time.monotonic() < quiet_until:
+                time.sleep(self.poll_interval)
+                state = driver.execute_script(self.readiness_script)
+                if state != last_state:
+                    last_state = state
+                    break
+            else:
+                return
+
+        logger.warning(f"Page still loading after {self.load_timeout} s, using the content loaded so far.")
+
+    def fetch(self, url) -> str:
+        """
+        Loads a page with a driver of the pool.
+
+        Args:
+            url (str): URL of the page.
+
+        Returns:
+            str: HTML content of the page once all the products are loaded.
+        """
+        with self.driver() as driver:
+            driver.get(url)
+            self._wait_until_loaded(driver)
+
+            return driver.page_source
+
+    def close(self):
+        """Quits all the idle drivers."""
+        while True:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(driver)
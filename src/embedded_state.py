@@ -0,0 +1,144 @@
+import hashlib
+import json
+import re
+import unicodedata
+
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:  # orjson is optional, the standard library parser is used instead
+    orjson = None
+    _loads = json.loads
+
+
+# Assignment of the hydration state of the page, rendered by the server in a <script> tag
+STATE_PATTERN = re.compile(r'window\.__INITIAL_STATE__\s*=\s*')
+
+# Key of the state holding the products of the listing, indexed by product ID
+PRODUCTS_KEY = 'productEntities'
+
+# Keys of a product of the state holding its link, and its URL slug
+URL_KEYS = ('url', 'productUrl', 'href')
+SLUG_KEYS = ('slug', 'urlSlug')
+
+
+def extract_state(html_page) -> dict:
+    """
+    Reads the hydration state embedded in the page.
+    Unlike the product cards, it holds every product of the listing, including the ones
+    that the browser only renders when scrolling.
+
+    Args:
+        html_page (str): HTML content of the page.
+
+    Returns:
+        dict: The state of the page, or None if the page has no (valid) state.
+    """
+    match = STATE_PATTERN.search(html_page)
+    if not match:
+        return None
+    end = html_page.find('</script>', match.end())
+    if end == -1:
+        return None
+
+    try:
+        return _loads(html_page[match.end():end].strip().rstrip(';'))
+    except ValueError:
+        pass
+    # The script has more statements after the state: let the standard parser find where the state ends
+    try:
+        return json.JSONDecoder().raw_decode(html_page, match.end())[0]
+    except ValueError:
+        return None
+
+
+def _find_key(node, key):
+    """Finds the first value of a key in a nested structure of dicts and lists (depth-first)."""
+    if isinstance(node, dict):
+        if key in node:
+            return node[key]
+        children = node.values()
+    elif isinstance(node, list):
+        children = node
+    else:
+        return None
+    for child in children:
+        value = _find_key(child, key)
+        if value is not None:
+            return value
+    return None
+
+
+def _slugify(text) -> str:
+    """Builds the URL slug of a product name, e.g. "Plàtan de Canàries" -> "platan-de-canaries"."""
+    text = unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode('ascii').lower()
+    return re.sub(r'[^a-z0-9]+', '-', text).strip('-')
+
+
+def _product_from_entity(entity, base_url) -> tuple:
+    """
+    Converts a product of the state to the (product name, price, quantity, URL) tuple of the card parsers.
+
+    Args:
+        entity (dict): Product of the state.
+        base_url (str): The main URL of the Bonpreu website, used to build the product URLs.
+
+    Returns:
+        tuple: (product name, price, quantity, URL) tuple.
+    """
+    product_name = entity.get('name')
+
+    price = (entity.get('price') or {}).get('current') or {}
+    product_price = float(price['amount']) if price.get('amount') is not None else None
+
+    product_quantity = (entity.get('size') or {}).get('value')
+
+    # Link of the site, so the URL is the same as the one of the product card
+    product_url = next((entity[key] for key in URL_KEYS if isinstance(entity.get(key), str) and entity[key]), None)
+    if product_url is not None:
+        product_url = base_url + product_url if product_url.startswith('/') else product_url
+    else:
+        product_id = entity.get('retailerProductId') or entity.get('productId')
+        # Without link, the slug is rebuilt from the name: it may differ from the site's, so the products
+        # are matched across runs by the ID at the end of the URL (see `sinks.product_key`)
+        slug = next((entity[key] for key in SLUG_KEYS if entity.get(key)), None) or _slugify(product_name or '')
+        product_url = f"{base_url}/products/{slug}/{product_id}" if product_id else None
+
+    return (product_name, product_price, product_quantity, product_url)
+
+
+def extract_products_from_state(html_page, base_url) -> list:
+    """
+    Extracts the products of a subcategory page from its embedded state.
+
+    Args:
+        html_page (str): HTML content of the subcategory page.
+        base_url (str): The main URL of the Bonpreu website, used to build the product URLs.
+
+    Returns:
+        list: List of (product name, price, quantity, URL) tuples, in listing order,
+        or None if the page has no state with products.
+    """
+    state = extract_state(html_page)
+    entities = _find_key(state, PRODUCTS_KEY) if state is not None else None
+    if not isinstance(entities, dict):
+        return None
+    return [_product_from_entity(entity, base_url) for entity in entities.values() if isinstance(entity, dict)]
+
+
+def state_fingerprint(html_page) -> str:
+    """
+    Computes a hash of the products of the embedded state, ignoring the rest of the state
+    (session data, tokens...), which changes on every request.
+
+    Args:
+        html_page (str): HTML content of the subcategory page.
+
+    Returns:
+        str: Hex digest of the products, or None if the page has no state with products.
+    """
+    state = extract_state(html_page)
+    entities = _find_key(state, PRODUCTS_KEY) if state is not None else None
+    if entities is None:
+        return None
+    return hashlib.sha1(json.dumps(entities, sort_keys=True).encode('utf-8')).hexdigest()
@@ -0,0 +1,326 @@
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from embedded_state import PRODUCTS_KEY, extract_state, _find_key
+from http_session import FetchError
+from sinks import COLUMNS, DEFAULT_DATA_DIR, PRODUCT_ID_PATTERN, open_sinks, product_id
+
+logger = logging.getLogger(__name__)
+
+# Default location of the details of the products already enriched
+DEFAULT_DETAILS_PATH = Path(__file__).parent.parent / "data" / ".enrichment" / "details.sqlite"
+
+# Structured data of the product detail pages
+JSON_LD_PATTERN = re.compile(r'<script[^>]*type="application/ld\+json"[^>]*>(.*?)</script>', re.S | re.I)
+
+# Unit price shown next to the price when there is no structured data, e.g. "4,70 €/kg"
+UNIT_PRICE_PATTERN = re.compile(r'(\d+(?:[.,]\d+)?)\s*(?:&nbsp;|\xa0)?\s*€\s*/\s*(kg|l|litre|unitat|u)\b', re.I)
+UNIT_NAMES = {'kg': 'kg', 'l': 'L', 'litre': 'L', 'unitat': 'unit', 'u': 'unit'}
+
+# Columns of the details files, in output order
+DETAIL_COLUMNS = ['Product ID', 'URL', 'EAN', 'Brand', 'Detail Unit Price', 'Detail Unit', 'Subcategory Paths']
+
+
+def _unit_from_label(label) -> str:
+    """Converts a unit price label (e.g. "fop.price.per.kg", "per litre") to "kg", "L" or "unit"."""
+    label = (label or '').lower()
+    if 'kg' in label:
+        return 'kg'
+    if 'litre' in label or label.endswith('.l') or label.endswith(' l'):
+        return 'L'
+    return 'unit' if label else None
+
+
+def _product_entity(state, product) -> dict:
+    """
+    Finds the entity of a product in the embedded state of a page, which also holds other products
+    (related products, recommendations...). The entities are indexed by the internal ID of the product,
+    while the URLs use the retailer ID.
+    """
+    entities = _find_key(state, PRODUCTS_KEY)
+    if not isinstance(entities, dict):
+        return None
+    entity = entities.get(product)
+    if isinstance(entity, dict):
+        return entity
+    return next((entity for entity in entities.values() if isinstance(entity, dict)
+                 and product in (str(entity.get('retailerProductId')), str(entity.get('productId')))), None)
+
+
+def extract_details(html_page, product) -> dict:
+    """
+    Extracts the details of a product detail page: EAN, brand and price per unit.
+    They are read from the structured data (JSON-LD) of the page, then from the entity of the product
+    in its embedded state, and the unit price from the text of the page as a last resort.
+
+    Args:
+        html_page (str): HTML content of the product detail page.
+        product (str): ID of the product, as in its URL.
+
+    Returns:
+        dict: EAN, brand, unit price and unit ("kg", "L" or "unit") of the product. Missing values are None.
+    """
+    details = {'ean': None, 'brand': None, 'unit_price': None, 'unit': None}
+
+    for block in JSON_LD_PATTERN.findall(html_page):
+        try:
+            data = json.loads(block)
+        except ValueError:
+            continue
+        items = data if isinstance(data, list) else data.get('@graph', [data]) if isinstance(data, dict) else []
+        for item in items:
+            if not isinstance(item, dict) or item.get('@type') != 'Product':
+                continue
+            details['ean'] = details['ean'] or next(
+                (str(item[key]) for key in ('gtin13', 'gtin', 'gtin14', 'gtin12', 'gtin8') if item.get(key)), None)
+            brand = item.get('brand')
+            details['brand'] = details['brand'] or (brand.get('name') if isinstance(brand, dict) else brand)
+
+    state = extract_state(html_page) if None in details.values() else None
+    entity = _product_entity(state, product) if state is not None else None
+    if entity is not None:
+        ean = _find_key(entity, 'ean') or _find_key(entity, 'gtin')
+        details['ean'] = details['ean'] or (str(ean) if ean else None)
+        brand = _find_key(entity, 'brand')
+        details['brand'] = details['brand'] or (brand.get('name') if isinstance(brand, dict) else brand)
+        price = _find_key(entity, 'price')
+        unit_price = _find_key(entity, 'unitPrice') or (price.get('unit') if isinstance(price, dict) else None)
+        if isinstance(unit_price, dict):
+            amount = (unit_price.get('current') or unit_price).get('amount')
+            if amount is not None:
+                details['unit_price'] = float(amount)
+                details['unit'] = _unit_from_label(unit_price.get('label') or unit_price.get('unit'))
+
+    if details['unit_price'] is None:
+        match = UNIT_PRICE_PATTERN.search(html_page)
+        if match:
+            details['unit_price'] = float(match.group(1).replace(',', '.'))
+            details['unit'] = UNIT_NAMES[match.group(2).lower()]
+    return details
+
+
+class MembershipIndex():
+    """
+    Compact index of the subcategory paths under which every product is listed.
+    The paths are stored once and every product keeps an array with the numbers of its paths,
+    so a product listed under several subcategories is counted once.
+
+    Attributes:
+        urls (dict): Dict mapping every product ID to its URL.
+    """
+    def __init__(self):
+        self.urls = {}
+        self._path_ids = {}
+        self._paths = []
+        self._members = {}
+
+    def __len__(self):
+        return len(self._members)
+
+    def add(self, product, url, path):
+        """
+        Records that a product is listed under a path.
+
+        Args:
+            product (str): ID of the product.
+            url (str): URL of the product.
+            path (tuple): Category and subcategories of the listing.
+        """
+        path_id = self._path_ids.get(path)
+        if path_id is None:
+            path_id = self._path_ids[path] = len(self._paths)
+            self._paths.append(path)
+        members = self._members.get(product)
+        if members is None:
+            self._members[product] = array('I', [path_id])
+            self.urls[product] = url
+        elif path_id not in members:
+            members.append(path_id)
+
+    def paths(self, product) -> list:
+        """Paths under which a product is listed."""
+        return [self._paths[path_id] for path_id in self._members.get(product, ())]
+
+    def products(self, category=None) -> list:
+        """
+        IDs of the products, in order of appearance.
+
+        Args:
+            category (str): If given, only the products listed under this (normalized) category.
+        """
+        if category is None:
+            return list(self._members)
+        return [product for product, members in self._members.items()
+                if any(self._paths[path_id][0] == category for path_id in members)]
+
+
+class DetailsStore():
+    """
+    Store of the details of the products already enriched, with the time they were fetched.
+
+    Attributes:
+        path (Path): Path of the SQLite database.
+    """
+    def __init__(self, path=DEFAULT_DETAILS_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        with self._db:
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS details (
+                    product_id TEXT PRIMARY KEY,
+                    url TEXT NOT NULL,
+                    ean TEXT,
+                    brand TEXT,
+                    unit_price REAL,
+                    unit TEXT,
+                    fetched_at REAL NOT NULL
+                )
+            """)
+
+    def get(self, products, max_age=None) -> dict:
+        """
+        Gets the stored details of some products.
+
+        Args:
+            products (list): IDs of the products.
+            max_age (float): If given, ignores the details fetched more than these seconds ago.
+
+        Returns:
+            dict: Dict mapping the ID of every product found to its details.
+        """
+        min_fetched_at = time.time() - max_age if max_age is not None else 0
+        details = {}
+        products = list(products)
+        with self._lock:
+            for start in range(0, len(products), 500):
+                batch = products[start:start + 500]
+                rows = self._db.execute(
+                    f"SELECT product_id, ean, brand, unit_price, unit FROM details "
+                    f"WHERE fetched_at >= ? AND product_id IN ({','.join('?' * len(batch))})",
+                    [min_fetched_at, *batch]
+                )
+                for product, ean, brand, unit_price, unit in rows:
+                    details[product] = {'ean': ean, 'brand': brand, 'unit_price': unit_price, 'unit': unit}
+        return details
+
+    def put(self, product, url, details):
+        """Saves the details of a product."""
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO details VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (product, url, details['ean'], details['brand'], details['unit_price'], details['unit'], time.time())
+            )
+
+    def close(self):
+        """Closes the database."""
+        self._db.close()
+
+
+class Enricher():
+    """
+    Enrichment stage: fetches the detail page of every unique product to get its EAN, brand and unit price.
+
+    Products are keyed by the ID of their URL, so a product listed under several subcategories (or categories)
+    is fetched once. Products enriched less than `ttl` seconds ago are taken from the store without any request.
+
+    Attributes:
+        store (DetailsStore): Store of the details already fetched.
+        ttl (float): Seconds the stored details are reused.
+        max_workers (int): Maximum number of detail pages fetched concurrently.
+        membership (MembershipIndex): Products seen in the run and the subcategory paths they are listed under.
+    """
+    def __init__(self, store=None, ttl=7 * 24 * 3600, max_workers=8):
+        self.store = store if store is not None else DetailsStore()
+        self.ttl = ttl
+        self.max_workers = max_workers
+        self.membership = MembershipIndex()
+        self._details = {}
+
+    def add_rows(self, rows):
+        """
+        Adds the products of a batch of output rows to the membership index.
+
+        Args:
+            rows (list): List of tuples with the values of `sinks.COLUMNS`.
+        """
+        url_index = COLUMNS.index('URL')
+        for row in rows:
+            url = row[url_index]
+            product = product_id(url)
+            if product is not None:
+                self.membership.add(product, url, tuple(row[:5]))
+
+    def enrich(self, products, fetch) -> dict:
+        """
+        Gets the details of some products, fetching the detail pages of the ones not enriched within the TTL.
+
+        Args:
+            products (list): IDs of the products.
+            fetch (callable): Function downloading a page given its URL (e.g. `BonpreuScraper._parse_html`).
+
+        Returns:
+            dict: Dict mapping the ID of every product to its details (None if its page could not be downloaded).
+        """
+        missing = [product for product in products if product not in self._details]
+        self._details.update(self.store.get(missing, max_age=self.ttl))
+        missing = [product for product in missing if product not in self._details]
+
+        def fetch_details(product):
+            url = self.membership.urls[product]
+            try:
+                details = extract_details(fetch(url), product)
+            except FetchError as e:
+                logger.warning(f"Skipping the details of {url}: {e}")
+                return None
+            except (ValueError, TypeError, AttributeError) as e:
+                # Unexpected content in the page: the product is retried on the next run
+                logger.warning(f"Skipping the details of {url}: could not parse the page ({e!r})")
+                return None
+            self.store.put(product, url, details)
+            return details
+
+        if missing:
+            logger.info(f"Fetching the details of {len(missing)} products "
+                        f"({len(products) - len(missing)} already enriched).")
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                for product, details in zip(missing, executor.map(fetch_details, missing)):
+                    self._details[product] = details
+        return {product: self._details.get(product) for product in products}
+
+    def write_details(self, category, name, fetch, data_dir=DEFAULT_DATA_DIR, timestamp=None) -> int:
+        """
+        Enriches the products of a category and writes their details to data/{name}_details_{timestamp}.csv.
+
+        Args:
+            category (str): Normalized name of the category.
+            name (str): Name of the category used in the output filenames.
+            fetch (callable): Function downloading a page given its URL.
+            data_dir (str | Path): Directory of the output files.
+            timestamp (str): Timestamp of the filename. If None, uses the current time.
+
+        Returns:
+            int: Number of products written.
+        """
+        products = self.membership.products(category)
+        details = self.enrich(products, fetch)
+        rows = []
+        for product in products:
+            product_details = details[product] or {}
+            rows.append((product, self.membership.urls[product], product_details.get('ean'), product_details.get('brand'),
+                         product_details.get('unit_price'), product_details.get('unit'), len(self.membership.paths(product))))
+        with open_sinks(name, suffix="_details", columns=DETAIL_COLUMNS, data_dir=data_dir, timestamp=timestamp) as sink:
+            sink.write_rows(rows)
+        return len(products)
+
+    def close(self):
+        """Closes the store."""
+        self.store.close()
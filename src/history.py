@@ -0,0 +1,115 @@
+import argparse
+import logging
+from pathlib import Path
+
+import pandas as pd
+
+from logging_config import configure_logging
+from postprocess import parse_quantities, unit_prices
+from sinks import COLUMNS, DEFAULT_DATASET_DIR, NULL_PARTITION, PARTITION_COLUMNS, DatasetSink, ParquetSink
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+except ImportError:  # Reading the dataset requires pyarrow
+    pa = None
+
+logger = logging.getLogger(__name__)
+
+
+def _open_dataset(dataset_dir):
+    """Opens the partitioned dataset, reading the partition values as strings."""
+    if pa is None:
+        raise ImportError("Reading the dataset requires pyarrow. Install it with 'pip install pyarrow'.")
+    partitioning = ds.partitioning(pa.schema([(column, pa.string()) for column in PARTITION_COLUMNS]), flavor='hive')
+    # Explicit schema, so the columns missing in the files of older runs are read as nulls
+    schema = pa.schema([
+        (column, pa.float64() if column in ParquetSink.float_columns else pa.string()) for column in COLUMNS
+    ])
+    return ds.dataset(Path(dataset_dir), schema=schema, format='parquet', partitioning=partitioning)
+
+
+def load_history(dataset_dir=DEFAULT_DATASET_DIR, categories=None, start_date=None, end_date=None,
+                 columns=None) -> pd.DataFrame:
+    """
+    Loads the price history saved in the partitioned dataset.
+    The date and category filters only read the matching partitions, and the column selection
+    only reads those columns of the files, so loading a slice of the history does not read the rest.
+
+    Args:
+        dataset_dir (str | Path): Root directory of the dataset.
+        categories (list): Normalized names of the categories to load. If None, loads all of them.
+        start_date (str): First date to load, with the format YYYYmmdd. If None, loads from the beginning.
+        end_date (str): Last date to load, with the format YYYYmmdd. If None, loads until the end.
+        columns (list): Columns to load. If None, loads all the columns.
+
+    Returns:
+        pd.DataFrame: The product information, with the columns in the order of `sinks.COLUMNS`.
+    """
+    dataset = _open_dataset(dataset_dir)
+
+    condition = None
+    for predicate in (
+        ds.field('Category').isin(categories) if categories else None,
+        ds.field('Date') >= start_date if start_date else None,
+        ds.field('Date') <= end_date if end_date else None,
+    ):
+        if predicate is not None:
+            condition = predicate if condition is None else condition & predicate
+
+    columns = columns if columns else [column for column in COLUMNS if column in dataset.schema.names]
+    return dataset.to_table(columns=columns, filter=condition).to_pandas()
+
+
+def history_dates(dataset_dir=DEFAULT_DATASET_DIR) -> list:
+    """
+    Lists the dates saved in the dataset, reading only the directory names.
+
+    Args:
+        dataset_dir (str | Path): Root directory of the dataset.
+
+    Returns:
+        list: Sorted dates with the format YYYYmmdd.
+    """
+    return sorted(path.name.split('=', 1)[1] for path in Path(dataset_dir).glob('Date=*')
+                  if path.is_dir() and path.name != f"Date={NULL_PARTITION}")
+
+
+def csv_to_dataset(paths, dataset_dir=DEFAULT_DATASET_DIR, chunksize=100000):
+    """
+    Appends CSV files exported by previous versions of the scraper to the dataset.
+    The rows without category (or date) are written to the NULL_PARTITION partition, read back as nulls.
+
+    Args:
+        paths (list): Paths of the CSV files.
+        dataset_dir (str | Path): Root directory of the dataset.
+        chunksize (int): Number of rows read at once.
+    """
+    for path in paths:
+        path = Path(path)
+        with DatasetSink(dataset_dir, path.stem) as sink:
+            for chunk in pd.read_csv(path, chunksize=chunksize, dtype={'Date': str}):
+                if 'Quantity Value' not in chunk.columns:
+                    # File exported before the quantity was parsed
+                    values, units = parse_quantities(chunk['Quantity (kg|L)'].tolist())
+                    chunk['Quantity Value'] = values
+                    chunk['Quantity Unit'] = units
+                    chunk['Unit Price'] = unit_prices(chunk['Price'].to_numpy(dtype=float), values)
+                # Empty cells are read as NaN, the sink stores them as nulls
+                chunk = chunk.reindex(columns=COLUMNS)
+                sink.write_rows(list(chunk.itertuples(index=False, name=None)))
+        logger.info(f"Added {path} to the {dataset_dir} dataset.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Import exported CSV files into the partitioned Parquet dataset.')
+    parser.add_argument('csv_files', nargs='+', help='CSV files to import.')
+    parser.add_argument('--dataset-dir', type=str, default=str(DEFAULT_DATASET_DIR),
+                        help='Root directory of the dataset (default: data/dataset).')
+    args = parser.parse_args()
+    configure_logging()
+    csv_to_dataset(args.csv_files, args.dataset_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,183 @@
+import random
+import threading
+import time
+from contextlib import nullcontext
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from rate_control import RequestTicket
+from metrics import Metrics
+
+
+class FetchError(Exception):
+    """
+    Raised when a page could not be downloaded after all the retries.
+
+    Attributes:
+        url (str): URL of the page that failed.
+        reason (str): Description of the last error.
+    """
+    def __init__(self, url, reason):
+        super().__init__(f"Could not fetch {url}: {reason}")
+        self.url = url
+        self.reason = reason
+
+
+class HttpSession():
+    """
+    HTTP session shared by all the requests of a scraper.
+
+    It keeps a pool of keep-alive connections, so consecutive requests to the same host
+    reuse the TCP+TLS connection, and retries the failed requests (timeouts, connection errors,
+    429 and 5xx responses) with exponential backoff and jitter.
+    The timeout adapts to the latency observed in the previous responses.
+    If a ResponseCache is given, fresh cached responses are served without any request and
+    stale ones are revalidated with a conditional GET.
+
+    Attributes:
+        pool_size (int): Maximum number of connections kept open per host.
+        max_retries (int): Number of retries after the first attempt.
+        backoff_factor (float): Base of the exponential backoff, in seconds.
+        max_backoff (float): Maximum number of seconds to wait between two attempts.
+        min_timeout (float): Lower bound of the adaptive timeout, in seconds.
+        max_timeout (float): Upper bound of the adaptive timeout, in seconds.
+        cache (ResponseCache): On-disk cache of the responses, if any.
+        rate_limiter (RateLimiter): Per-host rate limiter applied to every attempt, if any.
+        metrics (Metrics): Counters of the requests, retries, errors, cache hits and bytes downloaded.
+    """
+    # Responses that are worth retrying
+    retry_status_codes = {429, 500, 502, 503, 504}
+    # Responses meaning that the server is overloaded, the rate limiter slows down when it gets them
+    throttle_status_codes = {429, 503}
+
+    def __init__(self, pool_size=10, max_retries=3, backoff_factor=0.5, max_backoff=30,
+                 min_timeout=2, max_timeout=30, cache=None, rate_limiter=None, metrics=None):
+        self.pool_size = pool_size
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.cache = cache
+        self.rate_limiter = rate_limiter
+        self.metrics = metrics if metrics is not None else Metrics(enabled=False)
+
+        # The retries are handled here, so the adapter must not retry on its own
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self._session = requests.Session()
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+
+        # Exponentially weighted moving average of the response time
+        self._latency = None
+        self._latency_lock = threading.Lock()
+
+    @property
+    def timeout(self) -> float:
+        """Current timeout: four times the average latency, bounded by min_timeout and max_timeout."""
+        if self._latency is None:
+            return self.min_timeout
+        return min(self.max_timeout, max(self.min_timeout, 4 * self._latency))
+
+    def _record_latency(self, seconds):
+        """Updates the moving average of the response time."""
+        with self._latency_lock:
+            self._latency = seconds if self._latency is None else 0.8 * self._latency + 0.2 * seconds
+
+    def _backoff(self, attempt, retry_after=None) -> float:
+        """
+        Computes the number of seconds to wait before the next attempt ("full jitter" backoff).
+
+        Args:
+            attempt (int): Number of the failed attempt, starting at 0.
+            retry_after (str): Value of the Retry-After header of the response, if any.
+
+        Returns:
+            float: Seconds to wait.
+        """
+        if retry_after and retry_after.isdigit():
+            return min(self.max_backoff, float(retry_after))
+        return random.uniform(0, min(self.max_backoff, self.backoff_factor * 2 ** attempt))
+
+    def _request_slot(self, url):
+        """Context manager waiting for the rate limiter, if any, before sending a request."""
+        return self.rate_limiter.request(url) if self.rate_limiter else nullcontext(RequestTicket())
+
+    def get(self, url, headers=None) -> requests.Response:
+        """
+        Sends a GET request, retrying it when it fails with a transient error.
+
+        Args:
+            url (str): URL to request.
+            headers (dict): Headers of the request.
+
+        Returns:
+            requests.Response: Successful response.
+
+        Raises:
+            FetchError: If the request still fails after all the retries.
+        """
+        cached = self.cache.lookup(url) if self.cache else None
+        if cached and (cached.fresh or self.cache.offline):
+            self.metrics.increment('cache_hits')
+            return cached.to_response()
+        if self.cache and self.cache.offline:
+            raise FetchError(url, "not found in the offline cache")
+        if cached:
+            # Ask the server to send the page only if it changed
+            headers = {**(headers or {}), **cached.validators()}
+
+        timeout = self.timeout
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            self.metrics.increment('requests')
+            if attempt:
+                self.metrics.increment('retries')
+            # Every attempt, retries included, waits for the rate limiter and reports its outcome to it
+            with self._request_slot(url) as ticket:
+                try:
+                    start = time.monotonic()
+                    response = self._session.get(url, headers=headers, timeout=timeout)
+
+                    if response.status_code in self.retry_status_codes:
+                        reason = f"HTTP {response.status_code}"
+                        retry_after = response.headers.get("Retry-After")
+                        ticket.outcome = 'throttled' if response.status_code in self.throttle_status_codes else 'error'
+                    elif response.status_code == 304 and cached:
+                        self._record_latency(time.monotonic() - start)
+                        self.cache.refresh(url)
+                        self.metrics.increment('not_modified')
+                        return cached.to_response()
+                    else:
+                        self._record_latency(time.monotonic() - start)
+                        response.raise_for_status()
+                        self.metrics.increment('bytes_downloaded', len(response.content))
+                        if self.cache:
+                            self.cache.store(url, response)
+                        return response
+
+                except requests.Timeout:
+                    ticket.outcome = 'timeout'
+                    reason = f"timeout after {timeout:.1f} s"
+                    # Give the next attempt more time
+                    timeout = min(self.max_timeout, 2 * timeout)
+                except requests.ConnectionError as e:
+                    ticket.outcome = 'error'
+                    reason = f"connection error ({e})"
+                except requests.RequestException as e:
+                    # Other errors (e.g. 404) are not transient
+                    self.metrics.increment('http_errors')
+                    raise FetchError(url, str(e)) from e
+
+            self.metrics.increment(f'{ticket.outcome}_responses')
+            if attempt < self.max_retries:
+                time.sleep(self._backoff(attempt, retry_after))
+
+        raise FetchError(url, reason)
+
+    def close(self):
+        """Closes all the pooled connections and the cache."""
+        self._session.close()
+        if self.cache:
+            self.cache.close()
@@ -0,0 +1,136 @@
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from sinks import product_key
+
+
+# Default location of the fingerprints of the subcategory pages
+DEFAULT_FINGERPRINTS_PATH = Path(__file__).parent.parent / "data" / ".incremental" / "fingerprints.sqlite"
+
+# Parts of the HTML that hold the information of the product cards: the card containers,
+# the product names and URLs, and the text of the price and quantity spans
+CARD_TOKENS = re.compile(
+    r'product-card-container'
+    r'|aria-label="[^"]*"'
+    r'|href="/products/[^"]*"'
+    r'|(?:bwsVzh|asqfi)">[^<]*<'
+)
+
+
+def page_fingerprint(html_page) -> str:
+    """
+    Computes a hash of the product-card region of a subcategory page.
+    Only the card information is hashed, so changes elsewhere in the page (scripts, tokens, banners)
+    do not make an unchanged listing look different. It runs on the raw HTML, without parsing it.
+
+    Args:
+        html_page (str): HTML content of the subcategory page.
+
+    Returns:
+        str: Hex digest of the product-card region.
+    """
+    start = html_page.find('product-card-container')
+    if start == -1:
+        return hashlib.sha1(b'').hexdigest()
+
+    digest = hashlib.sha1()
+    for token in CARD_TOKENS.finditer(html_page, start):
+        digest.update(token.group().encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def diff_products(previous, current) -> list:
+    """
+    Compares the products of a page with the ones of its previous crawl.
+
+    Args:
+        previous (list): List of (product name, price, quantity, URL) tuples of the previous crawl.
+        current (list): List of (product name, price, quantity, URL) tuples of the current crawl.
+
+    Returns:
+        list: List of (change, product, previous price) tuples, where change is 'added', 'removed' or 'price_changed'.
+    """
+    # The products are matched by the ID of their URL, which does not depend on the slug
+    previous_by_key = {product_key(product[3]): product for product in previous}
+    current_by_key = {product_key(product[3]): product for product in current}
+
+    changes = []
+    for key, product in current_by_key.items():
+        if key not in previous_by_key:
+            changes.append(('added', product, None))
+        elif product[1] != previous_by_key[key][1]:
+            changes.append(('price_changed', product, previous_by_key[key][1]))
+    for key, product in previous_by_key.items():
+        if key not in current_by_key:
+            changes.append(('removed', product, product[1]))
+
+    return changes
+
+
+class FingerprintStore():
+    """
+    Store of the fingerprint, fetch time and products of every subcategory page crawled.
+    It lets the scraper skip the parsing of the pages that did not change since the previous crawl
+    and compute what changed in the ones that did.
+
+    Attributes:
+        path (Path): Path of the SQLite database.
+    """
+    def __init__(self, path=DEFAULT_FINGERPRINTS_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        with self._db:
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS pages (
+                    url TEXT PRIMARY KEY,
+                    fingerprint TEXT NOT NULL,
+                    fetched_at REAL NOT NULL,
+                    products TEXT NOT NULL
+                )
+            """)
+
+    def get(self, url) -> tuple:
+        """
+        Gets the last crawl of a page.
+
+        Args:
+            url (str): URL of the subcategory page.
+
+        Returns:
+            tuple: (fingerprint, fetch time, products) tuple, or None if the page was never crawled.
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT fingerprint, fetched_at, products FROM pages WHERE url = ?", (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        fingerprint, fetched_at, products = row
+        return fingerprint, fetched_at, [tuple(product) for product in json.loads(products)]
+
+    def put(self, url, fingerprint, products):
+        """
+        Saves the crawl of a page.
+
+        Args:
+            url (str): URL of the subcategory page.
+            fingerprint (str): Fingerprint of the page.
+            products (list): List of (product name, price, quantity, URL) tuples of the page.
+        """
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?)",
+                (url, fingerprint, time.time(), json.dumps(products, ensure_ascii=False))
+            )
+
+    def close(self):
+        """Closes the database."""
+        self._db.close()
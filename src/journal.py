@@ -0,0 +1,199 @@
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+
+
+# Default directory of the run journals
+DEFAULT_RUNS_DIR = Path(__file__).parent.parent / "data" / ".runs"
+
+
+class CategoryJournal():
+    """
+    Progress of the scraping of one category: the discovered leaf pages and the rows of every completed page.
+    The rows are appended to a JSON lines file as soon as each page is extracted.
+
+    Attributes:
+        path (Path): Directory of the category journal.
+        timestamp (str): Timestamp of the output files of the category.
+        leaves (list): Category, subcategories and URL of every leaf page, or None if not discovered yet.
+    """
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+
+        state_path = self.path / "state.json"
+        if state_path.exists():
+            state = json.loads(state_path.read_text(encoding='utf-8'))
+        else:
+            state = {'timestamp': time.strftime("%Y%m%d_%H%M%S"), 'done': False}
+            self._write_json(state_path, state)
+        self.timestamp = state['timestamp']
+        self.done = state['done']
+
+        leaves_path = self.path / "leaves.json"
+        self.leaves = json.loads(leaves_path.read_text(encoding='utf-8')) if leaves_path.exists() else None
+        self._pages_file = None
+
+    @staticmethod
+    def _write_json(path, content):
+        """Writes a JSON file atomically."""
+        tmp_path = path.with_suffix('.tmp')
+        tmp_path.write_text(json.dumps(content, ensure_ascii=False), encoding='utf-8')
+        tmp_path.replace(path)
+
+    def save_leaves(self, leaves):
+        """
+        Saves the leaf pages of the category, so a resumed run does not crawl the category tree again.
+
+        Args:
+            leaves (list): Category, subcategories and URL of every leaf page.
+        """
+        self.leaves = leaves
+        self._write_json(self.path / "leaves.json", leaves)
+
+    def completed_pages(self) -> dict:
+        """
+        Reads the pages completed so far.
+
+        Returns:
+            dict: Dict mapping the index of each completed leaf page to its (rows, delta rows) tuple.
+        """
+        pages = {}
+        pages_path = self.path / "pages.jsonl"
+        if not pages_path.exists():
+            return pages
+        with open(pages_path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Last line cut by a crash, the page will be downloaded again
+                    break
+                pages[record['index']] = (
+                    [tuple(row) for row in record['rows']],
+                    [tuple(row) for row in record['delta']],
+                )
+        return pages
+
+    def record_page(self, index, url, rows, delta_rows=()):
+        """
+        Saves the rows of a completed page.
+
+        Args:
+            index (int): Index of the page in the leaves.
+            url (str): URL of the page.
+            rows (list): Output rows of the page.
+            delta_rows (list): Delta rows of the page, in incremental mode.
+        """
+        if self._pages_file is None:
+            self._pages_file = open(self.path / "pages.jsonl", 'a', encoding='utf-8')
+        record = {'index': index, 'url': url, 'rows': rows, 'delta': list(delta_rows)}
+        self._pages_file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self._pages_file.flush()
+        os.fsync(self._pages_file.fileno())
+
+    def mark_done(self):
+        """Marks the category as completed."""
+        self.close()
+        self.done = True
+        self._write_json(self.path / "state.json", {'timestamp': self.timestamp, 'done': True})
+
+    def close(self):
+        """Closes the pages file."""
+        if self._pages_file is not None:
+            self._pages_file.close()
+            self._pages_file = None
+
+
+class RunJournal():
+    """
+    Journal of a scraping run, used to resume it after a failure or an interruption.
+    It keeps the settings of the run and one CategoryJournal per category.
+
+    Attributes:
+        run_id (str): Identifier of the run.
+        path (Path): Directory of the run journal.
+        settings (dict): Settings of the run (categories, subcategories, output formats...).
+    """
+    def __init__(self, run_id, runs_dir=DEFAULT_RUNS_DIR, settings=None):
+        self.run_id = run_id
+        self.path = Path(runs_dir) / run_id
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.settings = settings if settings is not None else {}
+        CategoryJournal._write_json(self.path / "run.json", self.settings)
+        self._categories = {}
+
+    @classmethod
+    def start(cls, settings, runs_dir=DEFAULT_RUNS_DIR):
+        """
+        Starts the journal of a new run. The run ID is the start time and the PID of the process,
+        and its directory is created exclusively, so runs started in the same second never share a journal.
+
+        Args:
+            settings (dict): Settings of the run.
+            runs_dir (str | Path): Directory of the run journals.
+
+        Returns:
+            RunJournal: The new journal.
+        """
+        runs_dir = Path(runs_dir)
+        runs_dir.mkdir(parents=True, exist_ok=True)
+        base_id = f"{time.strftime('%Y%m%d_%H%M%S')}_{os.getpid()}"
+        run_id, n = base_id, 1
+        while True:
+            try:
+                (runs_dir / run_id).mkdir()
+                break
+            except FileExistsError:
+                n += 1
+                run_id = f"{base_id}_{n}"
+        return cls(run_id, runs_dir, settings)
+
+    @classmethod
+    def resume(cls, run_id, runs_dir=DEFAULT_RUNS_DIR):
+        """
+        Opens the journal of an interrupted run.
+
+        Args:
+            run_id (str): Identifier of the run.
+            runs_dir (str | Path): Directory of the run journals.
+
+        Returns:
+            RunJournal: The journal of the run.
+
+        Raises:
+            FileNotFoundError: If there is no journal for the run.
+        """
+        run_path = Path(runs_dir) / run_id / "run.json"
+        if not run_path.exists():
+            raise FileNotFoundError(f"No journal found for the run '{run_id}' in {runs_dir}.")
+        settings = json.loads(run_path.read_text(encoding='utf-8'))
+        return cls(run_id, runs_dir, settings)
+
+    def category(self, category) -> CategoryJournal:
+        """
+        Gets the journal of a category.
+
+        Args:
+            category (str): Name of the category.
+
+        Returns:
+            CategoryJournal: The journal of the category.
+        """
+        if category not in self._categories:
+            self._categories[category] = CategoryJournal(self.path / category)
+        return self._categories[category]
+
+    def close(self, completed=False):
+        """
+        Closes the journal. Once the run is completed, the journal is no longer needed and is removed.
+
+        Args:
+            completed (bool): Whether all the categories of the run were completed.
+        """
+        for category_journal in self._categories.values():
+            category_journal.close()
+        if completed:
+            shutil.rmtree(self.path, ignore_errors=True)
@@ -0,0 +1,44 @@
+import json
+import logging
+import sys
+import time
+
+
+# Attributes of every log record, the other ones are the `extra` fields of the call
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats every record as a JSON object on a single line, with its time, level, logger,
+    message and `extra` fields (e.g. `logger.info("Page fetched", extra={'url': url})`).
+    """
+    def format(self, record) -> str:
+        entry = {
+            'time': time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record.created)),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        entry.update({key: value for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES})
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def configure_logging(level="INFO", json_format=False):
+    """
+    Configures the logs of the scraper, written to the standard output.
+    The text format only shows the messages, like the output of the scraper before it used logging.
+
+    Args:
+        level (str): Minimum level of the messages shown ("DEBUG", "INFO", "WARNING"...).
+        json_format (bool): If True, writes every message as a JSON object, for log collectors.
+    """
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(JsonFormatter() if json_format else logging.Formatter('%(message)s'))
+    root = logging.getLogger()
+    for previous in list(root.handlers):
+        root.removeHandler(previous)
+    root.addHandler(handler)
+    root.setLevel(level.upper() if isinstance(level, str) else level)
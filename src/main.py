@@ -1,80 +1,605 @@
-from scraper import BonpreuScraper
+# Only the lightweight modules are imported here. The others are imported by the commands that use them,
+# so the listing commands start without loading requests, pandas, pyarrow nor selenium.
+from navigation import DEFAULT_CATEGORIES, SiteNavigation
+from response_cache import DEFAULT_CACHE_DIR
+from sinks import DEFAULT_DATA_DIR
+from distributed import DEFAULT_QUEUE_PATH, DEFAULT_PARTS_DIR
+from logging_config import configure_logging
+from pathlib import Path
 import argparse
+import logging
+import signal
+import sys
+import threading
 
-def main():
+logger = logging.getLogger(__name__)
+
+# Seconds the saved category tree is used by the listing commands before downloading the menus again
+LIST_MAX_AGE = 24 * 3600
+
+def parse_ttl(value):
     """
-    Main function to run the Bonpreu scraper.
+    Parses a --cache-ttl option with the format PATTERN=SECONDS.
+    
+    Args:
+        value (str): Value of the option.
+    
+    Returns:
+        tuple: (pattern, seconds) tuple.
     """
-    # Set the base URL and available categories from BonpreuScraper
-    base_url = "https://www.compraonline.bonpreuesclat.cat"
-    all_categories = BonpreuScraper.categories()
+    pattern, _, seconds = value.rpartition('=')
+    try:
+        return pattern, float(seconds)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid TTL '{value}', expected PATTERN=SECONDS.")
+
+def add_crawl_arguments(parser, suppress_defaults=False):
+    """
+    Adds the options of a scraping run to a parser.
     
-    # Configure parser
-    parser = argparse.ArgumentParser(description="Run the Bonpreu scraper.")
-    parser.add_argument('--category', type=str, nargs='+', choices=all_categories + ["all"],
+    Args:
+        parser (argparse.ArgumentParser): Main parser or parser of a subcommand.
+        suppress_defaults (bool): If True, the options that are not given keep the value parsed by the main parser,
+            so they can be written before or after the subcommand.
+    """
+    def default(value):
+        return argparse.SUPPRESS if suppress_defaults else value
+    
+    parser.add_argument('--category', type=str, nargs='+', choices=DEFAULT_CATEGORIES + ["all"], default=default(None),
                         help='Specify one or more categories to scrape or "all" for all categories.')
-    parser.add_argument('--subcategories', type=str, nargs='*',
+    parser.add_argument('--subcategories', type=str, nargs='*', default=default(None),
                         help='Specify subcategories to scrape (optional, only applies to single categories).')
+    parser.add_argument('--workers', type=int, default=default(8),
+                        help='Number of pages fetched concurrently (default: 8). Use 1 for a sequential run.')
+    parser.add_argument('--rate', type=float, default=default(10),
+                        help='Initial number of requests per second to the website (default: 10). '
+                             'It is raised while the responses are healthy and lowered on 429/503 responses or timeouts.')
+    parser.add_argument('--max-rate', type=float, default=default(50),
+                        help='Maximum number of requests per second to the website (default: 50).')
+    parser.add_argument('--parse-processes', type=int, default=default(0),
+                        help='Number of processes used to parse the product pages (default: 0, parse in the fetch workers).')
+    parser.add_argument('--parser', type=str, default=default('auto'), choices=['auto', 'selectolax', 'lxml', 'bs4'],
+                        help='Backend used to parse the product cards (default: auto, the fastest one installed).')
+    parser.add_argument('--data-source', type=str, default=default('html'), choices=['html', 'state'],
+                        help='Read the products from the HTML product cards or from the state embedded in the page, '
+                             'which includes the lazily loaded products (default: html).')
+    parser.add_argument('--cache-dir', type=str, default=default(str(DEFAULT_CACHE_DIR)),
+                        help='Directory of the on-disk cache of the downloaded pages (default: data/.cache).')
+    parser.add_argument('--no-cache', action='store_true', default=default(False),
+                        help='Do not cache the downloaded pages.')
+    parser.add_argument('--cache-ttl', type=parse_ttl, action='append', default=default([]), metavar='PATTERN=SECONDS',
+                        help='Serve the cached pages whose URL matches PATTERN (regex) without revalidating them for SECONDS. Can be repeated.')
+    parser.add_argument('--cache-default-ttl', type=float, default=default(0),
+                        help='Seconds the cached pages not matching any --cache-ttl are served without revalidation (default: 0, always revalidate).')
+    parser.add_argument('--offline', action='store_true', default=default(False),
+                        help='Replay the pages stored in the cache without sending any request.')
+    parser.add_argument('--output-format', type=str, nargs='+', choices=['csv', 'parquet', 'dataset', 'sqlite'], default=default(['csv']),
+                        help='Format(s) of the output files (default: csv). "dataset" appends to the Parquet dataset '
+                             'partitioned by date and category in data/dataset, and "sqlite" to the price store '
+                             'data/prices.sqlite. Parquet requires pyarrow.')
+    parser.add_argument('--incremental', action='store_true', default=default(False),
+                        help='Only parse the subcategory pages that changed since the previous run and save the changes to a *_delta_*.csv file.')
+    parser.add_argument('--navigation-max-age', type=float, default=default(0),
+                        help='Reuse the category tree saved by a previous run if it is newer than these seconds (default: 0, rebuild it).')
+    parser.add_argument('--resume', type=str, metavar='RUN_ID', default=default(None),
+                        help='Resume an interrupted run, skipping the pages it already completed.')
+    parser.add_argument('--enrich', action='store_true', default=default(False),
+                        help='Fetch the detail page of every unique product (EAN, brand and unit price) and save them '
+                             'to a *_details_*.csv file per category.')
+    parser.add_argument('--enrich-ttl', type=float, default=default(7 * 24 * 3600),
+                        help='Seconds the details of a product are reused before fetching its page again (default: 604800, a week).')
+    parser.add_argument('--no-archive', action='store_true', default=default(False),
+                        help='Do not keep the raw pages fetched in the compressed archive used by the reextract command.')
+    parser.add_argument('--archive-dir', type=str, default=default(None),
+                        help='Directory of the archive of the raw pages (default: DATA_DIR/.archive).')
+    add_global_arguments(parser, suppress_defaults)
+
+def add_global_arguments(parser, suppress_defaults=False):
+    """
+    Adds the options shared by all the commands to a parser (website, data directory, metrics and logs).
+    
+    Args:
+        parser (argparse.ArgumentParser): Main parser or parser of a subcommand.
+        suppress_defaults (bool): If True, the options that are not given keep the value parsed by the main parser.
+    """
+    def default(value):
+        return argparse.SUPPRESS if suppress_defaults else value
+    
+    parser.add_argument('--base-url', type=str, default=default("https://www.compraonline.bonpreuesclat.cat"),
+                        help='Main URL of the website (default: https://www.compraonline.bonpreuesclat.cat). '
+                             'Used to run the scraper against a local copy of the site, e.g. the benchmark fixture site.')
+    parser.add_argument('--data-dir', type=str, default=default(str(DEFAULT_DATA_DIR)),
+                        help='Directory of the output files and the run journals (default: data).')
+    parser.add_argument('--metrics-report', type=str, metavar='PATH', default=default(None),
+                        help='Write a JSON report of the run (stage timings, throughput, retries and errors) to PATH.')
+    parser.add_argument('--prometheus-file', type=str, metavar='PATH', default=default(None),
+                        help='Write the metrics of the run to PATH with the Prometheus text format.')
+    parser.add_argument('--log-format', type=str, default=default('text'), choices=['text', 'json'],
+                        help='Format of the logs: plain messages or one JSON object per line (default: text).')
+    parser.add_argument('--log-level', type=str, default=default('INFO'), choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'],
+                        help='Minimum level of the logged messages (default: INFO).')
+
+def build_parser() -> argparse.ArgumentParser:
+    """
+    Builds the parser of the command line.
+    Without a subcommand, the options run a scraping run as in the previous versions (same as `crawl`).
+    
+    Returns:
+        argparse.ArgumentParser: Parser of the command line.
+    """
+    parser = argparse.ArgumentParser(description="Run the Bonpreu scraper.")
+    add_crawl_arguments(parser)
     parser.add_argument('--list-categories', action='store_true',
-                            help='List available categories and exit.')
+                        help='List available categories and exit (same as the categories command).')
     parser.add_argument('--list-subcategories', action='store_true',
-                        help='List available subcategories for the selected category and exit.')
-    args = parser.parse_args()
+                        help='List available subcategories for the selected category and exit (same as the subcategories command).')
+    
+    # Options of a scraping run, also accepted after the subcommands that crawl the website
+    crawl_parent = argparse.ArgumentParser(add_help=False)
+    add_crawl_arguments(crawl_parent, suppress_defaults=True)
+    # Options of all the commands, also accepted after the other subcommands
+    global_parent = argparse.ArgumentParser(add_help=False)
+    add_global_arguments(global_parent, suppress_defaults=True)
+    
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.add_parser('crawl', parents=[crawl_parent], help='Scrape the selected categories (default command).')
+    subparsers.add_parser('categories', parents=[global_parent], help='List the available categories.')
+    subcategories_parser = subparsers.add_parser('subcategories', parents=[global_parent],
+                                                 help='List the subcategories of a category, from the category tree '
+                                                      'saved by the previous runs when it is recent enough.')
+    subcategories_parser.add_argument('list_category', type=str, choices=DEFAULT_CATEGORIES, metavar='CATEGORY',
+                                      help='Category whose subcategories are listed.')
+    subcategories_parser.add_argument('--max-age', type=float, default=LIST_MAX_AGE,
+                                      help='Seconds the saved category tree is used before downloading the menus again '
+                                           '(default: 86400, a day). Use 0 to always download them.')
+    subcategories_parser.add_argument('--cache-dir', type=str, default=argparse.SUPPRESS,
+                                      help='Directory of the saved category tree (default: data/.cache).')
+    
+    import_parser = subparsers.add_parser('import-csv', parents=[global_parent],
+                                          help='Import exported CSV files into the SQLite price store.')
+    import_parser.add_argument('csv_files', type=str, nargs='+', help='CSV files to import.')
+    import_parser.add_argument('--db', type=str, help='Path of the price store (default: data/prices.sqlite).')
+    
+    # Distributed mode: the coordinator queues the leaf pages, the workers crawl them and the coordinator merges their outputs
+    queue_parent = argparse.ArgumentParser(add_help=False)
+    queue_parent.add_argument('--queue', type=str, default=str(DEFAULT_QUEUE_PATH),
+                              help='Work queue shared by the coordinator and the workers: path of a SQLite database '
+                                   'or URL of another backend (default: data/queue.sqlite).')
+    queue_parent.add_argument('--parts-dir', type=str, default=str(DEFAULT_PARTS_DIR),
+                              help='Directory of the partial outputs of the workers (default: data/.parts).')
+    subparsers.add_parser('enqueue', parents=[queue_parent, crawl_parent],
+                          help='Discover the pages of the selected categories and add them to the work queue.')
+    work_parser = subparsers.add_parser('work', parents=[queue_parent, crawl_parent],
+                                        help='Crawl the pages of the work queue until it is empty.')
+    work_parser.add_argument('--worker-id', type=str, help='Unique name of the worker (default: HOSTNAME-PID).')
+    work_parser.add_argument('--batch-size', type=int, default=16, help='Number of pages leased at once (default: 16).')
+    work_parser.add_argument('--lease', type=float, default=300,
+                             help='Seconds a leased page is reserved before another worker can take it (default: 300).')
+    work_parser.add_argument('--no-wait', action='store_true',
+                             help='Stop when there is no page to lease, instead of waiting for the leases of other workers.')
+    merge_parser = subparsers.add_parser('merge', parents=[queue_parent, global_parent],
+                                         help='Merge the outputs of the workers into the usual per-category files.')
+    merge_parser.add_argument('--job', type=str, nargs='+', help='Jobs to merge (default: all the completed jobs).')
+    merge_parser.add_argument('--partial', action='store_true', help='Also merge jobs with pages still in progress.')
+    
+    # Extract the products again from the archived pages, e.g. after fixing the parser
+    reextract_parser = subparsers.add_parser('reextract', parents=[crawl_parent],
+                                             help='Extract the products again from the pages archived on a day, '
+                                                  'without sending any request.')
+    reextract_parser.add_argument('day', type=str, nargs='?', help='Archived day, with the format YYYYmmdd (default: the last one).')
+    reextract_parser.add_argument('--processes', type=int, help='Number of processes parsing the pages (default: one per CPU core).')
+    
+    # Daemon mode: every leaf page is visited again according to how often its prices change
+    schedule_parent = argparse.ArgumentParser(add_help=False)
+    schedule_parent.add_argument('--budget', type=float, default=600,
+                                 help='Page visits per hour shared by all the pages (default: 600).')
+    schedule_parent.add_argument('--min-interval', type=float, default=3600,
+                                 help='Minimum seconds between two visits of a page (default: 3600).')
+    schedule_parent.add_argument('--max-interval', type=float, default=7 * 24 * 3600,
+                                 help='Maximum seconds between two visits of a page (default: 604800, a week).')
+    daemon_parser = subparsers.add_parser('daemon', parents=[schedule_parent, crawl_parent],
+                                          help='Crawl continuously, visiting the pages whose prices change often more frequently '
+                                               '(default: all the categories).')
+    daemon_parser.add_argument('--schedule', type=str,
+                               help='Path of the state of the scheduler (default: DATA_DIR/schedule.sqlite).')
+    daemon_parser.add_argument('--batch-size', type=int, default=16, help='Maximum number of due pages fetched at once (default: 16).')
+    daemon_parser.add_argument('--rediscover-interval', type=float, default=24 * 3600,
+                               help='Seconds between two crawls of the category trees (default: 86400, a day).')
+    subparsers.add_parser('simulate', parents=[schedule_parent, global_parent],
+                          help='Replay the exported snapshots to compare the daemon scheduler with visiting '
+                               'all the pages equally, without sending any request.')
+    return parser
+
+def parse_args(parser, argv=None) -> argparse.Namespace:
+    """
+    Parses the command line. The options given before the subcommand are parsed on their own first,
+    so the options with several values (e.g. `--category Frescos crawl`) do not take the subcommand as a value.
+    
+    Args:
+        parser (argparse.ArgumentParser): Parser built by build_parser.
+        argv (list): Command line arguments. If None, uses sys.argv.
+    
+    Returns:
+        argparse.Namespace: Parsed arguments.
+    """
+    argv = sys.argv[1:] if argv is None else list(argv)
+    commands = next(action.choices for action in parser._actions if isinstance(action, argparse._SubParsersAction))
+    start = next((i for i, arg in enumerate(argv) if arg in commands), 0)
+    if start == 0:
+        return parser.parse_args(argv)
+    # The options of the subcommand have no default, so they do not replace the ones given before it
+    return parser.parse_args(argv[start:], namespace=parser.parse_args(argv[:start]))
+
+def list_categories():
+    """Prints the categories that can be scraped."""
+    print("Available categories:")
+    for category in DEFAULT_CATEGORIES:
+        print(f"- {category}")
+
+def list_subcategories(category, base_url, cache_dir, max_age, save=True):
+    """
+    Prints the subcategories of a category. They are read from the category tree saved by the previous runs
+    if it is newer than max_age, and downloaded otherwise.
+    
+    Args:
+        category (str): Name of the category.
+        base_url (str): The main URL of the website.
+        cache_dir (str | Path): Directory of the saved category tree.
+        max_age (float): Maximum age of the saved category tree, in seconds.
+        save (bool): If True, saves the category tree after downloading the menus.
+    """
+    navigation_path = Path(cache_dir) / "navigation.json"
+    navigation = SiteNavigation.load(base_url, navigation_path, max_age=max_age) if max_age > 0 else SiteNavigation(base_url)
+    subcategories = navigation.subcategory_names(category)
+    if subcategories is None:
+        from scraper import BonpreuScraper
+        from http_session import FetchError
+        scraper = BonpreuScraper(base_url, category, navigation=navigation)
+        try:
+            subcategories = scraper.get_subcategories_names()
+        except FetchError as e:
+            logger.error(f"Error: {e}")
+            return
+        finally:
+            scraper.session.close()
+        if save:
+            navigation.save(navigation_path)
+    print(f"Available subcategories for '{category}':")
+    for sub in subcategories:
+        print(f"- {sub}")
+
+def import_csv_files(args):
+    """Imports CSV snapshots into the price store."""
+    from price_store import PriceStore, DEFAULT_PRICE_DB_PATH, import_csv
+    db = args.db or str(DEFAULT_PRICE_DB_PATH)
+    store = PriceStore(db)
+    try:
+        n_rows = import_csv(args.csv_files, store)
+    finally:
+        store.close()
+    print(f"Imported {n_rows} rows into {db}.")
+
+def merge_jobs(args):
+    """Merges the outputs of the jobs of a distributed run."""
+    from work_queue import open_queue
+    from distributed import merge_job
+    queue = open_queue(args.queue)
+    try:
+        for job in args.job or queue.jobs():
+            progress = queue.progress(job)
+            if args.job or args.partial or not (progress['pending'] or progress['leased']):
+                merge_job(queue, job, args.parts_dir, args.data_dir, allow_partial=args.partial)
+            else:
+                logger.info(f"Skipping the job {job}: {progress['pending'] + progress['leased']} pages in progress.")
+    except RuntimeError as e:
+        logger.error(f"Error: {e}")
+    finally:
+        queue.close()
+
+def reextract(args, archive_dir):
+    """Extracts the products again from the pages archived on a day."""
+    from page_archive import PageArchive
+    from reextract import reextract_day
+    from metrics import Metrics
+    base_url = args.base_url.rstrip('/')
+    archive = PageArchive(archive_dir)
+    day = args.day or (archive.days() or [None])[-1]
+    if day is None:
+        logger.error(f"Error: there are no archived pages in {archive_dir}.")
+        return
+    metrics = Metrics(enabled=bool(args.metrics_report or args.prometheus_file))
+    categories = None if not args.category or "all" in args.category else args.category
+    try:
+        failed_urls = reextract_day(archive, day, base_url, categories, formats=args.output_format,
+                                    data_dir=args.data_dir, processes=args.processes, parser=args.parser,
+                                    data_source=args.data_source,
+                                    navigation=SiteNavigation.load(base_url, Path(args.cache_dir) / "navigation.json"),
+                                    metrics=metrics)
+    except FileNotFoundError as e:
+        logger.error(f"Error: {e}")
+        return
+    if failed_urls:
+        logger.warning(f"{len(failed_urls)} pages were not archived on {day}.")
+    if args.metrics_report:
+        metrics.write_json(args.metrics_report)
+    if args.prometheus_file:
+        metrics.write_prometheus(args.prometheus_file)
+
+def simulate_schedule(args):
+    """Simulates the revisit scheduler against the exported snapshots."""
+    from scheduler import load_snapshot_history, simulate
+    history = load_snapshot_history(args.data_dir)
+    if history.empty:
+        logger.error(f"Error: there are no exported CSV files in {args.data_dir}.")
+        return
+    results = simulate(history, args.budget, args.min_interval, args.max_interval)
+    print(f"Simulated {results['days']} days of {results['pages']} pages with {results['changes']} price changes "
+          f"and a budget of {args.budget:g} visits per hour:")
+    for name in ('adaptive', 'uniform'):
+        result = results[name]
+        print(f"- {name}: {result['visits']} visits, {result['changes_detected']} changes detected, "
+              f"{result['mean_delay_hours']:.1f} hours from a change to its detection on average")
+
+def main(argv=None):
+    """
+    Main function to run the Bonpreu scraper.
+    
+    Args:
+        argv (list): Command line arguments. If None, uses sys.argv.
+    """
+    # Available categories
+    all_categories = DEFAULT_CATEGORIES
+    
+    # Configure parser
+    parser = build_parser()
+    args = parse_args(parser, argv)
+    base_url = args.base_url.rstrip('/')
+    runs_dir = Path(args.data_dir) / ".runs"
+    archive_dir = Path(args.archive_dir) if args.archive_dir else Path(args.data_dir) / ".archive"
+    configure_logging(args.log_level, json_format=args.log_format == 'json')
     
     # List categories if requested
-    if args.list_categories:
-        print("Available categories:")
-        for category in all_categories:
-            print(f"- {category}")
+    if args.command == 'categories' or args.list_categories:
+        list_categories()
         return  # Exit after listing categories
-       
+    
+    # List the subcategories of a category, from the saved category tree if it is recent enough
+    if args.command == 'subcategories':
+        list_subcategories(args.list_category, base_url, args.cache_dir, args.max_age)
+        return
+    if args.list_subcategories:
+        if not args.category or len(args.category) > 1 or "all" in args.category:
+            logger.error("Error: Cannot list subcategories for multiple categories. Please specify a single category.")
+            return  # Exit if invalid combination is provided
+        list_subcategories(args.category[0], base_url, args.cache_dir, args.navigation_max_age or LIST_MAX_AGE,
+                           save=not args.no_cache)
+        return
+    
+    # Import CSV snapshots into the price store if requested
+    if args.command == 'import-csv':
+        import_csv_files(args)
+        return
+    
+    # Merge the outputs of a distributed run
+    if args.command == 'merge':
+        merge_jobs(args)
+        return
+    
+    # Extract the products again from the archived pages
+    if args.command == 'reextract':
+        reextract(args, archive_dir)
+        return
+    
+    # Replay the snapshots with the scheduler of the daemon
+    if args.command == 'simulate':
+        simulate_schedule(args)
+        return
+    
+    # The scraping commands (crawl, enqueue, work and daemon) load the fetching, parsing and output backends
+    from scraper import BonpreuScraper
+    from http_session import HttpSession, FetchError
+    from response_cache import ResponseCache
+    from incremental import FingerprintStore
+    from journal import RunJournal
+    from rate_control import RateLimiter
+    from enrichment import Enricher, DetailsStore
+    from page_archive import PageArchive
+    from work_queue import open_queue
+    from distributed import Worker, enqueue_category
+    from scheduler import RevisitScheduler, load_snapshot_history, history_stats
+    from daemon import Daemon
+    from postprocess import normalize_text
+    from metrics import Metrics
+    
+    # Restore the settings of the interrupted run
+    journal = None
+    if args.resume:
+        try:
+            journal = RunJournal.resume(args.resume, runs_dir)
+        except FileNotFoundError as e:
+            logger.error(f"Error: {e}")
+            return
+        args.category = journal.settings['category']
+        args.subcategories = journal.settings['subcategories']
+        args.output_format = journal.settings['output_format']
+        args.incremental = journal.settings['incremental']
+    
     # If "all" is selected, replace args.category with all categories
-    if "all" in args.category:
+    if args.command == 'work':
+        # The workers take the categories from the work queue
+        selected_categories = []
+    elif args.command == 'daemon' and (not args.category or "all" in args.category):
+        selected_categories = all_categories
+    elif not args.category:
+        parser.error("the following arguments are required: --category")
+    elif "all" in args.category:
         selected_categories = all_categories
     else:
         selected_categories = args.category
     
     # Check if multiple categories and subcategories were specified
     if len(selected_categories) > 1 and args.subcategories:
-        print("Error: Subcategories cannot be specified when multiple categories are selected.")
+        logger.error("Error: Subcategories cannot be specified when multiple categories are selected.")
         return  # Exit if invalid combination is provided
     
-    # Check if multiple categories are selected with list-subcategories
-    if len(selected_categories) > 1 and args.list_subcategories:
-        print("Error: Cannot list subcategories for multiple categories. Please specify a single category.")
-        return  # Exit if invalid combination is provided
+    # Check that the offline mode has a cache to replay
+    if args.offline and args.no_cache:
+        logger.error("Error: --offline needs the cache, it cannot be used with --no-cache.")
+        return
     
-    # Iterate over each selected category
-    for category in selected_categories:
-        # Create scraper instance for the specified category
-        scraper = BonpreuScraper(base_url, category)
+    # Share the pooled HTTP connections and the cache between all the categories
+    cache = None
+    if not args.no_cache:
+        cache = ResponseCache(args.cache_dir, ttls=args.cache_ttl, default_ttl=args.cache_default_ttl,
+                              offline=args.offline)
+    # Adaptive rate limiter shared by all the requests of the run
+    rate_limiter = RateLimiter(rate=args.rate, max_concurrency=args.workers, max_rate=args.max_rate)
+    # Metrics of the run, only recorded if a report is requested
+    metrics = Metrics(enabled=bool(args.metrics_report or args.prometheus_file))
+    session = HttpSession(pool_size=args.workers, cache=cache, rate_limiter=rate_limiter, metrics=metrics)
     
-        # List subcategories if requested
-        if args.list_subcategories:
-            subcategories = scraper.get_subcategories_names()
-            print(f"Available subcategories for '{category}':")
-            for sub in subcategories:
-                print(f"- {sub}")
-            continue  # Continue to next category after listing subcategories
-    
-        # Validate and filter subcategories
-        if args.subcategories:
-            # Get available subcategories for validation
-            available_subcategories = scraper.get_subcategories_names()
-            selected_subcategories = [sub for sub in args.subcategories if sub in available_subcategories]
-            
-            if not selected_subcategories:
-                print("No valid subcategories selected.")
-                return
+    # Share the category tree between all the categories, so each menu page is downloaded once per run
+    navigation_path = Path(args.cache_dir) / "navigation.json"
+    if args.navigation_max_age > 0:
+        navigation = SiteNavigation.load(base_url, navigation_path, max_age=args.navigation_max_age)
+    else:
+        navigation = SiteNavigation(base_url)
+    
+    # Fingerprints of the subcategory pages of the previous runs, used by the incremental mode
+    fingerprints = FingerprintStore(Path(args.data_dir) / ".incremental" / "fingerprints.sqlite") if args.incremental else None
+    
+    # Archive of the raw pages fetched, shared by all the categories
+    archive = PageArchive(archive_dir) if not args.no_archive and not args.offline else None
+    
+    # Details of the products, shared by all the categories so each product is fetched once
+    enricher = None
+    if args.enrich:
+        enricher = Enricher(DetailsStore(Path(args.data_dir) / ".enrichment" / "details.sqlite"),
+                            ttl=args.enrich_ttl, max_workers=args.workers)
+    
+    # Keep a journal of the run, so it can be resumed if it is interrupted
+    queue = open_queue(args.queue) if args.command in ('enqueue', 'work') else None
+    if journal is None and queue is None and args.command != 'daemon':
+        journal = RunJournal.start({
+            'category': args.category,
+            'subcategories': args.subcategories,
+            'output_format': args.output_format,
+            'incremental': args.incremental,
+        }, runs_dir)
+        logger.info(f"Run ID: {journal.run_id} (if interrupted, continue it with --resume {journal.run_id})")
+    
+    try:
+        if args.command == 'work':
+            def scraper_factory(category):
+                return BonpreuScraper(base_url, category,
+                                      max_workers=args.workers, parse_processes=args.parse_processes, parser=args.parser,
+                                      data_source=args.data_source,
+                                      session=session, rate_limiter=rate_limiter, navigation=navigation, metrics=metrics,
+                                      archive=archive)
+            worker = Worker(queue, scraper_factory, worker_id=args.worker_id, batch_size=args.batch_size,
+                            lease_seconds=args.lease, parts_dir=args.parts_dir)
+            n_pages = worker.run(wait=not args.no_wait)
+            logger.info(f"Worker {worker.worker_id} completed {n_pages} pages.")
+        
+        if args.command == 'daemon':
+            def scraper_factory(category):
+                return BonpreuScraper(base_url, category,
+                                      max_workers=args.workers, parse_processes=args.parse_processes, parser=args.parser,
+                                      data_source=args.data_source,
+                                      session=session, rate_limiter=rate_limiter, navigation=navigation, metrics=metrics,
+                                      archive=archive)
+            scheduler = RevisitScheduler(args.budget, args.min_interval, args.max_interval,
+                                         path=args.schedule or Path(args.data_dir) / "schedule.sqlite")
+            daemon = Daemon(scheduler, scraper_factory, selected_categories, formats=args.output_format,
+                            data_dir=args.data_dir, batch_size=args.batch_size,
+                            rediscover_interval=args.rediscover_interval,
+                            history=history_stats(load_snapshot_history(args.data_dir)),
+                            normalize=normalize_text)
+            # Stop after the current batch on SIGTERM, as on Ctrl+C
+            stop_event = threading.Event()
+            signal.signal(signal.SIGTERM, lambda signum, frame: stop_event.set())
+            try:
+                daemon.run(stop_event)
+            except KeyboardInterrupt:
+                logger.info("Daemon stopped.")
+            finally:
+                scheduler.close()
+            selected_categories = []
+        
+        # Iterate over each selected category
+        for category in selected_categories:
+            # Create scraper instance for the specified category
+            scraper = BonpreuScraper(base_url, category,
+                                     max_workers=args.workers, parse_processes=args.parse_processes, parser=args.parser,
+                                     data_source=args.data_source,
+                                     session=session, rate_limiter=rate_limiter, navigation=navigation,
+                                     fingerprints=fingerprints, metrics=metrics, archive=archive)
             
-            print(f"Scraping selected subcategories: {selected_subcategories}")
-            scraper.get_product_info(selected_subcategories)
-        else:
-            if len(selected_categories) == 1:
-                # No subcategories specified, scrape all subcategories in the category
-                print("No specific subcategories provided. Scraping all available subcategories.")
-            all_subcategories = scraper.get_subcategories_names()
-            scraper.get_product_info(all_subcategories)
+            try:
+                if args.command == 'enqueue':
+                    # Only discover the pages, the workers crawl them
+                    enqueue_category(scraper, queue, args.subcategories, args.output_format)
+                    continue
+                
+                category_journal = journal.category(category)
+                if category_journal.done:
+                    logger.info(f"The {category} category was already completed by the run {journal.run_id}.")
+                    continue
+                if category_journal.leaves is not None:
+                    # The subcategory pages were discovered before the interruption
+                    scraper.get_product_info(args.subcategories, formats=args.output_format, return_dataframe=False,
+                                             journal=category_journal, data_dir=args.data_dir, enricher=enricher)
+                    continue
+                
+                # Validate and filter subcategories
+                if args.subcategories:
+                    # Get available subcategories for validation
+                    available_subcategories = scraper.get_subcategories_names()
+                    selected_subcategories = [sub for sub in args.subcategories if sub in available_subcategories]
+                
+                    if not selected_subcategories:
+                        logger.warning(f"No valid subcategories selected for the {category} category.")
+                        continue
+                
+                    logger.info(f"Scraping selected subcategories: {selected_subcategories}")
+                    scraper.get_product_info(selected_subcategories, formats=args.output_format, return_dataframe=False,
+                                             journal=category_journal, data_dir=args.data_dir, enricher=enricher)
+                else:
+                    if len(selected_categories) == 1:
+                        # No subcategories specified, scrape all subcategories in the category
+                        logger.info("No specific subcategories provided. Scraping all available subcategories.")
+                    all_subcategories = scraper.get_subcategories_names()
+                    scraper.get_product_info(all_subcategories, formats=args.output_format, return_dataframe=False,
+                                             journal=category_journal, data_dir=args.data_dir, enricher=enricher)
+            except FetchError as e:
+                # A category whose pages can not be loaded does not stop the other categories
+                logger.error(f"Skipping the {category} category: {e}")
+    finally:
+        session.close()
+        for host, stats in rate_limiter.stats().items():
+            logger.info(f"Request rate to {host}: {stats['rate']:.1f} req/s with {stats['concurrency']} concurrent requests "
+                        f"({stats['ok']} ok, {stats['throttled']} throttled, {stats['timeout']} timeouts, {stats['error']} errors).")
+            metrics.set_gauge('request_rate', stats['rate'] or 0, {'host': host})
+            metrics.set_gauge('concurrency', stats['concurrency'], {'host': host})
+        if args.metrics_report:
+            metrics.write_json(args.metrics_report)
+            logger.info(f"Metrics report saved to {args.metrics_report}.")
+        if args.prometheus_file:
+            metrics.write_prometheus(args.prometheus_file)
+        if fingerprints:
+            fingerprints.close()
+        if queue is not None:
+            queue.close()
+        if enricher is not None:
+            enricher.close()
+        if archive is not None:
+            archive.close()
+        if journal is not None:
+            # The journal is removed once every category is completed
+            journal.close(completed=all(journal.category(category).done for category in selected_categories))
+        # Save the category tree with its timestamp for the next runs
+        if not args.no_cache and len(navigation):
+            navigation.save(navigation_path)
 
 if __name__ == "__main__":
     main()
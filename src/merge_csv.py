@@ -1,21 +1,146 @@
+import argparse
+import logging
 import pandas as pd
+import numpy as np
 from pathlib import Path
 import time
 import os
 
-def merge_csv():
+from logging_config import configure_logging
+from sinks import COLUMNS, LEGACY_COLUMNS, DEFAULT_DATA_DIR, PRODUCT_ID_PATTERN, snapshot_files
+
+logger = logging.getLogger(__name__)
+
+
+class SeenKeys():
+    """
+    Compact set of the (URL, date) keys already written, stored as a sorted array of 64-bit hashes
+    (8 bytes per product and day, instead of the ~100 bytes of a Python set entry).
+
+    Attributes:
+        key_columns (list): Columns identifying a product on a given day.
+    """
+    def __init__(self, key_columns=('URL', 'Date')):
+        self.key_columns = list(key_columns)
+        self._hashes = np.empty(0, dtype=np.uint64)
+
+    def __len__(self):
+        return len(self._hashes)
+
+    def new_rows(self, chunk) -> np.ndarray:
+        """
+        Finds the rows of a chunk whose key was not seen before, and adds their keys to the set.
+        Within the chunk, only the first row of every key is kept.
+
+        Args:
+            chunk (pd.DataFrame): Chunk of rows.
+
+        Returns:
+            np.ndarray: Boolean mask of the rows to keep.
+        """
+        hashes = pd.util.hash_pandas_object(chunk[self.key_columns], index=False).to_numpy(dtype=np.uint64)
+        unique_hashes, first_indexes = np.unique(hashes, return_index=True)
+
+        # Keys already written by a previous chunk
+        positions = np.searchsorted(self._hashes, unique_hashes)
+        positions[positions == len(self._hashes)] = 0
+        seen = (self._hashes[positions] == unique_hashes) if len(self._hashes) else np.zeros(len(unique_hashes), bool)
+
+        self._hashes = np.union1d(self._hashes, unique_hashes[~seen])
+        mask = np.zeros(len(chunk), dtype=bool)
+        mask[first_indexes[~seen]] = True
+        return mask
+
+
+def merge_csv(data_dir=DEFAULT_DATA_DIR, output=None, start_date=None, end_date=None, categories=None,
+              dedup=True, chunksize=50000) -> Path:
     """
     Merge all csv files in the data directory into a single csv file.
+    The files are read and written in chunks, so the memory used does not depend on the size of the data.
+
+    Args:
+        data_dir (str | Path): Directory of the exported CSV files.
+        output (str | Path): Path of the merged file. If None, data/bonpreu_products_{timestamp}.csv.
+        start_date (str): First date to merge, with the format YYYYmmdd. If None, merges from the beginning.
+        end_date (str): Last date to merge, with the format YYYYmmdd. If None, merges until the end.
+        categories (list): Normalized names of the categories to merge. If None, merges all of them.
+        dedup (bool): If True, keeps only the first row of every product and date
+            (the same product is listed under several subcategories, and a re-extraction of a day
+            replaces the rows of its crawl). The products are identified by the ID at the end of their URL,
+            and the rows without URL are always kept.
+        chunksize (int): Number of rows read at once.
+
+    Returns:
+        Path: Path of the merged file.
     """
-    # Get all csv files in the data directory
-    data_dir = Path(__file__).parent.parent / "data"
-    files = [os.path.join(data_dir, f) for f in os.listdir(data_dir) if f.endswith('.csv') and not f.startswith('bonpreu_products_')]
+    # Get all snapshots in the data directory (except previous merges, incremental deltas and product details)
+    data_dir = Path(data_dir)
+    files = [os.path.join(data_dir, f) for f in snapshot_files(data_dir)]
+
+    output = Path(output) if output else data_dir / f'bonpreu_products_{time.strftime("%Y%m%d_%H%M%S")}.csv'
+    tmp_output = output.with_suffix('.tmp')
+    seen_keys = SeenKeys(('Product Key', 'Date')) if dedup else None
+    n_rows = n_duplicates = 0
+
+    with open(tmp_output, 'w', newline='', encoding='utf-8') as f:
+        f.write(','.join(COLUMNS) + os.linesep)
+        for file in files:
+            # Check the schema before reading the rows
+            columns = list(pd.read_csv(file, nrows=0).columns)
+            if columns not in (COLUMNS, LEGACY_COLUMNS):
+                logger.warning(f"Skipping {file}: unexpected columns {columns}.")
+                continue
+
+            # Read the values as text, so they are written back exactly as they are
+            for chunk in pd.read_csv(file, chunksize=chunksize, dtype=str, keep_default_na=False):
+                # Files exported before the quantity was parsed leave the new columns empty
+                chunk = chunk.reindex(columns=COLUMNS, fill_value='')
+                if start_date:
+                    chunk = chunk[chunk['Date'] >= start_date]
+                if end_date:
+                    chunk = chunk[chunk['Date'] <= end_date]
+                if categories:
+                    chunk = chunk[chunk['Category'].isin(categories)]
+                if seen_keys is not None and len(chunk):
+                    # The ID of the URL does not depend on its slug, which may differ between the data sources
+                    urls = chunk['URL']
+                    keys = pd.DataFrame({
+                        'Product Key': urls.str.extract(PRODUCT_ID_PATTERN, expand=False).fillna(urls),
+                        'Date': chunk['Date'],
+                    })
+                    # The rows without URL (e.g. cards the parser missed) can not be identified, they are all kept
+                    has_url = (urls != '').to_numpy()
+                    mask = np.ones(len(chunk), dtype=bool)
+                    if has_url.any():
+                        mask[has_url] = seen_keys.new_rows(keys[has_url])
+                    n_duplicates += len(chunk) - int(mask.sum())
+                    chunk = chunk[mask]
+
+                chunk.to_csv(f, header=False, index=False, lineterminator=os.linesep)
+                n_rows += len(chunk)
+
+    # Save the merged file only once it is complete
+    tmp_output.replace(output)
+    logger.info(f"Merged {n_rows} rows from {len(files)} files into {output} ({n_duplicates} duplicates removed).")
+    return output
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Merge the CSV files exported by the scraper into a single CSV file.')
+    parser.add_argument('--data-dir', type=str, default=str(DEFAULT_DATA_DIR),
+                        help='Directory of the exported CSV files (default: data).')
+    parser.add_argument('--output', type=str, help='Path of the merged file (default: data/bonpreu_products_YYYYmmdd_HHMMSS.csv).')
+    parser.add_argument('--start-date', type=str, help='First date to merge (YYYYmmdd).')
+    parser.add_argument('--end-date', type=str, help='Last date to merge (YYYYmmdd).')
+    parser.add_argument('--category', type=str, nargs='+', help='Normalized names of the categories to merge (e.g. Frescos Alimentacio).')
+    parser.add_argument('--no-dedup', action='store_true',
+                        help='Keep the products listed under several subcategories more than once.')
+    parser.add_argument('--chunksize', type=int, default=50000, help='Number of rows read at once (default: 50000).')
+    args = parser.parse_args()
+    configure_logging()
 
-    # Read all csv files and merge them
-    df = pd.concat([pd.read_csv(f) for f in files], ignore_index=True)
+    merge_csv(args.data_dir, args.output, args.start_date, args.end_date, args.category,
+              dedup=not args.no_dedup, chunksize=args.chunksize)
 
-    # Save the merged dataframe to a new csv file
-    df.to_csv(os.path.join(data_dir, f'bonpreu_products_{time.strftime("%Y%m%d_%H%M%S")}.csv'), index=False)
-    
 if __name__ == '__main__':
-    merge_csv()
\ No newline at end of file
+    main()
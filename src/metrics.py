@@ -0,0 +1,242 @@
+import bisect
+import json
+import threading
+import time
+from contextlib import nullcontext
+from pathlib import Path
+
+
+# Upper bounds of the latency histogram buckets, in seconds
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, float('inf'))
+
+# Prefix of the Prometheus metric names
+PROMETHEUS_PREFIX = "bonpreu"
+
+# Timer returned when the metrics are disabled: entering and leaving it does nothing
+_NULL_TIMER = nullcontext()
+
+
+class Histogram():
+    """
+    Latency histogram with fixed buckets, like the Prometheus ones.
+
+    Attributes:
+        bounds (tuple): Upper bounds of the buckets, in seconds.
+        counts (list): Number of observations of every bucket (not cumulative).
+        sum (float): Sum of all the observations.
+        count (int): Number of observations.
+    """
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * len(bounds)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        """Adds an observation."""
+        self.counts[bisect.bisect_left(self.bounds, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+    def quantile(self, q) -> float:
+        """Estimates a quantile as the upper bound of the bucket where it falls."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        cumulative = 0
+        for bound, count in zip(self.bounds, self.counts):
+            cumulative += count
+            if cumulative >= rank:
+                return bound
+        return self.bounds[-1]
+
+    def summary(self) -> dict:
+        """Count, total, mean and estimated quantiles of the observations."""
+        return {
+            'count': self.count,
+            'total_seconds': round(self.sum, 6),
+            'mean_seconds': round(self.sum / self.count, 6) if self.count else None,
+            'p50_seconds': self.quantile(0.5),
+            'p95_seconds': self.quantile(0.95),
+            'p99_seconds': self.quantile(0.99),
+        }
+
+
+class _Timer():
+    """Context manager adding its duration to the histogram of a stage, and the CPU time of its thread to the stage."""
+    __slots__ = ('metrics', 'stage', 'start', 'start_cpu')
+
+    def __init__(self, metrics, stage):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        self.start_cpu = time.thread_time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.metrics.observe(self.stage, time.perf_counter() - self.start, time.thread_time() - self.start_cpu)
+
+
+class Metrics():
+    """
+    Metrics of a crawl: latency histograms of every stage (fetch, parse, postprocess, write...),
+    counters (pages, products, bytes downloaded, retries, errors...) and gauges (request rate...).
+    It is shared by the scrapers and the HTTP session of a run and thread-safe.
+
+    When disabled, the timers are a shared no-op context manager and the counters return at once,
+    so the instrumentation costs a method call per event.
+
+    Attributes:
+        enabled (bool): Whether the metrics are recorded.
+        started_at (float): Time when the metrics started to be recorded.
+    """
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.started_at = time.time()
+        self._start = time.monotonic()
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._cpu_seconds = {}
+        self._counters = {}
+        self._gauges = {}
+
+    def timer(self, stage):
+        """
+        Times a block of code and adds its duration to the histogram of the stage.
+
+        Args:
+            stage (str): Name of the stage.
+
+        Returns:
+            Context manager timing the block.
+        """
+        return _Timer(self, stage) if self.enabled else _NULL_TIMER
+
+    def observe(self, stage, seconds, cpu_seconds=None):
+        """
+        Adds a duration to the histogram of a stage.
+
+        Args:
+            stage (str): Name of the stage.
+            seconds (float): Wall-clock duration.
+            cpu_seconds (float): CPU time spent by the thread during that time, if known.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            if stage not in self._histograms:
+                self._histograms[stage] = Histogram()
+            self._histograms[stage].observe(seconds)
+            if cpu_seconds is not None:
+                self._cpu_seconds[stage] = self._cpu_seconds.get(stage, 0) + cpu_seconds
+
+    def increment(self, counter, value=1):
+        """Adds a value to a counter."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[counter] = self._counters.get(counter, 0) + value
+
+    def set_gauge(self, name, value, labels=None):
+        """
+        Sets the current value of a gauge.
+
+        Args:
+            name (str): Name of the gauge.
+            value (float): Current value.
+            labels (dict): Labels of the value (e.g. {'host': 'www.example.com'}).
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            self._gauges.setdefault(name, {})[tuple(sorted((labels or {}).items()))] = value
+
+    def report(self) -> dict:
+        """
+        Builds the report of the run.
+
+        Returns:
+            dict: Elapsed time, counters, throughput, stage latencies and gauges.
+        """
+        elapsed = time.monotonic() - self._start
+        with self._lock:
+            counters = dict(self._counters)
+            stages = {stage: {**histogram.summary(), 'cpu_seconds': round(self._cpu_seconds.get(stage, 0), 6)}
+                      for stage, histogram in self._histograms.items()}
+            gauges = {name: [{**dict(labels), 'value': value} for labels, value in values.items()]
+                      for name, values in self._gauges.items()}
+        return {
+            'started_at': time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started_at)),
+            'elapsed_seconds': round(elapsed, 3),
+            'counters': counters,
+            'throughput': {
+                'pages_per_second': round(counters.get('pages', 0) / elapsed, 3) if elapsed else None,
+                'products_per_second': round(counters.get('products', 0) / elapsed, 3) if elapsed else None,
+                'bytes_per_second': round(counters.get('bytes_downloaded', 0) / elapsed, 1) if elapsed else None,
+            },
+            'stages': stages,
+            'gauges': gauges,
+        }
+
+    def write_json(self, path):
+        """
+        Writes the report of the run to a JSON file.
+
+        Args:
+            path (str | Path): Path of the JSON file.
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(self.report(), indent=2), encoding='utf-8')
+
+    def prometheus_text(self) -> str:
+        """
+        Formats the metrics with the Prometheus text exposition format.
+
+        Returns:
+            str: The metrics, one sample per line.
+        """
+        def labels_text(labels):
+            return '{' + ','.join(f'{key}="{value}"' for key, value in labels) + '}' if labels else ''
+
+        lines = []
+        with self._lock:
+            histogram_name = f"{PROMETHEUS_PREFIX}_stage_seconds"
+            if self._histograms:
+                lines.append(f"# TYPE {histogram_name} histogram")
+            for stage, histogram in sorted(self._histograms.items()):
+                cumulative = 0
+                for bound, count in zip(histogram.bounds, histogram.counts):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f'{histogram_name}_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+                lines.append(f'{histogram_name}_sum{{stage="{stage}"}} {histogram.sum}')
+                lines.append(f'{histogram_name}_count{{stage="{stage}"}} {histogram.count}')
+            if self._cpu_seconds:
+                lines.append(f"# TYPE {PROMETHEUS_PREFIX}_stage_cpu_seconds_total counter")
+            for stage, seconds in sorted(self._cpu_seconds.items()):
+                lines.append(f'{PROMETHEUS_PREFIX}_stage_cpu_seconds_total{{stage="{stage}"}} {seconds}')
+            for counter, value in sorted(self._counters.items()):
+                lines.append(f"# TYPE {PROMETHEUS_PREFIX}_{counter}_total counter")
+                lines.append(f"{PROMETHEUS_PREFIX}_{counter}_total {value}")
+            for name, values in sorted(self._gauges.items()):
+                lines.append(f"# TYPE {PROMETHEUS_PREFIX}_{name} gauge")
+                for labels, value in values.items():
+                    lines.append(f"{PROMETHEUS_PREFIX}_{name}{labels_text(labels)} {value}")
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path):
+        """
+        Writes the metrics to a file with the Prometheus text format (e.g. for the node exporter textfile collector).
+
+        Args:
+            path (str | Path): Path of the file.
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temporary file first, so the collector never reads a partial file
+        tmp_path = path.with_suffix('.tmp')
+        tmp_path.write_text(self.prometheus_text(), encoding='utf-8')
+        tmp_path.replace(path)
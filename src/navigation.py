@@ -0,0 +1,143 @@
+import json
+import threading
+import time
+from pathlib import Path
+
+
+# Default location of the navigation snapshot
+DEFAULT_NAVIGATION_PATH = Path(__file__).parent.parent / "data" / ".cache" / "navigation.json"
+
+# Categories of the website that can be scraped
+DEFAULT_CATEGORIES = ["Frescos", "Alimentació", "Begudes", "Làctics i ous", "Celler"]
+
+
+class SiteNavigation():
+    """
+    Memoized index of the navigation menus of the website.
+
+    The index maps the URL of every visited menu page to its links, so the category tree is downloaded
+    once per run and shared by all the scrapers and subcategories. It can be saved to disk with its
+    creation time and loaded again by later runs.
+
+    Attributes:
+        base_url (str): The main URL of the Bonpreu website.
+        created_at (float): Time when the index was created.
+    """
+    def __init__(self, base_url, created_at=None):
+        self.base_url = base_url
+        self.created_at = created_at if created_at else time.time()
+        # URL of the categories section, found in the main page
+        self.categories_section_url = None
+        # Links of the menu of every page: list of (text, url) tuples, or None if the page has no menu
+        self._links = {}
+        self._lock = threading.Lock()
+
+    def get_categories_section_url(self, loader) -> str:
+        """
+        Gets the URL of the categories section, loading it only the first time.
+
+        Args:
+            loader (callable): Function returning the URL of the categories section.
+
+        Returns:
+            str: URL of the categories section.
+        """
+        with self._lock:
+            if self.categories_section_url:
+                return self.categories_section_url
+        url = loader()
+        with self._lock:
+            self.categories_section_url = url
+        return url
+
+    def get_links(self, url, loader) -> list:
+        """
+        Gets the menu links of a page, loading them only the first time.
+        Errors raised by the loader are propagated and nothing is stored, so the page is loaded again next time.
+
+        Args:
+            url (str): URL of the page.
+            loader (callable): Function returning the links of the page given its URL.
+
+        Returns:
+            list: List of (text, url) tuples, or None if the page has no menu.
+        """
+        with self._lock:
+            if url in self._links:
+                return self._links[url]
+        links = loader(url)
+        with self._lock:
+            self._links[url] = links
+        return links
+
+    def subcategory_names(self, category) -> list:
+        """
+        Gets the names of the subcategories of a category from the index, without downloading anything.
+
+        Args:
+            category (str): Name of the category.
+
+        Returns:
+            list: Names of the subcategories, or None if the menus of the category are not in the index.
+        """
+        with self._lock:
+            category_links = self._links.get(self.categories_section_url) or []
+            category_url = next((url for text, url in category_links if text == category), None)
+            links = self._links.get(category_url)
+        return [text for text, _ in links] if links else None
+
+    def __len__(self):
+        return len(self._links)
+
+    def save(self, path=DEFAULT_NAVIGATION_PATH):
+        """
+        Saves the index to a JSON file.
+
+        Args:
+            path (str | Path): Path of the JSON file.
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            snapshot = {
+                'base_url': self.base_url,
+                'created_at': self.created_at,
+                'categories_section_url': self.categories_section_url,
+                'links': self._links,
+            }
+        # Write to a temporary file first, so a crash never leaves a truncated snapshot
+        tmp_path = path.with_suffix('.tmp')
+        tmp_path.write_text(json.dumps(snapshot, ensure_ascii=False), encoding='utf-8')
+        tmp_path.replace(path)
+
+    @classmethod
+    def load(cls, base_url, path=DEFAULT_NAVIGATION_PATH, max_age=None):
+        """
+        Loads an index saved with `save`.
+
+        Args:
+            base_url (str): The main URL of the Bonpreu website.
+            path (str | Path): Path of the JSON file.
+            max_age (float): Maximum age of the snapshot in seconds. If None, the age is not checked.
+
+        Returns:
+            SiteNavigation: The loaded index, or an empty one if the snapshot does not exist,
+            is older than max_age or belongs to another website.
+        """
+        try:
+            snapshot = json.loads(Path(path).read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return cls(base_url)
+
+        if snapshot.get('base_url') != base_url:
+            return cls(base_url)
+        if max_age is not None and time.time() - snapshot['created_at'] > max_age:
+            return cls(base_url)
+
+        navigation = cls(base_url, created_at=snapshot['created_at'])
+        navigation.categories_section_url = snapshot['categories_section_url']
+        navigation._links = {
+            url: [tuple(link) for link in links] if links is not None else None
+            for url, links in snapshot['links'].items()
+        }
+        return navigation
@@ -0,0 +1,269 @@
+import gzip
+import hashlib
+import os
+import socket
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+from response_cache import CacheEntry
+
+try:
+    import zstandard
+except ImportError:  # The zstd compression is optional
+    zstandard = None
+
+
+# Default location of the archive, next to the scraped data
+DEFAULT_ARCHIVE_DIR = Path(__file__).parent.parent / "data" / ".archive"
+
+# Fixed-size record of the index files: one per archived page, in the order they were appended
+INDEX_DTYPE = np.dtype([
+    ('url_hash', '<u8'),    # 64-bit hash of the URL
+    ('offset', '<u8'),      # Position of the compressed page in the segment
+    ('length', '<u4'),      # Size of the compressed page
+    ('fetched_at', '<f8'),  # Time when the page was fetched
+])
+
+# Extension of the segments of every compression
+SEGMENT_EXTENSIONS = {'gzip': '.gz', 'zstd': '.zst'}
+
+
+def url_hash(url) -> int:
+    """64-bit hash of a URL, the key of the index files."""
+    return int.from_bytes(hashlib.blake2b(url.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def _compress(data, compression) -> bytes:
+    if compression == 'zstd':
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    return gzip.compress(data, compresslevel=6)
+
+
+def _decompress(data, compression) -> bytes:
+    if compression == 'zstd':
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+class PageArchive():
+    """
+    Append-only archive of the raw pages fetched by the scrapers, one directory per day.
+
+    Every process appends the pages it fetches to its own segment of the day, each page compressed on its own
+    (gzip, or zstd if installed) so it can be read back without decompressing the rest of the segment.
+    Next to every segment, an index file holds one fixed-size record per page (hash of the URL, offset, length
+    and fetch time), which is memory-mapped by the readers. A page is only archived once per day unless it changes.
+
+    Attributes:
+        archive_dir (Path): Directory of the archive.
+        compression (str): Compression of the new segments ("gzip" or "zstd").
+        max_segment_size (int): Size in bytes after which a new segment is started.
+    """
+    def __init__(self, archive_dir=DEFAULT_ARCHIVE_DIR, compression="auto", max_segment_size=256 * 1024 ** 2):
+        if compression == "auto":
+            compression = "zstd" if zstandard is not None else "gzip"
+        if compression not in SEGMENT_EXTENSIONS:
+            raise ValueError("The compression must be 'gzip', 'zstd' or 'auto'.")
+        if compression == "zstd" and zstandard is None:
+            raise ValueError("The zstd compression requires the zstandard package.")
+        self.archive_dir = Path(archive_dir)
+        self.compression = compression
+        self.max_segment_size = max_segment_size
+        self._writer_id = f"{socket.gethostname()}-{os.getpid()}"
+        self._lock = threading.Lock()
+        self._day = None
+        self._segment = None
+        self._index = None
+        self._sequence = 0
+        # Hashes of the (URL, content) pairs archived today by this process
+        self._archived = set()
+
+    def _open_segment(self, day):
+        """Opens a new segment of the day (and its index) for appending."""
+        self._close_segment()
+        day_dir = self.archive_dir / day
+        day_dir.mkdir(parents=True, exist_ok=True)
+        if day != self._day:
+            self._day = day
+            self._sequence = 0
+            self._archived.clear()
+        # Skip the segments left by previous processes with the same name
+        while True:
+            name = f"{self._writer_id}-{self._sequence:04d}"
+            path = day_dir / f"{name}{SEGMENT_EXTENSIONS[self.compression]}"
+            if not path.exists() or path.stat().st_size < self.max_segment_size:
+                break
+            self._sequence += 1
+        self._segment = open(path, 'ab')
+        self._index = open(day_dir / f"{name}.idx", 'ab')
+
+    def _close_segment(self):
+        if self._segment is not None:
+            self._segment.close()
+            self._index.close()
+            self._segment = self._index = None
+
+    def record(self, url, page, fetched_at=None):
+        """
+        Appends a fetched page to the archive of the day.
+
+        Args:
+            url (str): URL of the page.
+            page (str): HTML content of the page.
+            fetched_at (float): Time when the page was fetched. If None, the current time.
+        """
+        fetched_at = fetched_at if fetched_at is not None else time.time()
+        day = time.strftime("%Y%m%d", time.localtime(fetched_at))
+        data = url.encode('utf-8') + b"\n" + page.encode('utf-8')
+        key = hashlib.blake2b(data, digest_size=16).digest()
+        with self._lock:
+            if day == self._day and key in self._archived:
+                return
+        # Compress outside the lock, so the fetch threads compress their pages in parallel
+        compressed = _compress(data, self.compression)
+        with self._lock:
+            if day != self._day or self._segment is None or self._segment.tell() >= self.max_segment_size:
+                self._open_segment(day)
+            offset = self._segment.tell()
+            self._segment.write(compressed)
+            # The page is on disk before its index record, so the index never points past the end of the segment
+            self._segment.flush()
+            entry = np.array([(url_hash(url), offset, len(compressed), fetched_at)], dtype=INDEX_DTYPE)
+            self._index.write(entry.tobytes())
+            self._index.flush()
+            self._archived.add(key)
+
+    def days(self) -> list:
+        """Archived days (YYYYmmdd), in chronological order."""
+        if not self.archive_dir.exists():
+            return []
+        return sorted(path.name for path in self.archive_dir.iterdir() if path.is_dir() and any(path.glob("*.idx")))
+
+    def open_day(self, day):
+        """
+        Opens the pages archived on a day for reading.
+
+        Args:
+            day (str): Day with the format YYYYmmdd.
+
+        Returns:
+            ArchivedDay: Reader of the pages of the day.
+
+        Raises:
+            FileNotFoundError: If nothing was archived on that day.
+        """
+        return ArchivedDay(self.archive_dir / day)
+
+    def close(self):
+        """Closes the open segment."""
+        with self._lock:
+            self._close_segment()
+
+
+class ArchivedDay():
+    """
+    Read-only view of the pages archived on a day, with the latest version of every URL.
+
+    It has the interface of an offline ResponseCache, so an HttpSession can replay the pages of the day
+    without sending any request.
+
+    Attributes:
+        day_dir (Path): Directory of the day in the archive.
+        day (str): Day with the format YYYYmmdd.
+        offline (bool): Always True, the pages are served regardless of their age.
+    """
+    offline = True
+
+    def __init__(self, day_dir):
+        self.day_dir = Path(day_dir)
+        self.day = self.day_dir.name
+        index_paths = sorted(self.day_dir.glob("*.idx"))
+        if not index_paths:
+            raise FileNotFoundError(f"No pages were archived on {self.day}.")
+
+        self._segments = []
+        indexes = []
+        for index_path in index_paths:
+            segment_path = next((path for path in map(index_path.with_suffix, SEGMENT_EXTENSIONS.values())
+                                 if path.exists()), None)
+            # A record torn by a crash is ignored
+            n_entries = index_path.stat().st_size // INDEX_DTYPE.itemsize
+            if segment_path is None or not n_entries:
+                continue
+            indexes.append(np.memmap(index_path, dtype=INDEX_DTYPE, mode='r', shape=(n_entries,)))
+            compression = 'zstd' if segment_path.suffix == '.zst' else 'gzip'
+            self._segments.append((os.open(segment_path, os.O_RDONLY), compression))
+
+        # Entries of all the segments, with the segment each one belongs to
+        self._entries = np.concatenate(indexes) if indexes else np.empty(0, INDEX_DTYPE)
+        self._segment_ids = np.repeat(np.arange(len(indexes)), [len(index) for index in indexes])
+        # Latest entry of every URL, sorted by hash for binary search
+        order = np.lexsort((-self._entries['fetched_at'], self._entries['url_hash']))
+        self._hashes, first = np.unique(self._entries['url_hash'][order], return_index=True)
+        self._positions = order[first]
+
+    def __len__(self):
+        return len(self._hashes)
+
+    def __contains__(self, url):
+        return self._find(url) is not None
+
+    def _find(self, url):
+        """Position of the latest entry of a URL in the concatenated indexes, or None."""
+        key = np.uint64(url_hash(url))
+        i = np.searchsorted(self._hashes, key)
+        if i < len(self._hashes) and self._hashes[i] == key:
+            return self._positions[i]
+        return None
+
+    def _read(self, position) -> tuple:
+        """Reads the archived page of an entry. Returns a (URL, page, fetched_at) tuple."""
+        entry = self._entries[position]
+        fd, compression = self._segments[self._segment_ids[position]]
+        data = _decompress(os.pread(fd, int(entry['length']), int(entry['offset'])), compression)
+        url, _, page = data.partition(b"\n")
+        return url.decode('utf-8'), page.decode('utf-8'), float(entry['fetched_at'])
+
+    def get(self, url) -> str:
+        """
+        Gets the archived content of a page.
+
+        Args:
+            url (str): URL of the page.
+
+        Returns:
+            str: HTML content of the page, or None if it was not archived on this day.
+        """
+        entry = self.lookup(url)
+        return entry.body.decode('utf-8') if entry else None
+
+    def lookup(self, url) -> CacheEntry:
+        """
+        Gets the archived page of a URL as a cache entry (see `ResponseCache.lookup`).
+
+        Args:
+            url (str): URL of the page.
+
+        Returns:
+            CacheEntry: The archived page, or None if it was not archived on this day.
+        """
+        position = self._find(url)
+        if position is None:
+            return None
+        archived_url, page, fetched_at = self._read(position)
+        if archived_url != url:  # Hash collision
+            return None
+        return CacheEntry(url, page.encode('utf-8'), 'utf-8', None, None, fetched_at, fresh=True)
+
+    def urls(self) -> list:
+        """URLs of the pages archived on this day."""
+        return [self._read(position)[0] for position in self._positions]
+
+    def close(self):
+        """Closes the segments."""
+        for fd, _ in self._segments:
+            os.close(fd)
+        self._segments = []
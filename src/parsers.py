@@ -0,0 +1,212 @@
+from bs4 import BeautifulSoup
+
+from embedded_state import extract_products_from_state
+
+try:
+    from lxml import etree
+    import lxml.html
+except ImportError:  # The lxml backend is optional
+    etree = None
+
+try:
+    from selectolax.parser import HTMLParser
+except ImportError:  # The selectolax backend is optional
+    HTMLParser = None
+
+
+# Classes of the spans holding the price and the quantity of a product card
+PRICE_CLASS = '_text_16wi0_1 _text--m_16wi0_23 sc-1fkdssq-0 bwsVzh'
+QUANTITY_CLASS = '_text_16wi0_1 _text--m_16wi0_23 sc-1sjeki5-0 asqfi'
+
+
+def convert_price(price_str) -> float:
+    """
+    Converts the price string to a float.
+
+    Args:
+        price_str (str): Price string to convert (e.g. "12,34\xa0€").
+
+    Returns:
+        float: Price as a float.
+    """
+    return float(price_str.replace('\xa0€', '').replace(',', '.'))
+
+
+# All the backends match the elements as BeautifulSoup does: the cards by one of their classes,
+# and the price and quantity spans by their whole class attribute, so a span with an extra class is not matched
+def _has_class(class_name) -> str:
+    """Builds an XPath predicate matching the elements with the given class (like the CSS `.class` selector)."""
+    return f'contains(concat(" ", normalize-space(@class), " "), " {class_name} ")'
+
+
+def _has_classes(classes) -> str:
+    """Builds an XPath predicate matching the elements whose class attribute is exactly the given classes."""
+    return f'normalize-space(@class) = "{classes}"'
+
+
+def _first_with_classes(node, selector, classes):
+    """First element of a selectolax node matching a CSS selector whose class attribute is exactly the given classes."""
+    return next((element for element in node.css(selector)
+                 if ' '.join((element.attributes.get('class') or '').split()) == classes), None)
+
+
+def extract_products_bs4(html_page, base_url) -> list:
+    """
+    Extracts the product cards with BeautifulSoup and the pure-Python 'html.parser'.
+    It is the slowest backend, but it has no compiled dependencies.
+
+    Args:
+        html_page (str): HTML content of the subcategory page.
+        base_url (str): The main URL of the Bonpreu website, used to build the product URLs.
+
+    Returns:
+        list: List of (product name, price, quantity, URL) tuples.
+    """
+    products = []
+    subcategory_soup = BeautifulSoup(html_page, 'html.parser')
+
+    # Extract product details from each product card
+    for product in subcategory_soup.find_all("div", {'class': 'product-card-container'}):
+        link = product.find('a')
+
+        # Extract product name
+        product_name = link.get("aria-label", None) if link else None
+
+        # Extract product price
+        product_price = product.find('span', {'class': PRICE_CLASS})
+        product_price = convert_price(product_price.text) if product_price else None
+
+        # Extract product quantity
+        product_quantity = product.find('span', {'class': QUANTITY_CLASS})
+        product_quantity = product_quantity.text if product_quantity else None
+
+        # Extract product URL
+        product_url = link.get('href', None) if link else None
+        product_url = base_url + product_url if product_url else None
+
+        products.append((product_name, product_price, product_quantity, product_url))
+
+    return products
+
+
+if etree is not None:
+    # Precompiled XPath expressions: the cards, and the fields of a card relative to it
+    _CARDS = etree.XPath(f'//div[{_has_class("product-card-container")}]')
+    _CARD_FIELDS = etree.XPath(
+        f'(.//a)[1]'
+        f' | (.//span[{_has_classes(PRICE_CLASS)}])[1]'
+        f' | (.//span[{_has_classes(QUANTITY_CLASS)}])[1]'
+    )
+
+
+def extract_products_lxml(html_page, base_url) -> list:
+    """
+    Extracts the product cards with lxml and precompiled XPath expressions.
+    The link, price and quantity of every card are selected with a single XPath union.
+
+    Args:
+        html_page (str): HTML content of the subcategory page.
+        base_url (str): The main URL of the Bonpreu website, used to build the product URLs.
+
+    Returns:
+        list: List of (product name, price, quantity, URL) tuples.
+    """
+    if not html_page or not html_page.strip():
+        return []
+
+    products = []
+    tree = lxml.html.fromstring(html_page)
+    for card in _CARDS(tree):
+        product_name = product_price = product_quantity = product_url = None
+        for node in _CARD_FIELDS(card):
+            if node.tag == 'a':
+                product_name = node.get('aria-label')
+                product_url = node.get('href')
+                product_url = base_url + product_url if product_url else None
+            elif 'bwsVzh' in node.get('class', ''):
+                product_price = convert_price(node.text_content())
+            else:
+                product_quantity = node.text_content()
+        products.append((product_name, product_price, product_quantity, product_url))
+
+    return products
+
+
+def extract_products_selectolax(html_page, base_url) -> list:
+    """
+    Extracts the product cards with selectolax (Modest engine) and CSS selectors.
+
+    Args:
+        html_page (str): HTML content of the subcategory page.
+        base_url (str): The main URL of the Bonpreu website, used to build the product URLs.
+
+    Returns:
+        list: List of (product name, price, quantity, URL) tuples.
+    """
+    products = []
+    tree = HTMLParser(html_page)
+    for card in tree.css('div.product-card-container'):
+        link = card.css_first('a')
+        product_name = link.attributes.get('aria-label') if link else None
+        product_url = link.attributes.get('href') if link else None
+        product_url = base_url + product_url if product_url else None
+
+        product_price = _first_with_classes(card, 'span.bwsVzh', PRICE_CLASS)
+        product_price = convert_price(product_price.text()) if product_price else None
+
+        product_quantity = _first_with_classes(card, 'span.asqfi', QUANTITY_CLASS)
+        product_quantity = product_quantity.text() if product_quantity else None
+
+        products.append((product_name, product_price, product_quantity, product_url))
+
+    return products
+
+
+# Available parser backends, from the fastest to the slowest
+PARSER_BACKENDS = {}
+if HTMLParser is not None:
+    PARSER_BACKENDS['selectolax'] = extract_products_selectolax
+if etree is not None:
+    PARSER_BACKENDS['lxml'] = extract_products_lxml
+PARSER_BACKENDS['bs4'] = extract_products_bs4
+
+
+def get_parser(name="auto"):
+    """
+    Gets the function extracting the product cards of a subcategory page.
+
+    Args:
+        name (str): Name of the backend ("selectolax", "lxml" or "bs4"), or "auto" to use the fastest one installed.
+
+    Returns:
+        callable: Function taking the HTML content of the page and the base URL and returning the products.
+
+    Raises:
+        ValueError: If the backend is unknown or not installed.
+    """
+    if name == "auto":
+        return next(iter(PARSER_BACKENDS.values()))
+    if name not in PARSER_BACKENDS:
+        raise ValueError(f"Parser backend '{name}' is not available. Available backends: {', '.join(PARSER_BACKENDS)}.")
+    return PARSER_BACKENDS[name]
+
+
+def extract_products(html_page, base_url, parser="auto", data_source="html") -> list:
+    """
+    Extracts the products of a subcategory page.
+
+    Args:
+        html_page (str): HTML content of the subcategory page.
+        base_url (str): The main URL of the Bonpreu website, used to build the product URLs.
+        parser (str): Backend used to parse the product cards.
+        data_source (str): "html" to read the product cards, or "state" to read the embedded state of the page,
+            which also holds the lazily loaded products. If the page has no state, the cards are read instead.
+
+    Returns:
+        list: List of (product name, price, quantity, URL) tuples.
+    """
+    if data_source == "state":
+        products = extract_products_from_state(html_page, base_url)
+        if products is not None:
+            return products
+    return get_parser(parser)(html_page, base_url)
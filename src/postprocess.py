@@ -0,0 +1,128 @@
+import re
+import unicodedata
+from functools import lru_cache
+
+import numpy as np
+
+
+# Quantity of a product: an optional pack size and a value with its unit (e.g. "0.75L", "4 x 0.12kg", "20 per paquet")
+QUANTITY_PATTERN = re.compile(
+    r'^\s*(?:(?P<count>\d+(?:[.,]\d+)?)\s*x\s*)?(?P<value>\d+(?:[.,]\d+)?)\s*(?P<unit>kg|g|l|cl|ml|per paquet)\s*$',
+    re.IGNORECASE
+)
+
+# Factor converting every unit to its base unit: kilograms, litres or units
+UNIT_FACTORS = {'kg': 1, 'g': 0.001, 'l': 1, 'cl': 0.01, 'ml': 0.001, 'per paquet': 1}
+BASE_UNITS = {'kg': 'kg', 'g': 'kg', 'l': 'L', 'cl': 'L', 'ml': 'L', 'per paquet': 'unit'}
+
+
+@lru_cache(maxsize=65536)
+def normalize_text(text) -> str:
+    """
+    Removes the accents and special characters of a text.
+    The results are memoized: category names and most product names repeat across pages and runs.
+
+    Args:
+        text (str): Text to normalize.
+
+    Returns:
+        str: Normalized text, or None if the text is empty.
+    """
+    return unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode('utf-8') if text else None
+
+
+def _to_list(values) -> list:
+    """Converts an array of floats to a list, replacing NaN with None (written as an empty cell)."""
+    return [None if value != value else value for value in values.tolist()]
+
+
+def parse_prices(prices) -> np.ndarray:
+    """
+    Converts a batch of prices to floats. The prices can already be numbers or strings like "12,34\xa0€".
+
+    Args:
+        prices (list): Prices of the products.
+
+    Returns:
+        np.ndarray: Prices as floats, NaN if missing or invalid.
+    """
+    try:
+        # Fast path: the card parsers already convert the prices (None becomes NaN)
+        return np.array(prices, dtype=float)
+    except (TypeError, ValueError):
+        pass
+    import pandas as pd
+    prices = pd.Series(prices, dtype=object)
+    is_text = prices.map(lambda price: isinstance(price, str)).to_numpy(dtype=bool)
+    text = prices[is_text].astype(str).str.replace('\xa0€', '', regex=False).str.replace(',', '.', regex=False)
+    prices[is_text] = pd.to_numeric(text, errors='coerce')
+    return pd.to_numeric(prices, errors='coerce').to_numpy(dtype=float)
+
+
+@lru_cache(maxsize=8192)
+def _parse_quantity(quantity) -> tuple:
+    """Parses a quantity string into its (value in the base unit, base unit) tuple. Memoized, as few quantities repeat a lot."""
+    match = QUANTITY_PATTERN.match(quantity) if isinstance(quantity, str) else None
+    if not match:
+        return np.nan, None
+    count = float(match['count'].replace(',', '.')) if match['count'] else 1
+    unit = match['unit'].lower()
+    return count * float(match['value'].replace(',', '.')) * UNIT_FACTORS[unit], BASE_UNITS[unit]
+
+
+def parse_quantities(quantities) -> tuple:
+    """
+    Parses a batch of quantities into their value in the base unit (kg, L or units) and the base unit.
+    Packs are multiplied by their size, e.g. "4 x 0.12kg" is 0.48 kg.
+
+    Args:
+        quantities (list): Quantity strings of the products.
+
+    Returns:
+        tuple: (values, units) tuple, with the values as a float array (NaN if unknown)
+        and the units as a list ("kg", "L", "unit" or None if unknown).
+    """
+    parsed = [_parse_quantity(quantity) for quantity in quantities]
+    values = np.fromiter((value for value, _ in parsed), dtype=float, count=len(parsed))
+    return values, [unit for _, unit in parsed]
+
+
+def unit_prices(prices, values) -> np.ndarray:
+    """
+    Computes the price per base unit (€/kg, €/L or €/unit).
+
+    Args:
+        prices (np.ndarray): Prices of the products.
+        values (np.ndarray): Quantities of the products in their base unit.
+
+    Returns:
+        np.ndarray: Unit prices rounded to cents, NaN if the price or the quantity is unknown.
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        result = np.where(values > 0, prices / values, np.nan)
+    return np.round(result, 2)
+
+
+def product_columns(products) -> dict:
+    """
+    Post-processes the products of a page as columns: normalizes the names, parses the prices and
+    quantities and computes the unit prices.
+
+    Args:
+        products (list): List of (product name, price, quantity, URL) tuples.
+
+    Returns:
+        dict: Lists with the product names, prices, quantities, URLs, quantity values, quantity units and unit prices.
+    """
+    names, prices, quantities, urls = zip(*products) if products else ((), (), (), ())
+    prices = parse_prices(list(prices))
+    values, units = parse_quantities(list(quantities))
+    return {
+        'names': [normalize_text(name) for name in names],
+        'prices': _to_list(prices),
+        'quantities': list(quantities),
+        'urls': list(urls),
+        'values': _to_list(values),
+        'units': units,
+        'unit_prices': _to_list(unit_prices(prices, values)),
+    }
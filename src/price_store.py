@@ -0,0 +1,263 @@
+import logging
+import math
+import sqlite3
+import threading
+from pathlib import Path
+
+import pandas as pd
+
+from sinks import COLUMNS, LEGACY_COLUMNS, DEFAULT_DATA_DIR, RowSink, product_key
+
+logger = logging.getLogger(__name__)
+
+
+# Default location of the price history database
+DEFAULT_PRICE_DB_PATH = DEFAULT_DATA_DIR / "prices.sqlite"
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS categories (
+        id INTEGER PRIMARY KEY,
+        category TEXT NOT NULL,
+        subcategory_1 TEXT NOT NULL DEFAULT '',
+        subcategory_2 TEXT NOT NULL DEFAULT '',
+        subcategory_3 TEXT NOT NULL DEFAULT '',
+        subcategory_4 TEXT NOT NULL DEFAULT '',
+        UNIQUE (category, subcategory_1, subcategory_2, subcategory_3, subcategory_4)
+    );
+    CREATE TABLE IF NOT EXISTS products (
+        id INTEGER PRIMARY KEY,
+        url TEXT NOT NULL UNIQUE,
+        name TEXT,
+        quantity TEXT,
+        product_key TEXT
+    );
+    CREATE TABLE IF NOT EXISTS product_categories (
+        product_id INTEGER NOT NULL REFERENCES products (id),
+        category_id INTEGER NOT NULL REFERENCES categories (id),
+        PRIMARY KEY (product_id, category_id)
+    ) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS observations (
+        product_id INTEGER NOT NULL REFERENCES products (id),
+        date TEXT NOT NULL,
+        price REAL,
+        PRIMARY KEY (product_id, date)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS observations_date ON observations (date);
+"""
+
+# Maximum number of parameters of a single query
+MAX_QUERY_PARAMETERS = 500
+
+
+def _clean(value):
+    """Converts the NaN values (empty cells of the CSVs) to None."""
+    return None if isinstance(value, float) and math.isnan(value) else value
+
+
+class PriceStore():
+    """
+    SQLite database with the price history of the products.
+
+    The products and the category paths are stored once in their own tables, and every price is
+    an observation of a product on a date. The products are identified by the ID at the end of their URL
+    (see `sinks.product_key`), so a product keeps its history when the slug of its URL changes. The observations are keyed by (product, date), so
+    the history of a product is a range read of the primary key, and ingesting the same day
+    twice updates the prices instead of duplicating them.
+
+    Attributes:
+        path (Path): Path of the SQLite database.
+    """
+    def __init__(self, path=DEFAULT_PRICE_DB_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode = WAL")
+        self._db.execute("PRAGMA synchronous = NORMAL")
+        with self._db:
+            self._db.executescript(SCHEMA)
+            self._migrate()
+        # IDs of the products and category paths already stored
+        self._product_ids = {}
+        self._category_ids = {}
+
+    def _migrate(self):
+        """Adds the product keys to a database created before the products were identified by them."""
+        if 'product_key' not in [row[1] for row in self._db.execute("PRAGMA table_info(products)")]:
+            self._db.execute("ALTER TABLE products ADD COLUMN product_key TEXT")
+        rows = self._db.execute("SELECT id, url FROM products WHERE product_key IS NULL").fetchall()
+        self._db.executemany("UPDATE products SET product_key = ? WHERE id = ?", [(product_key(url), row_id) for row_id, url in rows])
+        self._db.execute("CREATE INDEX IF NOT EXISTS products_product_key ON products (product_key)")
+
+    def _load_ids(self, table, key_columns, keys, cache):
+        """Reads the IDs of the given keys that are not cached yet."""
+        missing = [key for key in keys if key not in cache]
+        if len(key_columns) == 1:
+            for start in range(0, len(missing), MAX_QUERY_PARAMETERS):
+                batch = missing[start:start + MAX_QUERY_PARAMETERS]
+                query = f"SELECT id, {key_columns[0]} FROM {table} WHERE {key_columns[0]} IN ({','.join('?' * len(batch))})"
+                for row_id, key in self._db.execute(query, batch):
+                    cache[key] = row_id
+        else:
+            query = f"SELECT id FROM {table} WHERE {' AND '.join(f'{column} = ?' for column in key_columns)}"
+            for key in missing:
+                cache[key] = self._db.execute(query, key).fetchone()[0]
+
+    def upsert_rows(self, rows):
+        """
+        Stores a batch of rows in a single transaction.
+        The name and quantity of known products are updated, and so is the price of a product already observed on the same date.
+
+        Args:
+            rows (list): List of tuples with the values of `sinks.COLUMNS` (or `sinks.LEGACY_COLUMNS`). Rows without URL are ignored.
+        """
+        products = {}
+        category_paths = set()
+        observations = []
+        for row in rows:
+            (category, subcategory_1, subcategory_2, subcategory_3, subcategory_4,
+             name, date, price, quantity, url) = (_clean(value) for value in row[:len(LEGACY_COLUMNS)])
+            if not url:
+                continue
+            path = tuple(value or '' for value in (category, subcategory_1, subcategory_2, subcategory_3, subcategory_4))
+            key = product_key(url)
+            products[key] = (url, name, quantity)
+            category_paths.add(path)
+            observations.append((key, path, str(date), price))
+        if not observations:
+            return
+
+        with self._lock, self._db:
+            # New products keep the first URL seen, the known ones only update their name and quantity
+            self._load_ids("products", ["product_key"], list(products), self._product_ids)
+            self._db.executemany(
+                "INSERT INTO products (url, name, quantity, product_key) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (url) DO UPDATE SET name = excluded.name, quantity = excluded.quantity",
+                [(url, name, quantity, key) for key, (url, name, quantity) in products.items() if key not in self._product_ids]
+            )
+            self._load_ids("products", ["product_key"], list(products), self._product_ids)
+            self._db.executemany(
+                "UPDATE products SET name = ?, quantity = ? WHERE id = ?",
+                [(name, quantity, self._product_ids[key]) for key, (_, name, quantity) in products.items()]
+            )
+            self._db.executemany(
+                "INSERT OR IGNORE INTO categories (category, subcategory_1, subcategory_2, subcategory_3, subcategory_4) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [path for path in category_paths if path not in self._category_ids]
+            )
+            self._load_ids("categories", ["category", "subcategory_1", "subcategory_2", "subcategory_3", "subcategory_4"],
+                           list(category_paths), self._category_ids)
+
+            self._db.executemany(
+                "INSERT OR IGNORE INTO product_categories (product_id, category_id) VALUES (?, ?)",
+                {(self._product_ids[key], self._category_ids[path]) for key, path, _, _ in observations}
+            )
+            self._db.executemany(
+                "INSERT INTO observations (product_id, date, price) VALUES (?, ?, ?) "
+                "ON CONFLICT (product_id, date) DO UPDATE SET price = excluded.price",
+                [(self._product_ids[key], date, price) for key, _, date, price in observations]
+            )
+
+    def price_history(self, url, start_date=None, end_date=None) -> pd.DataFrame:
+        """
+        Gets the prices of a product over time.
+
+        Args:
+            url (str): URL of the product. It is matched by its ID, so any slug of the URL finds the product.
+            start_date (str): First date, with the format YYYYmmdd. If None, from the first observation.
+            end_date (str): Last date, with the format YYYYmmdd. If None, until the last observation.
+
+        Returns:
+            pd.DataFrame: Date and Price columns, sorted by date.
+        """
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT o.date, o.price FROM observations o JOIN products p ON p.id = o.product_id "
+                "WHERE p.product_key = ? AND o.date BETWEEN ? AND ? ORDER BY o.date",
+                (product_key(url), start_date or '', end_date or '99999999')
+            ).fetchall()
+        return pd.DataFrame(rows, columns=['Date', 'Price'])
+
+    def category_prices(self, category, date) -> pd.DataFrame:
+        """
+        Gets the prices of the products of a category on a date.
+
+        Args:
+            category (str): Normalized name of the category.
+            date (str): Date with the format YYYYmmdd.
+
+        Returns:
+            pd.DataFrame: Product Name, Price, Quantity (kg|L) and URL columns.
+        """
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT DISTINCT p.name, o.price, p.quantity, p.url FROM observations o "
+                "JOIN products p ON p.id = o.product_id "
+                "JOIN product_categories pc ON pc.product_id = o.product_id "
+                "JOIN categories c ON c.id = pc.category_id "
+                "WHERE o.date = ? AND c.category = ? ORDER BY p.url",
+                (date, category)
+            ).fetchall()
+        return pd.DataFrame(rows, columns=['Product Name', 'Price', 'Quantity (kg|L)', 'URL'])
+
+    def close(self):
+        """Closes the database."""
+        self._db.close()
+
+
+class PriceStoreSink(RowSink):
+    """
+    Writes the rows to a PriceStore in batches of `batch_size` rows, one transaction per batch.
+
+    Attributes:
+        store (PriceStore): Destination database.
+        batch_size (int): Number of rows buffered before writing them.
+        close_store (bool): Whether closing the sink also closes the store.
+    """
+    def __init__(self, store, columns=COLUMNS, batch_size=5000, close_store=False):
+        super().__init__(columns)
+        self.store = store
+        self.batch_size = batch_size
+        self.close_store = close_store
+        self._buffer = []
+
+    def write_rows(self, rows):
+        self._buffer.extend(rows)
+        if len(self._buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self._buffer:
+            self.store.upsert_rows(self._buffer)
+            self._buffer = []
+
+    def close(self):
+        self.flush()
+        if self.close_store:
+            self.store.close()
+            self.close_store = False
+
+
+def import_csv(paths, store, chunksize=50000) -> int:
+    """
+    Imports CSV files exported by the scraper into the price store.
+
+    Args:
+        paths (list): Paths of the CSV files.
+        store (PriceStore): Destination database.
+        chunksize (int): Number of rows read and stored at once.
+
+    Returns:
+        int: Number of rows imported.
+    """
+    n_rows = 0
+    for path in paths:
+        columns = list(pd.read_csv(path, nrows=0).columns)
+        if columns not in (COLUMNS, LEGACY_COLUMNS):
+            logger.warning(f"Skipping {path}: unexpected columns {columns}.")
+            continue
+        for chunk in pd.read_csv(path, chunksize=chunksize, dtype={'Date': str}):
+            store.upsert_rows(list(chunk.itertuples(index=False, name=None)))
+            n_rows += len(chunk)
+        logger.info(f"Imported {path}.")
+    return n_rows
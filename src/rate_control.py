@@ -0,0 +1,235 @@
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+
+class TokenBucket():
+    """
+    Token bucket limiting the rate of requests. Callers that find the bucket empty reserve the next
+    token and sleep until it is available, so concurrent callers are spaced out instead of bursting.
+
+    Attributes:
+        rate (float): Tokens added per second. If None, the bucket never limits.
+        burst (float): Maximum number of tokens kept, i.e. requests allowed at once after an idle period.
+    """
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        """Adds the tokens generated since the last call."""
+        self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def acquire(self) -> float:
+        """
+        Takes a token, waiting until one is available.
+
+        Returns:
+            float: Seconds waited.
+        """
+        if not self.rate:
+            return 0
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+        if wait:
+            time.sleep(wait)
+        return wait
+
+    def set_rate(self, rate):
+        """Changes the rate, keeping the tokens generated so far."""
+        with self._lock:
+            if self.rate:
+                self._refill(time.monotonic())
+            self.rate = rate
+
+
+class AimdController():
+    """
+    Additive-increase/multiplicative-decrease controller of the request rate and the concurrency of a host.
+
+    While the responses are fast and successful, the concurrency grows by one (and the rate by `rate_step`)
+    every `concurrency` healthy responses, i.e. about once per round of requests. A throttled response
+    (429/503), a timeout or a response slower than `max_latency` multiplies both by `decrease_factor`,
+    at most once every `cooldown` seconds, so a burst of errors caused by the same overload backs off only once.
+
+    Attributes:
+        bucket (TokenBucket): Token bucket whose rate is controlled.
+        concurrency (int): Current maximum number of requests in flight.
+        min_concurrency (int): Lower bound of the concurrency.
+        max_concurrency (int): Upper bound of the concurrency.
+        min_rate (float): Lower bound of the rate, in requests per second.
+        max_rate (float): Upper bound of the rate, in requests per second.
+        rate_step (float): Requests per second added on every increase.
+        decrease_factor (float): Factor applied to the rate and the concurrency on every decrease.
+        max_latency (float): Latency above which a response counts as a congestion signal, in seconds.
+        cooldown (float): Minimum number of seconds between two decreases.
+    """
+    def __init__(self, rate=10, concurrency=2, min_concurrency=1, max_concurrency=8, min_rate=0.5, max_rate=50,
+                 rate_step=1, decrease_factor=0.5, max_latency=5, cooldown=2):
+        self.bucket = TokenBucket(rate)
+        self.concurrency = max(min_concurrency, min(concurrency, max_concurrency))
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.rate_step = rate_step
+        self.decrease_factor = decrease_factor
+        self.max_latency = max_latency
+        self.cooldown = cooldown
+
+        self._condition = threading.Condition()
+        self._in_flight = 0
+        self._healthy_streak = 0
+        self._last_decrease = float('-inf')
+        self._latency = None
+        self.counts = {'ok': 0, 'throttled': 0, 'timeout': 0, 'error': 0}
+
+    @property
+    def rate(self) -> float:
+        """Current rate, in requests per second."""
+        return self.bucket.rate
+
+    def acquire(self):
+        """Waits for a free concurrency slot and a token of the bucket."""
+        with self._condition:
+            while self._in_flight >= self.concurrency:
+                self._condition.wait()
+            self._in_flight += 1
+        self.bucket.acquire()
+
+    def release(self, latency, outcome):
+        """
+        Frees the slot of a finished request and adapts the rate and the concurrency to its outcome.
+
+        Args:
+            latency (float): Duration of the request, in seconds.
+            outcome (str): "ok", "throttled" (429/503), "timeout" or "error" (other failures).
+        """
+        with self._condition:
+            self._in_flight -= 1
+            self.counts[outcome] = self.counts.get(outcome, 0) + 1
+            self._latency = latency if self._latency is None else 0.8 * self._latency + 0.2 * latency
+
+            if outcome in ('throttled', 'timeout') or (outcome == 'ok' and latency > self.max_latency):
+                self._decrease()
+            elif outcome == 'ok':
+                self._healthy_streak += 1
+                if self._healthy_streak >= self.concurrency:
+                    self._increase()
+            else:
+                self._healthy_streak = 0
+            self._condition.notify_all()
+
+    def _increase(self):
+        """Additive increase of the concurrency and the rate."""
+        self._healthy_streak = 0
+        self.concurrency = min(self.max_concurrency, self.concurrency + 1)
+        if self.bucket.rate:
+            self.bucket.set_rate(min(self.max_rate, self.bucket.rate + self.rate_step))
+
+    def _decrease(self):
+        """Multiplicative decrease of the concurrency and the rate."""
+        self._healthy_streak = 0
+        now = time.monotonic()
+        if now - self._last_decrease < self.cooldown:
+            return
+        self._last_decrease = now
+        self.concurrency = max(self.min_concurrency, int(self.concurrency * self.decrease_factor))
+        if self.bucket.rate:
+            self.bucket.set_rate(max(self.min_rate, self.bucket.rate * self.decrease_factor))
+
+    def stats(self) -> dict:
+        """Current state of the controller."""
+        with self._condition:
+            return {
+                'rate': self.bucket.rate,
+                'concurrency': self.concurrency,
+                'in_flight': self._in_flight,
+                'latency': self._latency,
+                **self.counts,
+            }
+
+
+class RequestTicket():
+    """
+    Handle of a request in flight. The code sending the request sets its outcome.
+
+    Attributes:
+        outcome (str): "ok", "throttled", "timeout" or "error". If not set, "ok" unless an exception is raised.
+    """
+    def __init__(self):
+        self.outcome = None
+
+
+class RateLimiter():
+    """
+    Per-host rate limiter shared by every fetch path of the scrapers (static requests, retries and Selenium loads).
+    Every host gets its own AimdController, created on first use with the settings given here.
+
+    Attributes:
+        rate (float): Initial rate of every host, in requests per second. If None, the rate is not limited.
+        max_concurrency (int): Maximum number of requests in flight per host.
+        controller_options (dict): Other arguments of the AimdController of every host.
+    """
+    def __init__(self, rate=10, max_concurrency=8, **controller_options):
+        self.rate = rate
+        self.max_concurrency = max_concurrency
+        self.controller_options = controller_options
+        self._controllers = {}
+        self._lock = threading.Lock()
+
+    def controller(self, url) -> AimdController:
+        """Gets the controller of the host of the URL."""
+        host = urlparse(url).netloc
+        with self._lock:
+            if host not in self._controllers:
+                self._controllers[host] = AimdController(
+                    rate=self.rate,
+                    concurrency=max(1, self.max_concurrency // 2),
+                    max_concurrency=self.max_concurrency,
+                    **self.controller_options
+                )
+            return self._controllers[host]
+
+    @contextmanager
+    def request(self, url):
+        """
+        Context manager wrapping a single request: waits for the host to allow it and,
+        once it finishes, reports its latency and outcome to the controller of the host.
+
+        Args:
+            url (str): URL that is about to be requested.
+
+        Yields:
+            RequestTicket: Ticket whose outcome can be set by the caller.
+        """
+        controller = self.controller(url)
+        controller.acquire()
+        ticket = RequestTicket()
+        start = time.monotonic()
+        try:
+            yield ticket
+        except BaseException:
+            ticket.outcome = ticket.outcome or 'error'
+            raise
+        finally:
+            controller.release(time.monotonic() - start, ticket.outcome or 'ok')
+
+    def stats(self) -> dict:
+        """
+        Current rate, concurrency and outcome counts of every host.
+
+        Returns:
+            dict: Dict mapping every host to the stats of its controller.
+        """
+        with self._lock:
+            controllers = dict(self._controllers)
+        return {host: controller.stats() for host, controller in controllers.items()}
@@ -0,0 +1,69 @@
+import logging
+import os
+import time
+
+from http_session import HttpSession, FetchError
+from navigation import SiteNavigation
+from scraper import BonpreuScraper
+from sinks import DEFAULT_DATA_DIR, REEXTRACT_SUFFIX, open_sinks
+
+logger = logging.getLogger(__name__)
+
+
+def reextract_day(archive, day, base_url, categories=None, formats=("csv",), data_dir=DEFAULT_DATA_DIR,
+                  processes=None, parser="auto", data_source="html", navigation=None, metrics=None) -> list:
+    """
+    Extracts the products again from the pages archived on a day, without sending any request.
+    The category tree is rebuilt from the menu pages archived that day, and the product pages are parsed
+    in a pool of processes. The rows keep the date of the archived day and are written to
+    data/{category}_reextract_{day}_{HHMMSS}.{format}, which take priority over the rows of that day
+    in the merges and the analytics (see `sinks.snapshot_files`), and replace its prices in the price store.
+
+    Args:
+        archive (PageArchive): Archive of the raw pages.
+        day (str): Archived day with the format YYYYmmdd.
+        base_url (str): The main URL of the website when the pages were archived.
+        categories (list): Names of the categories. If None, all the default categories.
+        formats (tuple): Output formats ("csv", "parquet", "dataset" and/or "sqlite").
+        data_dir (str | Path): Directory of the output files.
+        processes (int): Number of processes parsing the pages. If None, one per CPU core.
+        parser (str): Backend used to parse the product cards.
+        data_source (str): "html" to read the product cards or "state" to read the embedded state of the pages.
+        navigation (SiteNavigation): Category tree used for the menu pages missing from the archive
+            (e.g. when the run of that day reused a saved tree). If None, only the archived pages are used.
+        metrics (Metrics): Metrics of the run, if any.
+
+    Returns:
+        list: List of (URL, reason) tuples of the pages that were not archived on that day.
+
+    Raises:
+        FileNotFoundError: If nothing was archived on that day.
+    """
+    archived_day = archive.open_day(day)
+    processes = processes or os.cpu_count() or 1
+    # The archived pages are served by the session as an offline cache, so no request is sent
+    session = HttpSession(pool_size=processes, cache=archived_day, metrics=metrics)
+    if navigation is None or base_url in archived_day:
+        navigation = SiteNavigation(base_url)
+    logger.info(f"Re-extracting the {len(archived_day)} pages archived on {day}.")
+
+    failed_urls = []
+    timestamp = f"{day}_{time.strftime('%H%M%S')}"
+    try:
+        for category in categories or BonpreuScraper.categories():
+            # Twice as many reader threads as parse processes, so the processes are never idle
+            scraper = BonpreuScraper(base_url, category, max_workers=2 * processes, parse_processes=processes,
+                                     parser=parser, data_source=data_source, session=session, navigation=navigation,
+                                     metrics=metrics, crawl_date=day)
+            try:
+                subcategories = scraper.get_subcategories_names()
+            except FetchError as e:
+                logger.warning(f"Skipping the {category} category, it was not crawled on {day}: {e}")
+                continue
+            with open_sinks(scraper._output_name(), formats, suffix=REEXTRACT_SUFFIX, data_dir=data_dir,
+                            timestamp=timestamp) as sink:
+                scraper.get_product_info(subcategories, sink=sink, return_dataframe=False)
+            failed_urls.extend(scraper.failed_urls)
+    finally:
+        session.close()
+    return failed_urls
@@ -0,0 +1,249 @@
+import gzip
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+
+# Default location of the cache, next to the scraped data
+DEFAULT_CACHE_DIR = Path(__file__).parent.parent / "data" / ".cache"
+
+
+class CacheEntry():
+    """
+    Response stored in the cache.
+
+    Attributes:
+        url (str): URL of the response.
+        body (bytes): Uncompressed body of the response.
+        encoding (str): Encoding of the body.
+        etag (str): ETag header of the response, if any.
+        last_modified (str): Last-Modified header of the response, if any.
+        fetched_at (float): Time when the response was downloaded or last revalidated.
+        fresh (bool): Whether the entry is still within its TTL.
+    """
+    def __init__(self, url, body, encoding, etag, last_modified, fetched_at, fresh):
+        self.url = url
+        self.body = body
+        self.encoding = encoding
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fetched_at = fetched_at
+        self.fresh = fresh
+
+    def validators(self) -> dict:
+        """
+        Headers of a conditional GET that revalidates this entry.
+
+        Returns:
+            dict: If-None-Match and/or If-Modified-Since headers.
+        """
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+    def to_response(self):
+        """
+        Builds a response object equivalent to the cached one.
+
+        Returns:
+            requests.Response: Response with status 200 and the cached body.
+        """
+        import requests
+        response = requests.Response()
+        response.url = self.url
+        response.status_code = 200
+        response.encoding = self.encoding
+        response._content = self.body
+        return response
+
+
+class ResponseCache():
+    """
+    Content-addressed on-disk cache of HTTP responses.
+
+    The bodies are stored gzip-compressed and named after the SHA-256 of their content, so identical
+    pages are stored only once. A SQLite index maps each URL to its body, its validators (ETag and
+    Last-Modified) and its last access time, used to evict the least recently used entries once the
+    cache grows over `max_size` bytes.
+
+    Attributes:
+        cache_dir (Path): Directory of the cache.
+        max_size (int): Maximum size of the stored bodies, in bytes.
+        ttls (list): List of (regex, seconds) tuples. The first pattern found in a URL sets its time to live.
+        default_ttl (float): Time to live of the URLs that do not match any pattern. With 0, the entries are always revalidated.
+        offline (bool): If True, the entries are served regardless of their age and no request is sent.
+    """
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_size=500 * 1024 ** 2, ttls=None, default_ttl=0, offline=False):
+        self.cache_dir = Path(cache_dir)
+        self.max_size = max_size
+        self.ttls = [(re.compile(pattern), seconds) for pattern, seconds in (ttls or [])]
+        self.default_ttl = default_ttl
+        self.offline = offline
+
+        (self.cache_dir / "bodies").mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.cache_dir / "index.sqlite", check_same_thread=False)
+        with self._db:
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    url TEXT PRIMARY KEY,
+                    body_hash TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    encoding TEXT,
+                    etag TEXT,
+                    last_modified TEXT,
+                    fetched_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            """)
+            self._db.execute("CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access)")
+        # Total size of the stored bodies, scanned once and then updated on every store and eviction
+        self._size = self._db.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM (SELECT DISTINCT body_hash, size FROM entries)"
+        ).fetchone()[0]
+
+    def ttl(self, url) -> float:
+        """
+        Gets the time to live of a URL.
+
+        Args:
+            url (str): URL of the page.
+
+        Returns:
+            float: Number of seconds a cached response of the URL is considered fresh.
+        """
+        for pattern, seconds in self.ttls:
+            if pattern.search(url):
+                return seconds
+        return self.default_ttl
+
+    def _body_path(self, body_hash) -> Path:
+        """Path of the compressed body with the given hash."""
+        return self.cache_dir / "bodies" / body_hash[:2] / f"{body_hash}.gz"
+
+    def lookup(self, url) -> CacheEntry:
+        """
+        Gets the cached response of a URL.
+
+        Args:
+            url (str): URL of the page.
+
+        Returns:
+            CacheEntry: The cached response, or None if the URL is not cached.
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT body_hash, size, encoding, etag, last_modified, fetched_at FROM entries WHERE url = ?", (url,)
+            ).fetchone()
+            if row is None:
+                return None
+            body_hash, size, encoding, etag, last_modified, fetched_at = row
+            try:
+                body = gzip.decompress(self._body_path(body_hash).read_bytes())
+            except (OSError, EOFError):
+                # The body was removed or is corrupted, forget the entry
+                with self._db:
+                    self._db.execute("DELETE FROM entries WHERE url = ?", (url,))
+                    self._remove_orphan_body(body_hash, size)
+                return None
+            with self._db:
+                self._db.execute("UPDATE entries SET last_access = ? WHERE url = ?", (time.time(), url))
+
+        fresh = time.time() - fetched_at < self.ttl(url)
+        return CacheEntry(url, body, encoding, etag, last_modified, fetched_at, fresh)
+
+    def store(self, url, response):
+        """
+        Stores a successful response.
+
+        Args:
+            url (str): URL of the page.
+            response (requests.Response): Response to store.
+        """
+        body = response.content
+        body_hash = hashlib.sha256(body).hexdigest()
+        path = self._body_path(body_hash)
+        compressed = None
+        if not path.exists():
+            compressed = gzip.compress(body)
+
+        with self._lock:
+            if compressed is not None:
+                path.parent.mkdir(exist_ok=True)
+                # Write to a temporary file first, so readers never see a partial body
+                tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+                tmp_path.write_bytes(compressed)
+                tmp_path.replace(path)
+            now = time.time()
+            size = path.stat().st_size
+            with self._db:
+                previous = self._db.execute("SELECT body_hash, size FROM entries WHERE url = ?", (url,)).fetchone()
+                if self._db.execute("SELECT 1 FROM entries WHERE body_hash = ?", (body_hash,)).fetchone() is None:
+                    # First entry using this body
+                    self._size += size
+                self._db.execute(
+                    "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (url, body_hash, size, response.encoding,
+                     response.headers.get("ETag"), response.headers.get("Last-Modified"), now, now)
+                )
+                # Remove the previous body of the URL if no other URL uses it
+                if previous and previous[0] != body_hash:
+                    self._remove_orphan_body(*previous)
+            self._evict()
+
+    def refresh(self, url):
+        """
+        Marks a cached response as fresh again, after the server answered 304 Not Modified.
+
+        Args:
+            url (str): URL of the page.
+        """
+        with self._lock, self._db:
+            now = time.time()
+            self._db.execute("UPDATE entries SET fetched_at = ?, last_access = ? WHERE url = ?", (now, now, url))
+
+    def size(self) -> int:
+        """Total size of the stored bodies, in bytes."""
+        return self._size
+
+    def _evict(self):
+        """Removes the least recently used entries until the cache fits in `max_size`. Must hold the lock."""
+        if self._size <= self.max_size:
+            return
+
+        with self._db:
+            for url, body_hash, size in self._db.execute(
+                "SELECT url, body_hash, size FROM entries ORDER BY last_access"
+            ).fetchall():
+                self._db.execute("DELETE FROM entries WHERE url = ?", (url,))
+                # Bodies shared with other URLs are kept
+                self._remove_orphan_body(body_hash, size)
+                if self._size <= self.max_size:
+                    break
+
+    def _remove_orphan_body(self, body_hash, size) -> bool:
+        """
+        Deletes a body file if no entry refers to it anymore, and subtracts its size from the total. Must hold the lock.
+        
+        Args:
+            body_hash (str): SHA-256 of the body.
+            size (int): Size of the compressed body, in bytes.
+            
+        Returns:
+            bool: Whether the body was deleted.
+        """
+        if self._db.execute("SELECT 1 FROM entries WHERE body_hash = ?", (body_hash,)).fetchone() is not None:
+            return False
+        self._body_path(body_hash).unlink(missing_ok=True)
+        self._size -= size
+        return True
+
+    def close(self):
+        """Closes the index."""
+        self._db.close()
@@ -0,0 +1,477 @@
+import hashlib
+import heapq
+import json
+import math
+import sqlite3
+import threading
+from pathlib import Path
+
+import numpy as np
+
+from sinks import COLUMNS, DEFAULT_DATA_DIR, snapshot_files
+
+# Default location of the state of the revisit scheduler
+DEFAULT_SCHEDULE_PATH = DEFAULT_DATA_DIR / "schedule.sqlite"
+
+# Columns identifying a leaf page in the snapshots: its category and subcategories
+PATH_COLUMNS = COLUMNS[:5]
+
+DAY = 24 * 3600
+
+
+def products_signature(products) -> str:
+    """
+    Signature of the products and prices of a page, independent of their order.
+
+    Args:
+        products (list): List of (product name, price, quantity, URL) tuples.
+
+    Returns:
+        str: Hexadecimal signature, the same for two pages with the same products and prices.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for url, price in sorted((str(product[3]), str(product[1])) for product in products):
+        digest.update(f"{url}\t{price}\n".encode('utf-8'))
+    return digest.hexdigest()
+
+
+def estimate_rate(n_intervals, n_changes, observed_seconds, prior_rate=1 / DAY, prior_intervals=2,
+                  prior_interval=DAY) -> float:
+    """
+    Estimates the change rate of a page from its visits, assuming its changes follow a Poisson process.
+    Only whether the page changed between two visits is known, not how many times, so the rate is given by
+    the estimator of Cho and Garcia-Molina, -log((n - X + 0.5) / (n + 0.5)) per mean interval, which stays
+    finite when every visit found a change. A few pseudo-visits at the prior rate smooth the first estimates.
+
+    Args:
+        n_intervals (int): Number of intervals between two consecutive visits (n).
+        n_changes (int): Number of intervals in which the page changed (X).
+        observed_seconds (float): Total duration of the intervals.
+        prior_rate (float): Changes per second assumed before the first visits.
+        prior_intervals (float): Weight of the prior, in number of intervals.
+        prior_interval (float): Duration of the prior intervals, in seconds.
+
+    Returns:
+        float: Estimated changes per second.
+    """
+    n = n_intervals + prior_intervals
+    x = n_changes + prior_intervals * (1 - math.exp(-prior_rate * prior_interval))
+    seconds = observed_seconds + prior_intervals * prior_interval
+    return -math.log((n - x + 0.5) / (n + 0.5)) * n / seconds
+
+
+class PageStats():
+    """
+    Visit statistics of a leaf page.
+
+    Attributes:
+        url (str): URL of the page.
+        category (str): Name of the category of the page.
+        structure (list): Category, subcategories and URL of the page.
+        signature (str): Signature of the products of the last visit, or None if never visited.
+        last_visit (float): Time of the last visit, or None.
+        next_visit (float): Time of the next visit.
+        n_intervals (int): Number of intervals between consecutive visits.
+        n_changes (int): Number of intervals in which the products or prices changed.
+        observed_seconds (float): Total duration of the intervals.
+    """
+    def __init__(self, url, category, structure, signature=None, last_visit=None, next_visit=0,
+                 n_intervals=0, n_changes=0, observed_seconds=0):
+        self.url = url
+        self.category = category
+        self.structure = structure
+        self.signature = signature
+        self.last_visit = last_visit
+        self.next_visit = next_visit
+        self.n_intervals = n_intervals
+        self.n_changes = n_changes
+        self.observed_seconds = observed_seconds
+
+
+class RevisitScheduler():
+    """
+    Priority queue of the leaf pages, ordered by their next visit time, which is set from their change rate.
+
+    The change rate of every page is learned from its visits (see `estimate_rate`) and can be seeded with
+    the snapshots of past runs. The pages share a budget of visits per hour: each page gets a share proportional
+    to the square root of its change rate, a compromise between visiting all the pages equally and visiting them
+    in proportion to their changes, so the pages whose prices move often are visited more without starving the others.
+
+    Attributes:
+        budget (float): Visits per hour shared by all the pages.
+        min_interval (float): Minimum number of seconds between two visits of a page.
+        max_interval (float): Maximum number of seconds between two visits of a page.
+        prior_rate (float): Changes per second assumed for the pages without history.
+        path (Path): Path of the SQLite database keeping the state between runs, or None to keep it in memory.
+    """
+    def __init__(self, budget=600, min_interval=3600, max_interval=7 * DAY, prior_rate=1 / DAY,
+                 path=DEFAULT_SCHEDULE_PATH):
+        self.budget = budget
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.prior_rate = prior_rate
+        self.path = Path(path) if path is not None else None
+        self._pages = {}
+        self._rates = {}
+        self._total_weight = 0
+        self._heap = []
+        self._lock = threading.Lock()
+        self._db = None
+        if self.path is not None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            with self._db:
+                self._db.execute("""
+                    CREATE TABLE IF NOT EXISTS pages (
+                        url TEXT PRIMARY KEY,
+                        category TEXT NOT NULL,
+                        structure TEXT NOT NULL,
+                        signature TEXT,
+                        last_visit REAL,
+                        next_visit REAL NOT NULL,
+                        n_intervals INTEGER NOT NULL,
+                        n_changes INTEGER NOT NULL,
+                        observed_seconds REAL NOT NULL
+                    )
+                """)
+            for row in self._db.execute("SELECT * FROM pages"):
+                url, category, structure, *state = row
+                self._add(PageStats(url, category, json.loads(structure), *state))
+
+    def __len__(self):
+        return len(self._pages)
+
+    def _add(self, page):
+        self._pages[page.url] = page
+        self._update_rate(page)
+        heapq.heappush(self._heap, (page.next_visit, page.url))
+
+    def _update_rate(self, page):
+        """Updates the change rate of a page and the total weight of the budget shares."""
+        self._total_weight -= math.sqrt(self._rates.get(page.url, 0))
+        self._rates[page.url] = estimate_rate(page.n_intervals, page.n_changes, page.observed_seconds, self.prior_rate)
+        self._total_weight += math.sqrt(self._rates[page.url])
+
+    def _save(self, page):
+        if self._db is not None:
+            with self._db:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (page.url, page.category, json.dumps(page.structure, ensure_ascii=False), page.signature,
+                     page.last_visit, page.next_visit, page.n_intervals, page.n_changes, page.observed_seconds)
+                )
+
+    def rate(self, url) -> float:
+        """Estimated changes per second of a page."""
+        return self._rates[url]
+
+    def interval(self, url) -> float:
+        """
+        Seconds between two visits of a page: the inverse of its share of the budget,
+        bounded by min_interval and max_interval.
+
+        Args:
+            url (str): URL of the page.
+
+        Returns:
+            float: Seconds until the next visit.
+        """
+        share = math.sqrt(self._rates[url]) / self._total_weight if self._total_weight else 1
+        visits_per_second = self.budget / 3600 * share
+        interval = 1 / visits_per_second if visits_per_second else self.max_interval
+        return min(self.max_interval, max(self.min_interval, interval))
+
+    def sync_leaves(self, category, structures, now):
+        """
+        Updates the pages of a category after crawling its tree: the new pages are due immediately
+        and the pages no longer listed are removed.
+
+        Args:
+            category (str): Name of the category.
+            structures (list): Category, subcategories and URL of every leaf page of the category.
+            now (float): Current time.
+        """
+        structures = {structure[-1]: list(structure) for structure in structures}
+        with self._lock:
+            for url in [url for url, page in self._pages.items() if page.category == category and url not in structures]:
+                del self._pages[url]
+                self._total_weight -= math.sqrt(self._rates.pop(url))
+                if self._db is not None:
+                    with self._db:
+                        self._db.execute("DELETE FROM pages WHERE url = ?", (url,))
+            for url, structure in structures.items():
+                if url in self._pages:
+                    self._pages[url].structure = structure
+                else:
+                    self._add(PageStats(url, category, structure, next_visit=now))
+                self._save(self._pages[url])
+
+    def seed(self, history, normalize=None):
+        """
+        Seeds the statistics of the pages never visited with the changes observed in past snapshots.
+
+        Args:
+            history (dict): Dict mapping the path of every page (category and 4 subcategories) to its
+                (n_intervals, n_changes, observed_seconds) tuple, e.g. from `history_stats`.
+            normalize (callable): Function applied to the names of the path of the pages before looking them up,
+                as the snapshots store the normalized names.
+
+        Returns:
+            int: Number of pages seeded.
+        """
+        n_seeded = 0
+        with self._lock:
+            for page in self._pages.values():
+                path = tuple(page.structure[:5])
+                if normalize is not None:
+                    path = tuple(normalize(name) if name else None for name in path)
+                if page.n_intervals or path not in history:
+                    continue
+                page.n_intervals, page.n_changes, page.observed_seconds = history[path]
+                self._update_rate(page)
+                self._save(page)
+                n_seeded += 1
+        return n_seeded
+
+    def next_due(self) -> float:
+        """Time of the earliest next visit, or None if there are no pages."""
+        with self._lock:
+            while self._heap:
+                next_visit, url = self._heap[0]
+                page = self._pages.get(url)
+                if page is not None and page.next_visit == next_visit:
+                    return next_visit
+                # Entry of a removed page or of a previous schedule of the page
+                heapq.heappop(self._heap)
+        return None
+
+    def due(self, now, limit=None) -> list:
+        """
+        Takes the pages whose next visit is due. They are not returned again until their visit is recorded.
+
+        Args:
+            now (float): Current time.
+            limit (int): Maximum number of pages returned.
+
+        Returns:
+            list: PageStats of the due pages, the most overdue first.
+        """
+        pages = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now and (limit is None or len(pages) < limit):
+                next_visit, url = heapq.heappop(self._heap)
+                page = self._pages.get(url)
+                if page is not None and page.next_visit == next_visit:
+                    pages.append(page)
+        return pages
+
+    def record_visit(self, url, signature, now) -> bool:
+        """
+        Records the visit of a page and schedules the next one.
+
+        Args:
+            url (str): URL of the page.
+            signature (str): Signature of the products of the page (see `products_signature`).
+            now (float): Time of the visit.
+
+        Returns:
+            bool: True if the products or prices changed since the previous visit.
+        """
+        with self._lock:
+            page = self._pages.get(url)
+            if page is None:  # Removed while it was being visited
+                return False
+            changed = page.signature is not None and signature != page.signature
+            if page.last_visit is not None:
+                page.n_intervals += 1
+                page.n_changes += changed
+                page.observed_seconds += now - page.last_visit
+                self._update_rate(page)
+            page.signature = signature
+            page.last_visit = now
+            page.next_visit = now + self.interval(url)
+            heapq.heappush(self._heap, (page.next_visit, url))
+            self._save(page)
+        return changed
+
+    def record_failure(self, url, now):
+        """Schedules a page that could not be downloaded to be visited again after min_interval."""
+        with self._lock:
+            page = self._pages.get(url)
+            if page is None:
+                return
+            page.next_visit = now + self.min_interval
+            heapq.heappush(self._heap, (page.next_visit, url))
+            self._save(page)
+
+    def summary(self) -> dict:
+        """
+        Summary of the schedule of every category.
+
+        Returns:
+            dict: Dict mapping every category to its number of pages, changes per day and planned visits per day.
+        """
+        summary = {}
+        with self._lock:
+            for url, page in self._pages.items():
+                category = summary.setdefault(page.category, {'pages': 0, 'changes_per_day': 0, 'visits_per_day': 0})
+                category['pages'] += 1
+                category['changes_per_day'] += self._rates[url] * DAY
+                category['visits_per_day'] += DAY / self.interval(url)
+        return summary
+
+    def close(self):
+        """Closes the database."""
+        if self._db is not None:
+            self._db.close()
+
+
+def load_snapshot_history(data_dir=DEFAULT_DATA_DIR):
+    """
+    Loads the signature of every leaf page on every day from the CSV snapshots exported by the previous runs.
+    The signature of a page on a day is a hash of its products and prices, so two days with the same
+    signature had the same prices.
+
+    Args:
+        data_dir (str | Path): Directory of the exported CSV files.
+
+    Returns:
+        pd.DataFrame: PATH_COLUMNS, Date and Signature columns, one row per page and day, sorted by page and date.
+    """
+    import pandas as pd
+    data_dir = Path(data_dir)
+    files = [data_dir / f for f in snapshot_files(data_dir)]
+    signatures = []
+    for file in files:
+        columns = list(pd.read_csv(file, nrows=0).columns)
+        if not set(PATH_COLUMNS + ['Date', 'Price', 'URL']) <= set(columns):
+            continue
+        snapshot = pd.read_csv(file, usecols=PATH_COLUMNS + ['Date', 'Price', 'URL'], dtype=str, keep_default_na=False)
+        # A page visited several times on the same day (daemon mode) keeps its last visit
+        snapshot = snapshot.drop_duplicates(PATH_COLUMNS + ['Date', 'URL'], keep='last')
+        # Order-independent signature: sum of the hashes of the (URL, price) pairs of every page and day
+        snapshot['Signature'] = pd.util.hash_pandas_object(snapshot[['URL', 'Price']], index=False)
+        signatures.append(snapshot.groupby(PATH_COLUMNS + ['Date'], sort=False)['Signature'].sum().reset_index())
+    if not signatures:
+        return pd.DataFrame(columns=PATH_COLUMNS + ['Date', 'Signature'])
+    history = pd.concat(signatures, ignore_index=True)
+    # A page in several snapshots of the same day keeps the first one, as in `merge_csv` (a re-extraction
+    # takes priority over the crawl it corrects)
+    history = history.drop_duplicates(PATH_COLUMNS + ['Date'], keep='first')
+    return history.sort_values(PATH_COLUMNS + ['Date'], ignore_index=True)
+
+
+def _snapshot_times(history) -> np.ndarray:
+    """Time of the snapshots of the history, in seconds since the epoch."""
+    import pandas as pd
+    return pd.to_datetime(history['Date'].astype(str), format='%Y%m%d').to_numpy().astype('datetime64[s]').astype('int64')
+
+
+def history_stats(history) -> dict:
+    """
+    Counts the changes of every page between consecutive snapshots.
+
+    Args:
+        history (pd.DataFrame): Snapshot history (see `load_snapshot_history`).
+
+    Returns:
+        dict: Dict mapping the path of every page (tuple of PATH_COLUMNS, None for the empty levels)
+        to its (n_intervals, n_changes, observed_seconds) tuple.
+    """
+    import pandas as pd
+    times = _snapshot_times(history)
+    paths = history[PATH_COLUMNS].to_numpy()
+    same_page = np.zeros(len(history), dtype=bool)
+    same_page[1:] = (paths[1:] == paths[:-1]).all(axis=1)
+    signatures = history['Signature'].to_numpy()
+    changed = same_page & np.concatenate([[False], signatures[1:] != signatures[:-1]])
+    seconds = np.where(same_page, np.diff(times, prepend=times[:1]), 0)
+
+    stats = pd.DataFrame({'intervals': same_page, 'changes': changed, 'seconds': seconds})
+    stats = stats.groupby([history[column] for column in PATH_COLUMNS], sort=False).sum()
+    return {tuple(name or None for name in path): (int(row.intervals), int(row.changes), float(row.seconds))
+            for path, row in zip(stats.index, stats.itertuples())}
+
+
+def _detection_delays(change_times, visit_times, end) -> np.ndarray:
+    """Seconds from every change to the first visit after it (to `end` if it was never visited after it)."""
+    first_visit = np.searchsorted(visit_times, change_times, side='left')
+    detected_at = np.append(visit_times, end)[first_visit]
+    return detected_at - change_times
+
+
+def simulate(history, budget, min_interval=3600, max_interval=7 * DAY, prior_rate=1 / DAY) -> dict:
+    """
+    Simulates the revisit scheduler against the recorded history, without sending any request.
+    At every simulated time, a page shows the products of its latest snapshot. The scheduler learns
+    the change rates from its own visits only, and is compared with visiting the pages in turn
+    with the same number of visits.
+
+    Args:
+        history (pd.DataFrame): Snapshot history (see `load_snapshot_history`).
+        budget (float): Visits per hour.
+        min_interval (float): Minimum number of seconds between two visits of a page.
+        max_interval (float): Maximum number of seconds between two visits of a page.
+        prior_rate (float): Changes per second assumed for the pages without history.
+
+    Returns:
+        dict: For the scheduler ("adaptive") and the round-robin baseline ("uniform"): number of visits, changes
+        detected and mean hours from a change to its detection. Also the number of pages, changes and simulated days.
+    """
+    import pandas as pd
+    times = _snapshot_times(history)
+    if not len(times):
+        raise ValueError("The history is empty.")
+    start, end = times.min(), times.max() + DAY
+
+    # Snapshot times, signatures and change times of every page
+    pages = {}
+    for path, indexes in history.groupby(PATH_COLUMNS, sort=False).indices.items():
+        page_times, signatures = times[indexes], history['Signature'].to_numpy()[indexes]
+        pages["/".join(name or "" for name in path)] = (path, page_times, signatures,
+                                                         page_times[1:][signatures[1:] != signatures[:-1]])
+
+    scheduler = RevisitScheduler(budget, min_interval, max_interval, prior_rate, path=None)
+    leaves = {}
+    for url, (path, *_) in pages.items():
+        leaves.setdefault(path[0], []).append([*path, url])
+    for category, structures in leaves.items():
+        scheduler.sync_leaves(category, structures, start)
+    visits = {url: [] for url in pages}
+    spacing = 3600 / budget
+    now = start
+    while True:
+        # Visit the most overdue page, without exceeding the budget
+        now = max(now + spacing, scheduler.next_due())
+        if now >= end:
+            break
+        page = scheduler.due(now, limit=1)[0]
+        _, page_times, signatures, _ = pages[page.url]
+        snapshot = np.searchsorted(page_times, now, side='right') - 1
+        if snapshot < 0:  # The page did not exist yet
+            scheduler.record_failure(page.url, now)
+            continue
+        scheduler.record_visit(page.url, signatures[snapshot], now)
+        visits[page.url].append(now)
+
+    n_visits = sum(len(page_visits) for page_visits in visits.values())
+    # Round-robin baseline with the same number of visits, staggered across the pages
+    uniform_interval = (end - start) * len(pages) / max(n_visits, 1)
+    results = {}
+    for name, visit_times in (
+        ('adaptive', {url: np.array(page_visits, dtype=float) for url, page_visits in visits.items()}),
+        ('uniform', {url: np.arange(start + i * uniform_interval / len(pages), end, uniform_interval)
+                     for i, url in enumerate(pages)}),
+    ):
+        delays = np.concatenate([_detection_delays(pages[url][3], page_visits, end)
+                                 for url, page_visits in visit_times.items()] or [np.empty(0)])
+        detected = np.concatenate([pages[url][3] <= (page_visits[-1] if len(page_visits) else start - 1)
+                                   for url, page_visits in visit_times.items()] or [np.empty(0, bool)])
+        results[name] = {
+            'visits': int(sum(len(page_visits) for page_visits in visit_times.values())),
+            'changes_detected': int(detected.sum()),
+            'mean_delay_hours': float(delays.mean() / 3600) if len(delays) else 0.0,
+        }
+    results.update({'pages': len(pages), 'changes': int(sum(len(page[3]) for page in pages.values())),
+                    'days': int((end - start) // DAY)})
+    return results
@@ -1,16 +1,23 @@
 from bs4 import BeautifulSoup
+import logging
 import random
-import requests
-from selenium import webdriver
 import time
-import unicodedata
-import pandas as pd
-from pathlib import Path
+import threading
 from itertools import chain
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support import expected_conditions as EC
+from http_session import HttpSession, FetchError
+from rate_control import RateLimiter
+from navigation import DEFAULT_CATEGORIES, SiteNavigation
+from incremental import page_fingerprint, diff_products
+from sinks import COLUMNS, DEFAULT_DATA_DIR, DataFrameSink, MultiSink, open_sinks, output_path
+from parsers import convert_price, extract_products, get_parser
+from embedded_state import state_fingerprint
+from postprocess import normalize_text, product_columns
+from metrics import Metrics
+
+logger = logging.getLogger(__name__)
 
 class BonpreuScraper():
     """
@@ -18,25 +25,103 @@ class BonpreuScraper():
     
     Attributes:
         base_url (str): The main URL of the Bonpreu website.
+        max_workers (int): Maximum number of pages fetched concurrently.
+        request_delay (float): Initial number of seconds between two requests to the same host. The rate limiter adapts it afterwards.
+        parse_processes (int): Number of processes used to parse the product pages. If 0, pages are parsed by the fetch workers.
+        session (HttpSession): HTTP session used for the static pages. It can be shared between scrapers.
+        rate_limiter (RateLimiter): Per-host token bucket and AIMD concurrency controller applied to every request.
+            It can be shared between scrapers. Defaults to the one of the session, or a new one.
+        driver_pool (DriverPool): Pool of Selenium drivers used for the dynamic pages. Created on first use if not provided,
+            with one driver per worker so no fetch thread waits for a driver.
+        navigation (SiteNavigation): Index of the navigation menus. It can be shared between scrapers, so the menus are downloaded only once.
+        fingerprints (FingerprintStore): If provided, enables the incremental mode: unchanged pages are not parsed again and the changes are saved as a delta.
+        parser (str): Backend used to parse the product cards ("selectolax", "lxml", "bs4" or "auto" for the fastest installed).
+        data_source (str): Where the products are read from: "html" for the server-rendered product cards, or "state" for
+            the state embedded in the page, which also holds the lazily loaded products (falls back to the cards if absent).
+        metrics (Metrics): Stage timings (fetch, soup, parse, postprocess, write) and counters of the crawl.
+            It can be shared between scrapers. Defaults to the one of the session, or disabled metrics.
+        archive (PageArchive): If provided, every fetched page is appended to this archive of raw pages.
+        crawl_date (str): Date of the output rows (YYYYmmdd). If None, the day each page is processed.
+            It is set when the products are extracted again from the pages archived on a past day.
+        failed_urls (list): List of (URL, reason) tuples of the pages that could not be downloaded.
+        failed_reasons (dict): Dict mapping the URLs of `failed_urls` to their reasons, for constant-time lookups.
     """
     # Default categories to scrape
-    default_categories = [
-        "Frescos", "Alimentació", "Begudes",
-        "Làctics i ous", "Celler"
-        ]
+    default_categories = DEFAULT_CATEGORIES
+    
+    # Deepest subcategory level of the category tree
+    max_subcat_depth = 4
     
-    def __init__(self, base_url, category):
+    # Define a list of user agents to avoid being blocked
+    user_agents = [
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/90.0.4430.93 Safari/537.36",
+        "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/89.0.4389.114 Safari/537.36",
+        "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/92.0.4515.107 Safari/537.36",
+        "Mozilla/5.0 (Linux; Android 11; SM-G981B) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/88.0.4324.181 Mobile Safari/537.36",
+    ]
+    
+    def __init__(self, base_url, category, max_workers=8, request_delay=0.1, parse_processes=0, session=None,
+                 driver_pool=None, navigation=None, fingerprints=None, parser="auto",
+                 data_source="html", rate_limiter=None, metrics=None, archive=None, crawl_date=None):
         self.base_url = base_url
         if not category or category not in self.default_categories:
             raise ValueError("Category not found. Use BonpreuScraper.categories() to get the available categories.")
         else:
             self.category = category
+        self.max_workers = max(1, max_workers)
+        self.request_delay = request_delay
+        self.parse_processes = parse_processes
+        # Rate limiter shared by the static requests (through the session) and the Selenium loads
+        if rate_limiter is None:
+            rate_limiter = session.rate_limiter if session and getattr(session, 'rate_limiter', None) else \
+                RateLimiter(rate=1 / request_delay if request_delay else None, max_concurrency=self.max_workers)
+        self.rate_limiter = rate_limiter
+        if metrics is None:
+            metrics = session.metrics if session and getattr(session, 'metrics', None) else Metrics(enabled=False)
+        self.metrics = metrics
+        self.session = session if session else HttpSession(pool_size=self.max_workers, rate_limiter=rate_limiter,
+                                                           metrics=metrics)
+        self.driver_pool = driver_pool
+        self.navigation = navigation if navigation is not None else SiteNavigation(base_url)
+        self.fingerprints = fingerprints
+        # Fail early if the backend is not installed
+        get_parser(parser)
+        self.parser = parser
+        if data_source not in ("html", "state"):
+            raise ValueError("The data source must be 'html' or 'state'.")
+        self.data_source = data_source
+        self.archive = archive
+        self.crawl_date = crawl_date
+        # Fingerprints of the pages crawled in incremental mode, waiting to be saved by the collector
+        self._page_fingerprints = {}
+        self._driver_pool_lock = threading.Lock()
+        self.failed_urls = []
+        self.failed_reasons = {}
               
     @classmethod
     def categories(cls):
         """Method to get the categories."""
         return cls.default_categories
     
+    def _get_driver_pool(self):
+        """
+        Returns the pool of Selenium drivers, starting it on first use.
+        Selenium is only imported here, so the runs without dynamic pages do not load it.
+        
+        Returns:
+            DriverPool: Pool of warm drivers.
+        """
+        with self._driver_pool_lock:
+            if self.driver_pool is None:
+                from driver_pool import DriverPool
+                self.driver_pool = DriverPool(self.base_url, size=self.max_workers, user_agents=self.user_agents)
+            return self.driver_pool
+    
+    def close(self):
+        """Releases the resources held by the scraper (Selenium drivers)."""
+        if self.driver_pool is not None:
+            self.driver_pool.close()
+    
     def _parse_html(self, url: str = None, dynamic_content = False) -> str:
         """
         Parses the HTML content of the page.
@@ -47,87 +132,71 @@ class BonpreuScraper():
             
         Returns:
             str: HTML content of the page.
+            
+        Raises:
+            FetchError: If the page could not be loaded.
         """
-        # Define a list of user agents to avoid being blocked
-        user_agent_list = [
-            "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/90.0.4430.93 Safari/537.36",
-            "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/89.0.4389.114 Safari/537.36",
-            "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/92.0.4515.107 Safari/537.36",
-            "Mozilla/5.0 (Linux; Android 11; SM-G981B) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/88.0.4324.181 Mobile Safari/537.36",
-        ]
         # Randomly select a user agent from the list
-        user_agent = random.choice(user_agent_list)
+        user_agent = random.choice(self.user_agents)
         
         try:
-            if dynamic_content:
-                # Set the options for the Chrome driver
-                options = webdriver.ChromeOptions()
-                options.add_argument(f"--User-Agent={user_agent}")
-                options.add_argument("--headless")
-                options.add_argument("--disable-blink-features=AutomationControlled")
-                options.add_argument("disable-gpu")
-                options.add_argument("--blink-settings=imagesEnabled=false")  # Avoid images and other media types
-                # Sets the driver
-                driver = webdriver.Chrome(options=options)
-                # Opens the URL
-                driver.get(url)
-
-                # Waiting popup
-                try:
-                    cookie_accept_button = WebDriverWait(driver, 10).until(
-                        EC.element_to_be_clickable((By.ID, "onetrust-accept-btn-handler"))
-                    )
-                    # Click on Accept button
-                    cookie_accept_button.click()  
-                    print("Popup de cookies cerrado.")
-                except Exception as e:
-                    print("No se encontró el popup de cookies o ya estaba cerrado.")
-
-                # Get the height of the page
-                last_height = driver.execute_script("return document.body.scrollHeight")
+            with self.metrics.timer('fetch'):
+                if dynamic_content:
+                    from selenium.common.exceptions import TimeoutException
+                    # Load the page with a warm driver of the pool, at the pace allowed by the rate limiter
+                    with self.rate_limiter.request(url) as ticket:
+                        try:
+                            page = self._get_driver_pool().fetch(url)
+                        except TimeoutException:
+                            ticket.outcome = 'timeout'
+                            raise
                 
-                while True:
-                    # Scrolls to the bottom of the page
-                    driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-                    # Waits for the page to load
-                    time.sleep(2)
-                    # Gets the new height of the page
-                    new_height = driver.execute_script("return document.body.scrollHeight")
-                    
-                    if new_height == last_height:
-                        break
+                else:
+                    # Define the headers to avoid being blocked
+                    headers = {
+                        "User-Agent": user_agent,
+                        "Accept-Language": "en-US,en;q=0.9",
+                        "Accept-Encoding": "gzip, deflate, br",
+                        "Connection": "keep-alive",
+                        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9",  # Avoid images and other media types
+                        "Accept-Encoding": "gzip, deflate"  # Enable compression to reduce response size
+                    }
                     
-                    last_height = new_height
+                    # Use the pooled session to get the page content (retries transient errors at the pace of the rate limiter)
+                    response = self.session.get(url, headers=headers)
                     
-                # Gets the page source
-                page_source = driver.page_source
-                # Closes the driver
-                driver.quit()
-            
-                return page_source
-            
-            else:
-                # Define the headers to avoid being blocked
-                headers = {
-                    "User-Agent": user_agent,
-                    "Accept-Language": "en-US,en;q=0.9",
-                    "Accept-Encoding": "gzip, deflate, br",
-                    "Connection": "keep-alive",
-                    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9",  # Avoid images and other media types
-                    "Accept-Encoding": "gzip, deflate"  # Enable compression to reduce response size
-                }
-                
-                # Use requests to get the page content
-                response = requests.get(url, headers=headers, timeout=2)
-                
-                return response.text
+                    page = response.text
         
+        except FetchError:
+            raise
         except Exception as e:
-            print(f"Error occurred while loading the page: {e}")
-            
-        return
+            raise FetchError(url, f"Error occurred while loading the page: {e}") from e
+        
+        if self.archive is not None:
+            # Keep the raw page, so the products can be extracted again later without any request
+            with self.metrics.timer('archive'):
+                self.archive.record(url, page)
+        return page
+    
+    def _record_failure(self, error):
+        """
+        Keeps track of a page that could not be downloaded, so the run can go on without it.
         
-    def _get_soup(self, html_page) -> BeautifulSoup:
+        Args:
+            error (FetchError): Error raised while loading the page.
+        """
+        logger.warning(f"Skipping page: {error}", extra={'url': error.url, 'reason': error.reason})
+        self.metrics.increment('failed_pages')
+        self.failed_urls.append((error.url, error.reason))
+        self.failed_reasons[error.url] = error.reason
+
+    def clear_failed_urls(self):
+        """Forgets the pages that could not be downloaded, before crawling a new batch of pages."""
+        self.failed_urls.clear()
+        self.failed_reasons.clear()
+        
+    @staticmethod
+    def _get_soup(html_page) -> BeautifulSoup:
         """
         Creates a BeautifulSoup object for the webpage passed.
         
@@ -144,94 +213,107 @@ class BonpreuScraper():
             return soup
         
         except Exception as e:
-            print(f"Error occurred while parsing the HTML: {e}")
+            logger.error(f"Error occurred while parsing the HTML: {e}")
         
         return
     
     def _get_categories_section_url(self) -> str:
         """
         Retrieves the URL of the categories section from the navigation menu.
-        The categories web page is accessed through the Supermercat section.
+        The main page is only downloaded the first time, then the URL is read from the navigation index.
         
         Returns:
             str: URL of the categories page, if found. Otherwise, None.
         """
-        try:
-            # Get the main page content
-            main_page = self._parse_html(self.base_url, dynamic_content=False)
-            
-            # Get the main page soup
+        return self.navigation.get_categories_section_url(self._load_categories_section_url)
+    
+    def _load_categories_section_url(self) -> str:
+        """
+        Downloads the main page to find the URL of the categories section.
+        The categories web page is accessed through the Supermercat section.
+        
+        Returns:
+            str: URL of the categories page.
+
+        Raises:
+            FetchError: If the main page could not be downloaded or has no Supermercat section.
+        """
+        # Get the main page content (a FetchError keeps the URL of the page that failed)
+        main_page = self._parse_html(self.base_url, dynamic_content=False)
+        
+        # Get the main page soup
+        with self.metrics.timer('soup'):
             main_soup = self._get_soup(main_page)
-            
-            # Get the navigation menus from the main page where the Supermercat is located
-            nav_menu = main_soup.find_all('ul', {
-                'id': 'nav-menu',
-                'aria-labelledby': 'nav-menu-button',
-                'role': 'menu',
-                'class': 'sc-1w5m3ly-0 aIFnR'
-            })
-            
-            # As the previous find_all returns a list,
-            # we need to get the element where "Supermercat" is located
-            if isinstance(nav_menu, list):
-                for ul in nav_menu:
-                    if ul.find('li', string='Supermercat'):
-                        # Get the url of the Supermercat page
-                        categories_tag = ul.find('li', string='Supermercat')
-                        categories_section_url = self.base_url + categories_tag.find('a')['href']
-                        
-                        return categories_section_url
-                    
-            else:
-                print("Error occurred while getting the categories section URL: nav_menu is not a list.")
-                return
-        except Exception as e:
-            print(f"Error occurred while getting the categories section URL: {e}")
-            
-            return
+        
+        # Get the navigation menus from the main page where the Supermercat is located
+        nav_menu = main_soup.find_all('ul', {
+            'id': 'nav-menu',
+            'aria-labelledby': 'nav-menu-button',
+            'role': 'menu',
+            'class': 'sc-1w5m3ly-0 aIFnR'
+        })
+        
+        # Get the element where "Supermercat" is located
+        for ul in nav_menu:
+            categories_tag = ul.find('li', string='Supermercat')
+            if categories_tag and categories_tag.find('a'):
+                # Get the url of the Supermercat page
+                return self.base_url + categories_tag.find('a')['href']
+        
+        raise FetchError(self.base_url, "the Supermercat section was not found in the navigation menu")
 
-    def get_subcategories_names(self) -> list:
+    def _get_category_url(self) -> str:
         """
-        Gets the names of subcategories of the selected category.
+        Gets the URL of the selected category from the menu of the categories section.
         
         Returns:
-            list: List containing the subcategories.
+            str: URL of the category page.
         """
         # Get the URL of the categories section
         categories_url = self._get_categories_section_url()
-        # Get the page content of the categories section
-        categories_page = self._parse_html(categories_url, dynamic_content=False)
-        # Get the soup of the categories page
-        categories_soup = self._get_soup(categories_page)
-        # Get the div tag containing the categories menu
-        categories_menu = categories_soup.find('div', {
-            'class': 'sc-1wz1hmv-0 cmTtoc'
-        })
+        # Get the links of the categories menu
+        categories_links = self._extract_subcategory_links(categories_url)
         # Filter the categories menu to get the desired category
-        self.category_tag = [cat for cat in categories_menu.find_all('a') if cat.text == self.category][0]
-        # Get the html content of the subcategory page
-        self.subcat_page = self._parse_html(self.base_url + self.category_tag["href"], dynamic_content=False)
-        # Get the soup of the subcategory page
-        self.subcat_soup = self._get_soup(self.subcat_page)
-        # Get the div tag containing the subcategories menu
-        self.subcat_menu = self.subcat_soup.find('div', {
-        'class': 'sc-1wz1hmv-0 cmTtoc'
-        })
+        return [url for text, url in categories_links if text == self.category][0]
+    
+    def get_subcategories_names(self) -> list:
+        """
+        Gets the names of subcategories of the selected category.
         
-        return [subcat.text for subcat in self.subcat_menu.find_all('a')]
+        Returns:
+            list: List containing the subcategories.
+        """
+        # Get the links of the subcategories menu of the category page
+        subcat_links = self._extract_subcategory_links(self._get_category_url())
+        
+        return [text for text, _ in subcat_links]
 
     def _extract_subcategory_links(self, url):
         """
         Helper function to extract subcategory links at the given URL.
         If subcategories exist, returns a list of (text, full_url) tuples; otherwise, returns None.
+        Each page is only downloaded the first time, then the links are read from the navigation index.
         
         Args:
             url (str): URL of the subcategory page.
         """
+        return self.navigation.get_links(url, self._load_subcategory_links)
+    
+    def _load_subcategory_links(self, url):
+        """
+        Downloads a page and extracts the links of its subcategories menu.
+        
+        Args:
+            url (str): URL of the subcategory page.
+            
+        Returns:
+            list: List of (text, full_url) tuples, or None if the page has no subcategories menu.
+        """
         # Get the html content of the subcategory page
         subcat_page = self._parse_html(url, dynamic_content=False)
         # Get the soup of the subcategory page
-        subcat_soup = self._get_soup(subcat_page)
+        with self.metrics.timer('soup'):
+            subcat_soup = self._get_soup(subcat_page)
         # Get the div tag containing the subcategories menu
         subcat_menu = subcat_soup.find('div', {
         'class': 'sc-1wz1hmv-0 cmTtoc'
@@ -239,6 +321,18 @@ class BonpreuScraper():
         
         return [(a.text, self.base_url + a['href']) for a in subcat_menu.find_all('a')] if subcat_menu else None
     
+    def _try_extract_subcategory_links(self, url):
+        """
+        Same as `_extract_subcategory_links`, but returns the FetchError instead of raising it.
+        
+        Args:
+            url (str): URL of the subcategory page.
+        """
+        try:
+            return self._extract_subcategory_links(url)
+        except FetchError as e:
+            return e
+    
     def _extract_subcat_structure(self, subcategory) -> list:
         """
         Extracts the hierarchical structure of the subcategories and their URLs.
@@ -252,6 +346,8 @@ class BonpreuScraper():
             [
                 'Frescos', 'Fruites i verdures', 'De temporada', 'Fruita', None, 'https://www.compraonline.bonpreuesclat.cat/...'
             ]
+        The tree is crawled breadth-first: all the pages of a level are fetched concurrently (up to `max_workers`)
+        and the rows are returned in the same depth-first order as the category menu.
         
         Args:
             subcategory (str): If provided, extracts the subcategories of the given subcategory. Otherwise, extracts all the subcategories of the category.
@@ -259,55 +355,50 @@ class BonpreuScraper():
         Returns:
             list: List of URLs of the subcategories.
         """
-        print(f"Extracting subcategory structure for the {self.category} > {subcategory}...")
+        logger.info(f"Extracting subcategory structure for the {self.category} > {subcategory}...")
         # Set the first two levels of the hierarchy
         # Level 0 and level 1 are the category and subcategory, respectively defined by the user
         level_0_text = self.category
         
-        # Initialize the list to store the subcategories
-        subcat_list = []
-        
         # Extract the subcategories of level 1
-        level_1_subcats = self._extract_subcategory_links(self.base_url + self.category_tag["href"])
-        
-        for level_1_text, url_1 in level_1_subcats:
-            
-            # Check if the subcategory is the one we are looking for
-            if subcategory != level_1_text:
-                continue
-
-            # Extract the subcategories of level 2
-            level_2_subcats = self._extract_subcategory_links(url_1)
-            
-            if level_2_subcats: # If there are subcategories of level 2
-
-                for level_2_text, url_2 in level_2_subcats:
-                    # Extract the subcategories of level 3
-                    level_3_subcats = self._extract_subcategory_links(url_2)
-
-                    if level_3_subcats: # If there are subcategories of level 3
-                        
-                        for level_3_text, url_3 in level_3_subcats:
-                            # Extract the subcategories of level 4
-                            level_4_subcats = self._extract_subcategory_links(url_3)
-
-                            if level_4_subcats: # If there are subcategories of level 4
-                                
-                                for level_4_text, url_4 in level_4_subcats:
-                                    subcat_list.append([level_0_text, level_1_text, level_2_text, level_3_text, level_4_text, url_4])
-                            
-                            else: # Without level 4
-                                subcat_list.append([level_0_text, level_1_text, level_2_text, level_3_text, None, url_3])
-                    
-                    else: # Without level 3
-                        subcat_list.append([level_0_text, level_1_text, level_2_text, None, None, url_2])
-            
-            else: # Without level 2
-                subcat_list.append([level_0_text, level_1_text, None, None, None, url_1])
-        
-        return subcat_list
-        
-    def _convert_price(self, price_str) -> float:
+        level_1_subcats = self._extract_subcategory_links(self._get_category_url())
+        
+        # Each node of the tree is stored as (position, texts, url), where position is the tuple of indexes
+        # of the node in the menus of every level. Sorting by position restores the depth-first order.
+        frontier = [((i,), [level_1_text], url_1)
+                    for i, (level_1_text, url_1) in enumerate(level_1_subcats)
+                    if subcategory == level_1_text]
+        leaves = []
+        
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            # Expand the tree one level at a time until the deepest subcategory level
+            for _ in range(self.max_subcat_depth - 1):
+                if not frontier:
+                    break
+                # Fetch the subcategories of every node of the level concurrently
+                children = executor.map(self._try_extract_subcategory_links, [url for _, _, url in frontier])
+                
+                next_frontier = []
+                for (position, texts, url), links in zip(frontier, children):
+                    if isinstance(links, FetchError): # The branch can not be explored
+                        self._record_failure(links)
+                    elif links: # If there are subcategories of the next level
+                        next_frontier.extend((position + (j,), texts + [text], link_url)
+                                             for j, (text, link_url) in enumerate(links))
+                    else: # Without next level
+                        leaves.append((position, texts, url))
+                frontier = next_frontier
+        
+        # The nodes of the deepest level are always leaves
+        leaves.extend(frontier)
+        leaves.sort(key=lambda leaf: leaf[0])
+        
+        # Fill the missing levels with None until the URL
+        return [[level_0_text, *texts, *[None] * (self.max_subcat_depth - len(texts)), url]
+                for _, texts, url in leaves]
+        
+    @staticmethod
+    def _convert_price(price_str) -> float:
         """
         Converts the price string to a float.
         
@@ -317,7 +408,7 @@ class BonpreuScraper():
             Returns:
                 float: Price as a float.
         """
-        return float(price_str.replace('\xa0€', '').replace(',', '.'))
+        return convert_price(price_str)
     
     def _normalize_text(self, text) -> str:
         """
@@ -329,127 +420,293 @@ class BonpreuScraper():
         Returns:
             str: Normalized text.
         """
-        return unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode('utf-8') if text else None
+        return normalize_text(text)
+    
+    @staticmethod
+    def _extract_products(html_page, base_url, parser="bs4", data_source="html") -> list:
+        """
+        Extracts the details of every product of a subcategory page.
+        It is a static method so that it can be run in a separate process.
+        
+        Args:
+            html_page (str): HTML content of the subcategory page.
+            base_url (str): The main URL of the Bonpreu website, used to build the product URLs.
+            parser (str): Parser backend ("selectolax", "lxml", "bs4" or "auto").
+            data_source (str): "html" to read the product cards or "state" to read the embedded state of the page.
+            
+        Returns:
+            list: List of (product name, price, quantity, URL) tuples.
+        """
+        return extract_products(html_page, base_url, parser, data_source)
+    
+    def _get_page_products(self, url, parse) -> list:
+        """
+        Fetches a subcategory page and extracts its products.
+        In incremental mode, the products of a page whose fingerprint did not change since the previous crawl
+        are taken from the fingerprint store instead of parsing the page again.
+        
+        Args:
+            url (str): URL of the subcategory page.
+            parse (callable): Function extracting the products from the HTML content of the page.
+            
+        Returns:
+            list: List of (product name, price, quantity, URL) tuples. Empty if the page could not be downloaded.
+        """
+        # Fetch stage
+        try:
+            subcategory_page = self._parse_html(url, dynamic_content=False) # Set to False for speed purposes
+        except FetchError as e:
+            self._record_failure(e)
+            return []
+        self.metrics.increment('pages')
+        
+        if self.fingerprints:
+            fingerprint = state_fingerprint(subcategory_page) if self.data_source == "state" else None
+            fingerprint = fingerprint or page_fingerprint(subcategory_page)
+            self._page_fingerprints[url] = fingerprint
+            previous = self.fingerprints.get(url)
+            if previous and previous[0] == fingerprint:
+                # The product cards did not change, skip the parsing
+                self.metrics.increment('unchanged_pages')
+                return previous[2]
+        
+        # Parse stage
+        with self.metrics.timer('parse'):
+            return parse(subcategory_page)
+    
+    def _iter_product_pages(self, url_list):
+        """
+        Fetches and parses the subcategory pages, yielding their products in the same order as `url_list`.
+        
+        With a single worker and no parse processes the pages are handled one after another.
+        Otherwise, the work is pipelined: a pool of `max_workers` threads fetches the pages,
+        the parsing runs in the fetch threads or in a pool of `parse_processes` processes,
+        and the results are collected in order with at most 2 * `max_workers` pages in flight.
+        Pages that can not be downloaded are recorded in `failed_urls` and yield no products.
+        
+        Args:
+            url_list (list): URLs of the subcategory pages.
+            
+        Yields:
+            list: List of (product name, price, quantity, URL) tuples of each page.
+        """
+        def parse_here(subcategory_page):
+            return self._extract_products(subcategory_page, self.base_url, self.parser, self.data_source)
+        
+        if self.max_workers == 1 and not self.parse_processes:
+            for url in url_list:
+                yield self._get_page_products(url, parse_here)
+            return
+        
+        parse_pool = ProcessPoolExecutor(max_workers=self.parse_processes) if self.parse_processes else None
+        
+        def parse_in_pool(subcategory_page):
+            return parse_pool.submit(self._extract_products, subcategory_page, self.base_url,
+                                     self.parser, self.data_source).result()
+        
+        parse = parse_in_pool if parse_pool else parse_here
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as fetch_pool:
+                # Ordered collector: keep a bounded window of pending pages and yield them in order
+                pending = deque()
+                for url in url_list:
+                    pending.append(fetch_pool.submit(self._get_page_products, url, parse))
+                    if len(pending) >= 2 * self.max_workers:
+                        yield pending.popleft().result()
+                while pending:
+                    yield pending.popleft().result()
+        finally:
+            if parse_pool:
+                parse_pool.shutdown(cancel_futures=True)
+    
+    def _page_rows(self, subcat_structure, products) -> list:
+        """
+        Builds the output rows of the products of a page.
+        The page is post-processed as a batch: the category path is normalized once, and the prices,
+        quantities and unit prices are parsed as columns (see `postprocess.product_columns`).
+        
+        Args:
+            subcat_structure (list): Category, subcategories and URL of the page of the products.
+            products (list): List of (product name, price, quantity, URL) tuples.
+            
+        Returns:
+            list: List of tuples with the values of the products in the order of `sinks.COLUMNS`.
+        """
+        if not products:
+            return []
+        category_path = tuple(self._normalize_text(text) for text in subcat_structure[:5])
+        date = self.crawl_date or time.strftime("%Y%m%d")
+        columns = product_columns(products)
+        return [
+            category_path + (name, date, price, quantity, url, value, unit, unit_price)
+            for name, price, quantity, url, value, unit, unit_price in zip(
+                columns['names'], columns['prices'], columns['quantities'], columns['urls'],
+                columns['values'], columns['units'], columns['unit_prices'],
+            )
+        ]
+    
+    def _output_name(self) -> str:
+        """Name of the category used in the output filenames, without spaces nor special characters."""
+        return self._normalize_text(self.category.replace(' ', '_'))
     
-    def get_product_info(self, subcategories = None) -> tuple:
+    def get_product_info(self, subcategories = None, sink = None, formats = ("csv",), return_dataframe = True,
+                         journal = None, data_dir = DEFAULT_DATA_DIR, enricher = None):
         """
         Extracts all products and their information from the given subcategory.
+        The products are written to the output as soon as each page is extracted, so a crashed run keeps
+        the pages extracted so far and the memory used does not grow with the size of the category.
+        
+        With a journal, the leaf pages and the rows of every completed page are also saved to disk.
+        Running again with the same journal skips the tree crawl and the completed pages, and writes
+        the same output files as an uninterrupted run.
 
         Args:
             subcategories (str | list): Name of the subcategory(es). If None, extracts all the products from the category.
-
+            sink (RowSink): Destination of the products. If None, writes them to data/{category}_{timestamp}.{format}.
+            formats (tuple): Output formats ("csv" and/or "parquet") used when no sink is given.
+            return_dataframe (bool): If True, also keeps the products in memory and returns them as a DataFrame.
+            journal (CategoryJournal): Journal of the category, used to checkpoint and resume the extraction.
+            data_dir (str | Path): Directory of the output files used when no sink is given.
+            enricher (Enricher): If provided, fetches the detail page of every unique product of the category
+                (EAN, brand and unit price) and writes them to data/{category}_details_{timestamp}.csv.
+            
+        Returns:
+            pd.DataFrame: The product information if return_dataframe is True. Otherwise, None.
         """
-        if isinstance(subcategories, str):
-            # Convert the string to a list
-            subcategories = [subcategories]
-        elif not subcategories:
-            # Get all the subcategories
-            subcategories = self.get_subcategories_names()
-        
-        # First, get the list of URLs
-        subcat_structure_list = [self._extract_subcat_structure(s) for s in subcategories]
-        # Flatten the list of lists
-        subcat_structure_list = list(chain(*subcat_structure_list))
+        if journal is not None and journal.leaves is not None:
+            # Resumed run: the leaf pages were already discovered
+            subcat_structure_list = journal.leaves
+            logger.info(f"Resuming the {self.category} category with {len(subcat_structure_list)} subcategory pages.")
+        else:
+            if isinstance(subcategories, str):
+                # Convert the string to a list
+                subcategories = [subcategories]
+            elif not subcategories:
+                # Get all the subcategories
+                subcategories = self.get_subcategories_names()
+            
+            # First, get the list of URLs
+            subcat_structure_list = [self._extract_subcat_structure(s) for s in subcategories]
+            # Flatten the list of lists
+            subcat_structure_list = list(chain(*subcat_structure_list))
+            if journal is not None:
+                journal.save_leaves(subcat_structure_list)
         url_list = [subcat_structure[-1] for subcat_structure in subcat_structure_list]
         
-        # Initialize a dict to store the product information
-        data = {
-            'Category': [],
-            'Subcategory_1': [],
-            'Subcategory_2': [],
-            'Subcategory_3': [],
-            'Subcategory_4': [],
-            'Product Name': [],
-            'Date': [],
-            'Price': [],
-            'Quantity (kg|L)': [],
-            'URL': []
-            }
-                
-        # Iterate through the URLs to get the product details
-        for i, url in enumerate(url_list):
+        # Pages completed by a previous run with the same journal
+        completed_pages = journal.completed_pages() if journal is not None else {}
+        pending_indexes = [i for i in range(len(url_list)) if i not in completed_pages]
+        
+        # Open the outputs of the product information
+        timestamp = journal.timestamp if journal is not None else time.strftime("%Y%m%d_%H%M%S")
+        owned_sinks = []
+        if sink is None:
+            sink = open_sinks(self._output_name(), formats, data_dir=data_dir, timestamp=timestamp)
+            owned_sinks.append(sink)
+        dataframe_sink = DataFrameSink() if return_dataframe else None
+        writer = MultiSink([sink, dataframe_sink]) if dataframe_sink else sink
+        # In incremental mode, also write the products that changed since the previous crawl
+        delta_sink = None
+        if self.fingerprints:
+            delta_sink = open_sinks(self._output_name(), suffix="_delta", columns=COLUMNS + ['Change', 'Previous Price'],
+                                    data_dir=data_dir, timestamp=timestamp)
+            owned_sinks.append(delta_sink)
+        
+        n_products = n_changes = 0
+        all_completed = True
+        pending_pages = None
+        try:
+            # Fetch only the pending pages, the completed ones are replayed from the journal in their place
+            pending_pages = self._iter_product_pages([url_list[i] for i in pending_indexes])
             
-            print(f"Extracting products from the {self.category} category ({i + 1}/{len(url_list)})...")
-                        
-            # Get the parsed HTML content
-            subcategory_page = self._parse_html(url, dynamic_content=False) # Set to False for speed purposes
-            subcategory_soup = self._get_soup(subcategory_page)         
-
-            # Extract product details from each product card
-            for product in subcategory_soup.find_all("div", {'class': 'product-card-container'}):
+            # Iterate through the pages to get the product details
+            for i in range(len(url_list)):
                 
-                # Extract product name
-                try:
-                    product_name = product.find('a').get("aria-label", None)
-                except AttributeError:
-                    product_name = None
-
-                # Extract product price
-                try:
-                    product_price = product.find('span', {'class': '_text_16wi0_1 _text--m_16wi0_23 sc-1fkdssq-0 bwsVzh'})
-                    product_price = self._convert_price(product_price.text) if product_price else None
-                except AttributeError:
-                    product_price = None
+                if i in completed_pages:
+                    rows, delta_rows = completed_pages[i]
+                else:
+                    logger.info(f"Extracting products from the {self.category} category ({i + 1}/{len(url_list)})...")
+                    products = next(pending_pages)
+                    with self.metrics.timer('postprocess'):
+                        rows = self._page_rows(subcat_structure_list[i], products)
+                    
+                    delta_rows = []
+                    if delta_sink and url_list[i] in self._page_fingerprints:
+                        previous = self.fingerprints.get(url_list[i])
+                        changes = diff_products(previous[2] if previous else [], products)
+                        changed_rows = self._page_rows(subcat_structure_list[i], [product for _, product, _ in changes])
+                        delta_rows = [row + (change, previous_price)
+                                      for row, (change, _, previous_price) in zip(changed_rows, changes)]
+                        self.fingerprints.put(url_list[i], self._page_fingerprints.pop(url_list[i]), products)
+                    
+                    # Failed pages are not recorded, so a resumed run tries them again
+                    if url_list[i] in self.failed_reasons:
+                        all_completed = False
+                    elif journal is not None:
+                        journal.record_page(i, url_list[i], rows, delta_rows)
                 
-                # Extract product quantity
-                try:
-                    product_quantity = product.find('span', {'class': '_text_16wi0_1 _text--m_16wi0_23 sc-1sjeki5-0 asqfi'})
-                    product_quantity = product_quantity.text if product_quantity else None
-                except AttributeError:
-                    product_quantity = None
-
-                # Extract product URL
-                try:
-                    product_url = product.find('a').get('href', None)
-                    product_url = self.base_url + product_url if product_url else None
-                except AttributeError:
-                    product_url = None
-
-                # Append extracted details to lists
-                data['Category'].append(self._normalize_text(subcat_structure_list[i][0]))
-                data['Subcategory_1'].append(self._normalize_text(subcat_structure_list[i][1]))
-                data['Subcategory_2'].append(self._normalize_text(subcat_structure_list[i][2]))
-                data['Subcategory_3'].append(self._normalize_text(subcat_structure_list[i][3]))
-                data['Subcategory_4'].append(self._normalize_text(subcat_structure_list[i][4]))
-                data['Date'].append(time.strftime("%Y%m%d"))
-                data['Product Name'].append(self._normalize_text(product_name))
-                data['Price'].append(product_price)
-                data['Quantity (kg|L)'].append(product_quantity)
-                data['URL'].append(product_url)
-        
-        # Save the product information to a CSV file
-        print(f"Extracted {len(data['Product Name'])} products from the {self.category} and {subcategories} subcategories.")
-        return self._save_csv(data)
+                with self.metrics.timer('write'):
+                    writer.write_rows(rows)
+                    if delta_sink:
+                        delta_sink.write_rows(delta_rows)
+                if enricher is not None:
+                    enricher.add_rows(rows)
+                n_products += len(rows)
+                n_changes += len(delta_rows)
+                self.metrics.increment('products', len(rows))
+        finally:
+            if pending_pages is not None:
+                pending_pages.close()
+            sink.flush()
+            for owned_sink in owned_sinks:
+                owned_sink.close()
+        
+        if enricher is not None:
+            # Each product is fetched once, even if it is listed under several subcategories
+            with self.metrics.timer('enrich'):
+                n_enriched = enricher.write_details(self._normalize_text(self.category), self._output_name(),
+                                                    self._parse_html, data_dir=data_dir, timestamp=timestamp)
+            logger.info(f"Enriched {n_enriched} unique products of the {self.category} category.")
+        
+        if journal is not None:
+            if all_completed:
+                journal.mark_done()
+            else:
+                journal.close()
+        
+        logger.info(f"Extracted {n_products} products from the {self.category} and {subcategories} subcategories.",
+                    extra={'category': self.category, 'products': n_products})
+        if delta_sink:
+            logger.info(f"{n_changes} products changed since the previous crawl.", extra={'changes': n_changes})
+        if self.failed_urls:
+            logger.warning(f"{len(self.failed_urls)} pages could not be downloaded:")
+            for url, reason in self.failed_urls:
+                logger.warning(f"- {url} ({reason})")
+        
+        return dataframe_sink.to_dataframe() if dataframe_sink else None
             
-    def _save_csv(self, product_info):
+    def _save_csv(self, product_info, suffix=""):
         """
         Saves the product information to a CSV file.
         
         Args:
             product_info (tuple): Tuple containing the product information.
+            suffix (str): Suffix added to the category in the filename (e.g. "_delta").
         """
         
+        import pandas as pd
+        
         # Create a DataFrame from the product information
         product_df = pd.DataFrame(product_info)
         
         # Create the filename based on the category + timestamp
         # Example: Frescos_20210901_120000.csv
-        
-        # First, check that category and subcategory_1 do not contain spaces and special characters
-        category = product_df['Category'][0].replace(' ', '_')
-        
-        # Remove special characters
-        category = self._normalize_text(category)
-        
-        # Get the current timestamp
-        timestamp = time.strftime("%Y%m%d_%H%M%S")
-        
-        # Create the filename
-        filename = Path(__file__).parent.parent / "data" / f"{category}_{timestamp}.csv"
+        filename = output_path(self._output_name(), suffix)
         
         # Save the DataFrame to a CSV file
-        product_df.to_csv(filename, index=False, encoding='utf-8')
+        with self.metrics.timer('write'):
+            product_df.to_csv(filename, index=False, encoding='utf-8')
         
-        print(f"Product information saved to {filename}.")
+        logger.info(f"Product information saved to {filename}.")
         
         return product_df
\ No newline at end of file
@@ -0,0 +1,417 @@
+import csv
+import importlib.util
+import logging
+import os
+import re
+import time
+from pathlib import Path
+
+# Parquet output is optional. pyarrow takes a while to load, so it is only imported by the Parquet sinks
+PYARROW_INSTALLED = importlib.util.find_spec("pyarrow") is not None
+pa = None
+pq = None
+
+logger = logging.getLogger(__name__)
+
+# Columns of the product information, in output order
+COLUMNS = [
+    'Category', 'Subcategory_1', 'Subcategory_2', 'Subcategory_3', 'Subcategory_4',
+    'Product Name', 'Date', 'Price', 'Quantity (kg|L)', 'URL',
+    'Quantity Value', 'Quantity Unit', 'Unit Price'
+]
+
+# Columns of the files exported before the quantity was parsed
+LEGACY_COLUMNS = COLUMNS[:10]
+
+# Default directory of the output files
+DEFAULT_DATA_DIR = Path(__file__).parent.parent / "data"
+
+# Default directory of the partitioned Parquet dataset
+DEFAULT_DATASET_DIR = DEFAULT_DATA_DIR / "dataset"
+
+# Columns used to partition the dataset, in directory order
+PARTITION_COLUMNS = ['Date', 'Category']
+
+# Partition of the rows without date or category (e.g. empty cells of imported CSVs), read back as nulls
+NULL_PARTITION = "__HIVE_DEFAULT_PARTITION__"
+
+# Suffix of the files of the products extracted again from the archived pages of a day
+REEXTRACT_SUFFIX = "_reextract"
+
+# Numeric ID at the end of the product URLs: /products/<slug>/<id>
+PRODUCT_ID_PATTERN = re.compile(r'/products/[^/?#]+/(\d+)')
+
+
+def product_id(url) -> str:
+    """
+    Gets the numeric ID of a product from its URL (leading zeros included).
+
+    Args:
+        url (str): URL of the product.
+
+    Returns:
+        str: ID of the product, or None if the URL is not a product URL.
+    """
+    match = PRODUCT_ID_PATTERN.search(url) if isinstance(url, str) else None
+    return match.group(1) if match else None
+
+
+def product_key(url) -> str:
+    """
+    Gets the key identifying a product across runs: the ID of its URL, or the URL itself when it has none.
+    The slug of the URL is left out, so the URLs of a product with different slugs (e.g. read from the cards
+    and from the embedded state, or after the product was renamed) have the same key.
+
+    Args:
+        url (str): URL of the product.
+
+    Returns:
+        str: Key of the product.
+    """
+    return product_id(url) or url
+
+
+def _import_pyarrow():
+    """Imports pyarrow the first time a Parquet sink is opened."""
+    global pa, pq
+    if pa is None:
+        if not PYARROW_INSTALLED:
+            raise ImportError("Parquet output requires pyarrow. Install it with 'pip install pyarrow'.")
+        import pyarrow
+        import pyarrow.parquet
+        pa, pq = pyarrow, pyarrow.parquet
+
+
+class RowSink():
+    """
+    Destination of the product rows. Rows are written as soon as each page is extracted,
+    so the memory used does not grow with the size of the category.
+
+    Attributes:
+        columns (list): Names of the columns, in the order of the values of each row.
+    """
+    def __init__(self, columns=COLUMNS):
+        self.columns = list(columns)
+
+    def write_rows(self, rows):
+        """
+        Writes a batch of rows.
+
+        Args:
+            rows (list): List of tuples with one value per column.
+        """
+        raise NotImplementedError
+
+    def flush(self):
+        """Makes the rows written so far durable."""
+
+    def close(self):
+        """Flushes the pending rows and releases the sink."""
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class CsvSink(RowSink):
+    """
+    Appends the rows to a CSV file with the same format as `pandas.DataFrame.to_csv`.
+    The file is flushed every `flush_every` rows or `flush_interval` seconds, so the rows of a crashed run are kept.
+
+    Attributes:
+        path (Path): Path of the CSV file.
+        flush_every (int): Maximum number of rows written between two flushes.
+        flush_interval (float): Maximum number of seconds between two flushes.
+    """
+    def __init__(self, path, columns=COLUMNS, flush_every=1000, flush_interval=10):
+        super().__init__(columns)
+        self.path = Path(path)
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+
+        self._file = open(self.path, 'w', newline='', encoding='utf-8')
+        self._writer = csv.writer(self._file, lineterminator=os.linesep)
+        self._writer.writerow(self.columns)
+        self._unflushed = 0
+        self._last_flush = time.monotonic()
+
+    def write_rows(self, rows):
+        self._writer.writerows(rows)
+        self._unflushed += len(rows)
+        if self._unflushed >= self.flush_every or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unflushed = 0
+        self._last_flush = time.monotonic()
+
+    def close(self):
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+
+class ParquetSink(RowSink):
+    """
+    Writes the rows to a Parquet file, one row group every `row_group_size` rows.
+    The category columns are dictionary-encoded. Unlike the CSV, the file is only readable once it is closed.
+
+    Attributes:
+        path (Path): Path of the Parquet file.
+        row_group_size (int): Number of rows buffered before writing a row group.
+    """
+    # Numeric columns, every other column is stored as a string
+    float_columns = {'Price', 'Previous Price', 'Quantity Value', 'Unit Price'}
+
+    def __init__(self, path, columns=COLUMNS, row_group_size=10000):
+        _import_pyarrow()
+        super().__init__(columns)
+        self.path = Path(path)
+        self.row_group_size = row_group_size
+
+        self.schema = pa.schema([
+            (column, pa.float64() if column in self.float_columns else pa.string()) for column in self.columns
+        ])
+        self._writer = pq.ParquetWriter(self.path, self.schema, use_dictionary=True)
+        self._buffer = []
+
+    def write_rows(self, rows):
+        self._buffer.extend(rows)
+        if len(self._buffer) >= self.row_group_size:
+            self.flush()
+
+    def flush(self):
+        if not self._buffer:
+            return
+        table = pa.Table.from_pylist(
+            [dict(zip(self.columns, row)) for row in self._buffer], schema=self.schema
+        )
+        self._writer.write_table(table)
+        self._buffer = []
+
+    def close(self):
+        if self._writer is not None:
+            self.flush()
+            self._writer.close()
+            self._writer = None
+
+
+class DatasetSink(RowSink):
+    """
+    Appends the rows to a Parquet dataset partitioned by date and category, with the Hive layout
+    `{dataset_dir}/Date={date}/Category={category}/part-{name}.parquet`.
+    Every run adds new files and never rewrites the existing ones, so the whole history can be read
+    as one dataset (see `history.load_history`) without merging it. The partition columns are stored
+    in the directory names, not in the files.
+
+    The files are written with a hidden name (starting with a dot), which dataset readers ignore,
+    and renamed when the sink is closed, so a crashed run never leaves a truncated file in the dataset.
+
+    Attributes:
+        dataset_dir (Path): Root directory of the dataset.
+        name (str): Name of the files written by the sink (e.g. "Frescos_20241104_120000").
+        row_group_size (int): Number of rows buffered before writing a row group.
+    """
+    def __init__(self, dataset_dir, name, columns=COLUMNS, row_group_size=10000):
+        _import_pyarrow()
+        super().__init__(columns)
+        self.dataset_dir = Path(dataset_dir)
+        self.name = name
+        self.row_group_size = row_group_size
+
+        self._partition_indexes = [self.columns.index(column) for column in PARTITION_COLUMNS]
+        self._file_columns = [column for column in self.columns if column not in PARTITION_COLUMNS]
+        self._file_indexes = [self.columns.index(column) for column in self._file_columns]
+        self.schema = pa.schema([
+            (column, pa.float64() if column in ParquetSink.float_columns else pa.string())
+            for column in self._file_columns
+        ])
+        # Open writer of every partition: (temporary path, final path, writer)
+        self._writers = {}
+        self._buffer = []
+
+    @staticmethod
+    def partition_value(value) -> str:
+        """Value of a partition column in the directory names: the missing values (None, NaN or "") are NULL_PARTITION."""
+        if value is None or value != value or value == '':
+            return NULL_PARTITION
+        return str(value)
+
+    def partition_dir(self, partition) -> Path:
+        """Builds the directory of a (date, category) partition."""
+        path = self.dataset_dir
+        for column, value in zip(PARTITION_COLUMNS, partition):
+            path = path / f"{column}={value}"
+        return path
+
+    def write_rows(self, rows):
+        self._buffer.extend(rows)
+        if len(self._buffer) >= self.row_group_size:
+            self.flush()
+
+    def flush(self):
+        if not self._buffer:
+            return
+        partitions = {}
+        for row in self._buffer:
+            partitions.setdefault(tuple(self.partition_value(row[i]) for i in self._partition_indexes), []).append(row)
+
+        for partition, rows in partitions.items():
+            if partition not in self._writers:
+                directory = self.partition_dir(partition)
+                directory.mkdir(parents=True, exist_ok=True)
+                tmp_path = directory / f".part-{self.name}.parquet"
+                path = directory / f"part-{self.name}.parquet"
+                self._writers[partition] = (tmp_path, path, pq.ParquetWriter(tmp_path, self.schema, use_dictionary=True))
+            table = pa.Table.from_arrays(
+                # NaN values (e.g. empty cells of imported CSVs) are stored as nulls
+                [pa.array([row[i] for row in rows], type=self.schema.field(column).type, from_pandas=True)
+                 for i, column in zip(self._file_indexes, self._file_columns)],
+                schema=self.schema
+            )
+            self._writers[partition][2].write_table(table)
+        self._buffer = []
+
+    def close(self):
+        self.flush()
+        for tmp_path, path, writer in self._writers.values():
+            writer.close()
+            tmp_path.replace(path)
+        self._writers = {}
+
+
+class DataFrameSink(RowSink):
+    """
+    Keeps the rows in memory to build a DataFrame at the end.
+    """
+    def __init__(self, columns=COLUMNS):
+        super().__init__(columns)
+        self._rows = []
+
+    def write_rows(self, rows):
+        self._rows.extend(rows)
+
+    def to_dataframe(self):
+        """
+        Builds a DataFrame with all the rows written.
+
+        Returns:
+            pd.DataFrame: The product information.
+        """
+        import pandas as pd
+        return pd.DataFrame(self._rows, columns=self.columns)
+
+
+class MultiSink(RowSink):
+    """
+    Writes the rows to several sinks at once.
+
+    Attributes:
+        sinks (list): List of RowSink.
+    """
+    def __init__(self, sinks):
+        super().__init__(sinks[0].columns if sinks else COLUMNS)
+        self.sinks = list(sinks)
+
+    def write_rows(self, rows):
+        for sink in self.sinks:
+            sink.write_rows(rows)
+
+    def flush(self):
+        for sink in self.sinks:
+            sink.flush()
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+
+def output_path(category, suffix="", extension="csv", data_dir=DEFAULT_DATA_DIR, timestamp=None) -> Path:
+    """
+    Builds the path of an output file based on the category and the timestamp.
+    Example: Frescos_20210901_120000.csv
+
+    Args:
+        category (str): Normalized name of the category.
+        suffix (str): Suffix added to the category (e.g. "_delta").
+        extension (str): Extension of the file.
+        data_dir (str | Path): Directory of the output files.
+        timestamp (str): Timestamp with the format YYYYmmdd_HHMMSS. If None, uses the current time.
+
+    Returns:
+        Path: Path of the output file.
+    """
+    timestamp = timestamp if timestamp else time.strftime("%Y%m%d_%H%M%S")
+    return Path(data_dir) / f"{category}{suffix}_{timestamp}.{extension}"
+
+
+def snapshot_files(data_dir=DEFAULT_DATA_DIR) -> list:
+    """
+    Lists the CSV snapshots of a directory, in the order they are merged.
+    Previous merges (bonpreu_products_*) and the derived files of a run (*_delta_*, *_details_*) are not snapshots.
+    The re-extractions (*_reextract_*) come first, the most recent one first, so their rows take priority
+    over the rows of the crawl they correct: the readers keep the first row of every product and day.
+
+    Args:
+        data_dir (str | Path): Directory of the exported CSV files.
+
+    Returns:
+        list: Names of the files.
+    """
+    files = sorted(f for f in os.listdir(data_dir)
+                   if f.endswith('.csv') and not f.startswith('bonpreu_products_')
+                   and '_delta_' not in f and '_details_' not in f)
+    return [f for f in reversed(files) if REEXTRACT_SUFFIX in f] + [f for f in files if REEXTRACT_SUFFIX not in f]
+
+
+def open_sinks(category, formats=("csv",), suffix="", columns=COLUMNS, data_dir=DEFAULT_DATA_DIR, timestamp=None) -> RowSink:
+    """
+    Opens one file sink per output format, sharing the same filename.
+    The "dataset" format appends to the partitioned dataset `{data_dir}/dataset{suffix}` instead,
+    and the "sqlite" format to the price store `{data_dir}/prices.sqlite` (only the product rows, without suffix
+    or re-extracted, which replace the prices of their day).
+
+    Args:
+        category (str): Normalized name of the category.
+        formats (tuple): Output formats ("csv", "parquet", "dataset" and/or "sqlite").
+        suffix (str): Suffix added to the category in the filename.
+        columns (list): Names of the columns.
+        data_dir (str | Path): Directory of the output files.
+        timestamp (str): Timestamp of the filename. If None, uses the current time.
+
+    Returns:
+        RowSink: Sink writing to all the files.
+
+    Raises:
+        ValueError: If none of the formats can be written with the suffix.
+    """
+    timestamp = timestamp if timestamp else time.strftime("%Y%m%d_%H%M%S")
+    sink_classes = {'csv': CsvSink, 'parquet': ParquetSink}
+    sinks = []
+    for output_format in formats:
+        if output_format == 'sqlite':
+            if suffix not in ("", REEXTRACT_SUFFIX):
+                # The price store only keeps the product rows, not the deltas
+                continue
+            from price_store import PriceStore, PriceStoreSink
+            path = Path(data_dir) / "prices.sqlite"
+            sinks.append(PriceStoreSink(PriceStore(path), columns=columns, close_store=True))
+            logger.info(f"Writing product information to the {path} price store.")
+            continue
+        if output_format == 'dataset':
+            dataset_dir = Path(data_dir) / f"dataset{suffix}"
+            sinks.append(DatasetSink(dataset_dir, f"{category}_{timestamp}", columns=columns))
+            logger.info(f"Appending product information to the {dataset_dir} dataset.")
+            continue
+        path = output_path(category, suffix, output_format, data_dir, timestamp)
+        sinks.append(sink_classes[output_format](path, columns=columns))
+        logger.info(f"Writing product information to {path}.")
+    if not sinks:
+        # Otherwise the rows would be silently dropped
+        raise ValueError(f"The {', '.join(formats)} output formats can not be written with the '{suffix}' suffix.")
+    return sinks[0] if len(sinks) == 1 else MultiSink(sinks)
@@ -0,0 +1,292 @@
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlparse
+
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS jobs (
+        job TEXT PRIMARY KEY,
+        category TEXT NOT NULL,
+        settings TEXT NOT NULL,
+        created_at REAL NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS tasks (
+        job TEXT NOT NULL REFERENCES jobs (job),
+        idx INTEGER NOT NULL,
+        url TEXT NOT NULL,
+        structure TEXT NOT NULL,
+        state TEXT NOT NULL DEFAULT 'pending',
+        worker TEXT,
+        lease_until REAL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        error TEXT,
+        PRIMARY KEY (job, idx)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS tasks_state ON tasks (state, lease_until);
+"""
+
+# States of a task
+PENDING, LEASED, DONE, FAILED = 'pending', 'leased', 'done', 'failed'
+
+
+class Task():
+    """
+    Leaf page to crawl, leased by a worker.
+
+    Attributes:
+        job (str): Identifier of the job (one category of a distributed run).
+        index (int): Index of the page in the leaves of the category, i.e. its position in the output.
+        url (str): URL of the page.
+        structure (list): Category, subcategories and URL of the page.
+        attempts (int): Number of times the task was leased, this one included.
+    """
+    def __init__(self, job, index, url, structure, attempts):
+        self.job = job
+        self.index = index
+        self.url = url
+        self.structure = structure
+        self.attempts = attempts
+
+
+class WorkQueue():
+    """
+    Queue of the leaf pages of a distributed crawl, shared by the coordinator and the workers.
+
+    Workers lease tasks for a limited time. A task whose lease expires before it is completed
+    (e.g. because its worker crashed) is leased again by another worker, up to `max_attempts` times.
+    Backends implement the methods below; `open_queue` picks one from the scheme of the location.
+
+    Attributes:
+        max_attempts (int): Number of leases of a task before it is marked as failed.
+    """
+    def __init__(self, max_attempts=3):
+        self.max_attempts = max_attempts
+
+    def add_job(self, job, category, settings, leaves):
+        """
+        Adds the leaf pages of a category.
+
+        Args:
+            job (str): Identifier of the job.
+            category (str): Name of the category.
+            settings (dict): Settings needed to merge the outputs (output formats, timestamp...).
+            leaves (list): Category, subcategories and URL of every leaf page, in output order.
+        """
+        raise NotImplementedError
+
+    def lease(self, worker, limit, lease_seconds) -> list:
+        """
+        Leases pending tasks, or tasks whose lease expired.
+
+        Args:
+            worker (str): Identifier of the worker.
+            limit (int): Maximum number of tasks leased.
+            lease_seconds (float): Duration of the lease.
+
+        Returns:
+            list: Leased tasks, empty if there is nothing to do right now.
+        """
+        raise NotImplementedError
+
+    def renew(self, tasks, worker, lease_seconds):
+        """Extends the lease of tasks still held by the worker."""
+        raise NotImplementedError
+
+    def complete(self, task, worker) -> bool:
+        """
+        Marks a task as done.
+
+        Returns:
+            bool: False if the worker lost the lease (the task was given to another worker).
+        """
+        raise NotImplementedError
+
+    def fail(self, task, worker, reason) -> bool:
+        """
+        Gives a task back after a failure. It is leased again unless it reached `max_attempts`.
+
+        Returns:
+            bool: False if the worker lost the lease.
+        """
+        raise NotImplementedError
+
+    def jobs(self) -> dict:
+        """
+        Gets the jobs of the queue.
+
+        Returns:
+            dict: Dict mapping every job to its (category, settings) tuple.
+        """
+        raise NotImplementedError
+
+    def progress(self, job=None) -> dict:
+        """
+        Counts the tasks of every state.
+
+        Args:
+            job (str): Job to count. If None, counts all the jobs.
+
+        Returns:
+            dict: Dict mapping every state ("pending", "leased", "done" and "failed") to its number of tasks.
+        """
+        raise NotImplementedError
+
+    def owners(self, job) -> dict:
+        """
+        Gets the worker that completed every done task of a job.
+
+        Returns:
+            dict: Dict mapping the index of every done task to its worker.
+        """
+        raise NotImplementedError
+
+    def failures(self, job) -> list:
+        """
+        Gets the failed tasks of a job.
+
+        Returns:
+            list: List of (URL, error) tuples.
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """Releases the queue."""
+
+
+class SqliteWorkQueue(WorkQueue):
+    """
+    Work queue stored in a SQLite database, shared by the processes of a machine (or of machines sharing a
+    file system with working locks). Leases are taken in IMMEDIATE transactions, so two workers never get the same task.
+
+    Attributes:
+        path (Path): Path of the SQLite database.
+    """
+    def __init__(self, path, max_attempts=3):
+        super().__init__(max_attempts)
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        # Transactions are managed explicitly, and other processes may hold the write lock for a while
+        self._db = sqlite3.connect(self.path, timeout=60, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode = WAL")
+        self._db.execute("PRAGMA synchronous = NORMAL")
+        with self._lock:
+            self._db.executescript(SCHEMA)
+
+    def _write(self, statements):
+        """Runs a function with the cursor in a write transaction."""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                result = statements(self._db)
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+            return result
+
+    def add_job(self, job, category, settings, leaves):
+        def add(db):
+            db.execute("INSERT INTO jobs (job, category, settings, created_at) VALUES (?, ?, ?, ?)",
+                       (job, category, json.dumps(settings), time.time()))
+            db.executemany("INSERT INTO tasks (job, idx, url, structure) VALUES (?, ?, ?, ?)",
+                           [(job, i, leaf[-1], json.dumps(leaf, ensure_ascii=False)) for i, leaf in enumerate(leaves)])
+        self._write(add)
+
+    def lease(self, worker, limit, lease_seconds) -> list:
+        def lease(db):
+            now = time.time()
+            # Expired leases of tasks that used all their attempts are not retried
+            db.execute(
+                "UPDATE tasks SET state = ?, error = 'lease expired' WHERE state = ? AND lease_until < ? AND attempts >= ?",
+                (FAILED, LEASED, now, self.max_attempts)
+            )
+            rows = db.execute(
+                "SELECT job, idx, url, structure, attempts FROM tasks "
+                "WHERE state = ? OR (state = ? AND lease_until < ?) ORDER BY job, idx LIMIT ?",
+                (PENDING, LEASED, now, limit)
+            ).fetchall()
+            db.executemany(
+                "UPDATE tasks SET state = ?, worker = ?, lease_until = ?, attempts = attempts + 1 WHERE job = ? AND idx = ?",
+                [(LEASED, worker, now + lease_seconds, job, index) for job, index, _, _, _ in rows]
+            )
+            return [Task(job, index, url, json.loads(structure), attempts + 1)
+                    for job, index, url, structure, attempts in rows]
+        return self._write(lease)
+
+    def renew(self, tasks, worker, lease_seconds):
+        if not tasks:
+            return
+        lease_until = time.time() + lease_seconds
+        self._write(lambda db: db.executemany(
+            "UPDATE tasks SET lease_until = ? WHERE job = ? AND idx = ? AND state = ? AND worker = ?",
+            [(lease_until, task.job, task.index, LEASED, worker) for task in tasks]
+        ))
+
+    def complete(self, task, worker) -> bool:
+        return self._write(lambda db: db.execute(
+            "UPDATE tasks SET state = ?, lease_until = NULL, error = NULL WHERE job = ? AND idx = ? AND state = ? AND worker = ?",
+            (DONE, task.job, task.index, LEASED, worker)
+        ).rowcount) == 1
+
+    def fail(self, task, worker, reason) -> bool:
+        return self._write(lambda db: db.execute(
+            "UPDATE tasks SET state = CASE WHEN attempts >= ? THEN ? ELSE ? END, lease_until = NULL, error = ? "
+            "WHERE job = ? AND idx = ? AND state = ? AND worker = ?",
+            (self.max_attempts, FAILED, PENDING, reason, task.job, task.index, LEASED, worker)
+        ).rowcount) == 1
+
+    def jobs(self) -> dict:
+        with self._lock:
+            rows = self._db.execute("SELECT job, category, settings FROM jobs ORDER BY created_at, job").fetchall()
+        return {job: (category, json.loads(settings)) for job, category, settings in rows}
+
+    def progress(self, job=None) -> dict:
+        query = "SELECT state, COUNT(*) FROM tasks" + (" WHERE job = ?" if job else "") + " GROUP BY state"
+        with self._lock:
+            counts = dict(self._db.execute(query, (job,) if job else ()).fetchall())
+        return {state: counts.get(state, 0) for state in (PENDING, LEASED, DONE, FAILED)}
+
+    def owners(self, job) -> dict:
+        with self._lock:
+            return dict(self._db.execute("SELECT idx, worker FROM tasks WHERE job = ? AND state = ?", (job, DONE)))
+
+    def failures(self, job) -> list:
+        with self._lock:
+            return self._db.execute("SELECT url, error FROM tasks WHERE job = ? AND state = ? ORDER BY idx",
+                                    (job, FAILED)).fetchall()
+
+    def close(self):
+        self._db.close()
+
+
+# Work queue backends by scheme of the location. Other backends (e.g. Redis) can be registered here.
+QUEUE_BACKENDS = {'sqlite': SqliteWorkQueue}
+
+
+def open_queue(location, max_attempts=3) -> WorkQueue:
+    """
+    Opens a work queue.
+
+    Args:
+        location (str | Path): Path of a SQLite database, or URL whose scheme selects the backend (e.g. sqlite:///data/queue.sqlite).
+        max_attempts (int): Number of leases of a task before it is marked as failed.
+
+    Returns:
+        WorkQueue: The work queue.
+
+    Raises:
+        ValueError: If there is no backend for the scheme of the location.
+    """
+    location = str(location)
+    scheme = urlparse(location).scheme if '://' in location else 'sqlite'
+    if scheme not in QUEUE_BACKENDS:
+        raise ValueError(f"Unknown work queue backend '{scheme}'. Available: {', '.join(QUEUE_BACKENDS)}.")
+    if scheme == 'sqlite' and '://' in location:
+        location = location.split('://', 1)[1]
+        # sqlite:///relative/path and sqlite:////absolute/path, like SQLAlchemy
+        location = location[1:] if location.startswith('/') else location
+    return QUEUE_BACKENDS[scheme](location, max_attempts=max_attempts)
@@ -0,0 +1,93 @@
+import unittest
+import os
+import sys
+import tempfile
+# Add the source directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+import pandas as pd
+from sinks import COLUMNS, LEGACY_COLUMNS
+from analytics import SnapshotCache, PriceHistory
+
+PRODUCTS = {
+    'poma': ("Frescos", "Fruita", "https://x/products/poma/0001"),
+    'pera': ("Frescos", "Fruita", "https://x/products/pera/0002"),
+    'ceba': ("Frescos", "Verdura", "https://x/products/ceba/0003"),
+    'kiwi': ("Frescos", "Fruita", "https://x/products/kiwi/0005"),
+    'aigua': ("Begudes", "Aigua", "https://x/products/aigua/0004"),
+}
+
+
+def write_snapshot(data_dir, category, date, prices, columns=COLUMNS):
+    rows = []
+    for name, price in prices.items():
+        product_category, subcategory, url = PRODUCTS[name]
+        rows.append([product_category, subcategory, None, None, None, name.capitalize(), date, price, "1 kg", url,
+                     1, "kg", price][:len(columns)])
+    path = os.path.join(data_dir, f"{category}_{date}_120000.csv")
+    pd.DataFrame(rows, columns=columns).to_csv(path, index=False)
+    return path
+
+
+class TestAnalytics(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.data_dir = self.tmp_dir.name
+        write_snapshot(self.data_dir, "Frescos", "20240101", {'poma': 2.0, 'pera': 1.0, 'ceba': 1.5})
+        write_snapshot(self.data_dir, "Begudes", "20240101", {'aigua': 0.5}, columns=LEGACY_COLUMNS)
+        # Begudes was not crawled on the second day
+        write_snapshot(self.data_dir, "Frescos", "20240102", {'poma': 2.2, 'pera': 1.0, 'kiwi': 3.0})
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_reports(self):
+        history = PriceHistory.load(self.data_dir)
+        self.assertEqual(history.dates, ["20240101", "20240102"])
+        self.assertEqual(history.prices.shape, (2, 5))
+
+        changes = history.price_changes()
+        self.assertEqual(changes.index.tolist(), ["0001"])
+        self.assertAlmostEqual(changes['Change (%)'].iloc[0], 10, places=4)
+        self.assertEqual(history.new_products().index.tolist(), ["0005"])
+        # The products of the categories not crawled are not delisted
+        self.assertEqual(history.delisted_products().index.tolist(), ["0003"])
+        self.assertEqual(history.delisted_products("20240102", "20240101")['Product Name'].tolist(), ["Ceba"])
+
+        index = history.category_index()
+        self.assertAlmostEqual(index.loc["20240102", "Frescos"], 100 * 1.1 ** 0.5, places=3)
+        self.assertAlmostEqual(index.loc["20240102", "Begudes"], 100)
+        with self.assertRaises(ValueError):
+            history.price_changes("20240101")
+
+        history = PriceHistory.load(self.data_dir, categories=["Begudes"])
+        self.assertEqual(history.products.index.tolist(), ["0004"])
+        self.assertEqual(list(history.category_index().columns), ["Begudes", "All"])
+
+    def test_promotions(self):
+        for day in range(3, 7):
+            write_snapshot(self.data_dir, "Frescos", f"2024010{day}", {'poma': 2.0 if day < 6 else 1.5, 'pera': 1.0})
+        promotions = PriceHistory.load(self.data_dir).promotions(window=4, min_discount=0.2)
+        self.assertEqual(promotions.index.tolist(), ["0001"])
+        self.assertAlmostEqual(promotions['Regular Price'].iloc[0], 2.0)
+        self.assertAlmostEqual(promotions['Discount (%)'].iloc[0], 25)
+
+    def test_cache_is_incremental(self):
+        cache = SnapshotCache(self.data_dir)
+        self.assertEqual(cache.update(), ["20240101", "20240102"])
+        self.assertEqual(cache.update(), [])
+
+        path = write_snapshot(self.data_dir, "Frescos", "20240103", {'poma': 2.4, 'pera': 1.0})
+        cache = SnapshotCache(self.data_dir)
+        self.assertEqual(cache.update(), ["20240103"])
+        self.assertEqual(cache.products.loc["0001", "Last Date"], "20240103")
+
+        os.remove(path)
+        self.assertEqual(cache.update(), ["20240103"])
+        frame = cache.load()
+        self.assertEqual(list(frame['Date'].cat.categories), ["20240101", "20240102"])
+        self.assertEqual(len(frame), 7)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import unittest
+from unittest.mock import MagicMock
+import os
+import sys
+# Add the source directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+from driver_pool import DriverPool
+
+def make_fake_driver():
+    """Driver whose page keeps loading product cards for a few polls."""
+    driver = MagicMock()
+    driver.page_source = "<html></html>"
+    driver.cards = 0
+    def execute_script(script):
+        if "product-card-container" in script:
+            driver.cards = min(driver.cards + 10, 30)
+            return [driver.cards, driver.cards]
+    driver.execute_script.side_effect = execute_script
+    return driver
+
+class TestDriverPool(unittest.TestCase):
+
+    def setUp(self):
+        self.drivers = []
+        def factory():
+            driver = make_fake_driver()
+            self.drivers.append(driver)
+            return driver
+        self.pool = DriverPool("https://www.compraonline.bonpreuesclat.cat", size=1, max_pages=2,
+                               idle_time=0.05, poll_interval=0.01, cookie_timeout=0,
+                               driver_factory=factory)
+
+    def test_reuses_warm_driver(self):
+        self.assertEqual(self.pool.fetch("https://www.compraonline.bonpreuesclat.cat/a"), "<html></html>")
+        self.pool.fetch("https://www.compraonline.bonpreuesclat.cat/b")
+        self.assertEqual(len(self.drivers), 1)
+        # The cookies are accepted on the base URL only once
+        self.assertEqual(self.drivers[0].get.call_args_list[0].args[0],
+                         "https://www.compraonline.bonpreuesclat.cat")
+
+    def test_recycles_driver_after_max_pages(self):
+        for page in range(3):
+            self.pool.fetch(f"https://www.compraonline.bonpreuesclat.cat/{page}")
+        self.assertEqual(len(self.drivers), 2)
+        self.drivers[0].quit.assert_called_once()
+
+    def test_replaces_crashed_driver(self):
+        with self.assertRaises(RuntimeError):
+            with self.pool.driver():
+                raise RuntimeError("chrome not reachable")
+        self.pool.fetch("https://www.compraonline.bonpreuesclat.cat/a")
+        self.assertEqual(len(self.drivers), 2)
+        self.drivers[0].quit.assert_called_once()
+
+    def test_quits_driver_failing_to_start(self):
+        driver = make_fake_driver()
+        driver.get.side_effect = RuntimeError("net::ERR_CONNECTION_REFUSED")
+        self.pool._driver_factory = lambda: driver
+        with self.assertRaises(RuntimeError):
+            self.pool.fetch("https://www.compraonline.bonpreuesclat.cat/a")
+        driver.quit.assert_called_once()
+
+    def test_waits_until_cards_stop_loading(self):
+        self.pool.fetch("https://www.compraonline.bonpreuesclat.cat/a")
+        self.assertEqual(self.drivers[0].cards, 30)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import unittest
+import os
+import sys
+# Add the source directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+from embedded_state import extract_state, extract_products_from_state, state_fingerprint
+from parsers import extract_products
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+BASE_URL = "https://www.compraonline.bonpreuesclat.cat"
+
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name), encoding='utf-8') as f:
+        return f.read()
+
+
+class TestEmbeddedState(unittest.TestCase):
+
+    def setUp(self):
+        self.html = read_fixture('subcategory_page_state.html')
+
+    def test_extract_state(self):
+        state = extract_state(self.html)
+        self.assertEqual(state['session'], {'csrf': '4f1c2d9e'})
+        self.assertIsNone(extract_state(read_fixture('subcategory_page.html')))
+        self.assertIsNone(extract_state('<script>window.__INITIAL_STATE__={"broken": </script>'))
+
+    def test_state_includes_lazily_loaded_products(self):
+        products = extract_products_from_state(self.html, BASE_URL)
+        self.assertEqual([product[0] for product in products],
+                         ["Poma Golden", "Plàtan de Canàries", "Taronja de taula", "Kiwi verd"])
+        # The products of the state match the server-rendered cards
+        self.assertEqual(products[:2], extract_products(self.html, BASE_URL, data_source="html"))
+        self.assertEqual(products[3], ("Kiwi verd", 4.25, "500g", BASE_URL + "/products/kiwi-verd/1011"))
+
+    def test_url_of_the_entity(self):
+        html = self.html.replace('"name":"Poma Golden",', '"name":"Poma Golden","url":"/products/poma-golden-granel/123",')
+        html = html.replace('"name":"Kiwi verd",', '"name":"Kiwi verd","slug":"kiwi-verd-zespri",')
+        products = extract_products_from_state(html, BASE_URL)
+        self.assertEqual(products[0][3], BASE_URL + "/products/poma-golden-granel/123")
+        self.assertEqual(products[3][3], BASE_URL + "/products/kiwi-verd-zespri/1011")
+
+    def test_fallback_to_cards(self):
+        html = read_fixture('subcategory_page.html')
+        self.assertIsNone(extract_products_from_state(html, BASE_URL))
+        self.assertEqual(extract_products(html, BASE_URL, data_source="state"),
+                         extract_products(html, BASE_URL, data_source="html"))
+
+    def test_fingerprint_ignores_session_data(self):
+        changed_session = self.html.replace('4f1c2d9e', '0a9b8c7d')
+        self.assertEqual(state_fingerprint(changed_session), state_fingerprint(self.html))
+        changed_price = self.html.replace('"4.25"', '"4.50"')
+        self.assertNotEqual(state_fingerprint(changed_price), state_fingerprint(self.html))
+
+
+if __name__ == '__main__':
+    unittest.main()
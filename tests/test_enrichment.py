@@ -0,0 +1,120 @@
+import unittest
+import os
+import sys
+import tempfile
+import time
+# Add the source directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+import pandas as pd
+from http_session import FetchError
+from enrichment import JSON_LD_PATTERN, product_id, extract_details, MembershipIndex, DetailsStore, Enricher
+
+FIXTURE_PATH = os.path.join(os.path.dirname(__file__), 'fixtures', 'product_page.html')
+BASE_URL = "https://www.compraonline.bonpreuesclat.cat"
+
+
+def row(path, url):
+    return (*path, "Product", "20240101", 1.0, "1kg", url, 1.0, "kg", 1.0)
+
+
+class TestExtractDetails(unittest.TestCase):
+
+    def setUp(self):
+        with open(FIXTURE_PATH, encoding='utf-8') as f:
+            self.html = f.read()
+
+    def test_product_id(self):
+        self.assertEqual(product_id(f"{BASE_URL}/products/la-masia-oli-d-oliva-suau/09899"), "09899")
+        self.assertIsNone(product_id(f"{BASE_URL}/categories/frescos"))
+        self.assertIsNone(product_id(None))
+
+    def test_structured_data_and_state(self):
+        self.assertEqual(extract_details(self.html, "123"),
+                         {'ean': '8410000123456', 'brand': 'Bonpreu', 'unit_price': 2.35, 'unit': 'kg'})
+
+    def test_state_of_other_products_ignored(self):
+        # Without structured data, the details come from the entity of the product, not from the related ones
+        html = JSON_LD_PATTERN.sub('', self.html)
+        self.assertEqual(extract_details(html, "123"),
+                         {'ean': '8410000123456', 'brand': 'Bonpreu', 'unit_price': 2.35, 'unit': 'kg'})
+        self.assertEqual(extract_details(html, "456"),
+                         {'ean': '8410000654321', 'brand': 'Esclat', 'unit_price': 1.99, 'unit': 'L'})
+        self.assertEqual(extract_details(html, "789"), {'ean': None, 'brand': None, 'unit_price': 2.35, 'unit': 'kg'})
+
+    def test_text_fallback(self):
+        html = '<html><body><span>4,70&nbsp;€/kg</span></body></html>'
+        self.assertEqual(extract_details(html, "1"), {'ean': None, 'brand': None, 'unit_price': 4.7, 'unit': 'kg'})
+
+
+class TestMembershipIndex(unittest.TestCase):
+
+    def test_products_listed_under_several_paths(self):
+        index = MembershipIndex()
+        index.add("1", "/products/a/1", ("Frescos", "Fruita", None, None, None))
+        index.add("1", "/products/a/1", ("Frescos", "De temporada", None, None, None))
+        index.add("1", "/products/a/1", ("Frescos", "Fruita", None, None, None))
+        index.add("2", "/products/b/2", ("Begudes", "Aigua", None, None, None))
+        self.assertEqual(len(index), 2)
+        self.assertEqual(len(index.paths("1")), 2)
+        self.assertEqual(index.products("Frescos"), ["1"])
+        self.assertEqual(index.products(), ["1", "2"])
+
+
+class TestEnricher(unittest.TestCase):
+
+    def test_fetches_every_product_once(self):
+        with open(FIXTURE_PATH, encoding='utf-8') as f:
+            html = f.read()
+        fetched = []
+
+        def fetch(url):
+            fetched.append(url)
+            if url.endswith("/3"):
+                raise FetchError(url, "HTTP 404")
+            if url.endswith("/4"):
+                return html.replace('"123"', '"4"').replace('"2.35", "currency"', '"N/A", "currency"')
+            return html
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            enricher = Enricher(DetailsStore(os.path.join(tmp_dir, "details.sqlite")), ttl=3600, max_workers=2)
+            enricher.add_rows([
+                row(("Frescos", "Fruita", None, None, None), f"{BASE_URL}/products/a/1"),
+                row(("Frescos", "De temporada", None, None, None), f"{BASE_URL}/products/a/1"),
+                row(("Frescos", "Fruita", None, None, None), f"{BASE_URL}/products/b/2"),
+                row(("Frescos", "Fruita", None, None, None), f"{BASE_URL}/products/c/3"),
+                # Page with an unparsable price
+                row(("Frescos", "Fruita", None, None, None), f"{BASE_URL}/products/d/4"),
+            ])
+            n_products = enricher.write_details("Frescos", "Frescos", fetch, data_dir=tmp_dir, timestamp="20240101_000000")
+            self.assertEqual(n_products, 4)
+            self.assertEqual(sorted(fetched), [f"{BASE_URL}/products/a/1", f"{BASE_URL}/products/b/2",
+                                               f"{BASE_URL}/products/c/3", f"{BASE_URL}/products/d/4"])
+
+            details = pd.read_csv(os.path.join(tmp_dir, "Frescos_details_20240101_000000.csv"), dtype={'EAN': str})
+            self.assertEqual(list(details['Product ID']), [1, 2, 3, 4])
+            self.assertEqual(list(details['Subcategory Paths']), [2, 1, 1, 1])
+            self.assertEqual(details['EAN'][0], "8410000123456")
+            self.assertTrue(pd.isna(details['EAN'][2]))
+            self.assertTrue(pd.isna(details['EAN'][3]))
+
+            # A new run reuses the details fetched within the TTL, and retries the failed page
+            fetched.clear()
+            enricher = Enricher(enricher.store, ttl=3600)
+            enricher.add_rows([row(("Frescos", "Fruita", None, None, None), f"{BASE_URL}/products/a/1"),
+                               row(("Frescos", "Fruita", None, None, None), f"{BASE_URL}/products/c/3")])
+            details = enricher.enrich(["1", "3"], fetch)
+            self.assertEqual(fetched, [f"{BASE_URL}/products/c/3"])
+            self.assertEqual(details["1"]['brand'], "Bonpreu")
+
+            # Expired details are fetched again
+            fetched.clear()
+            time.sleep(0.05)
+            enricher = Enricher(enricher.store, ttl=0.01)
+            enricher.add_rows([row(("Frescos", "Fruita", None, None, None), f"{BASE_URL}/products/a/1")])
+            enricher.enrich(["1"], fetch)
+            self.assertEqual(fetched, [f"{BASE_URL}/products/a/1"])
+            enricher.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import unittest
+import os
+import sys
+import tempfile
+# Add the source directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+import pandas as pd
+from sinks import COLUMNS, DatasetSink, PYARROW_INSTALLED
+from history import csv_to_dataset, history_dates, load_history
+
+ROWS = [
+    ("Frescos", "Fruita", None, None, None, "Poma", "20241104", 2.35, "1kg", "https://x/products/poma/1", 1.0, "kg", 2.35),
+    ("Begudes", "Aigua", None, None, None, "Aigua", "20241104", 0.5, "1,5L", "https://x/products/aigua/2", 1.5, "L", 0.33),
+    ("Frescos", "Fruita", None, None, None, "Poma", "20241105", 2.45, "1kg", "https://x/products/poma/1", 1.0, "kg", 2.45),
+]
+
+
+@unittest.skipIf(not PYARROW_INSTALLED, "pyarrow is not installed")
+class TestHistory(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.dataset_dir = os.path.join(self.tmp_dir.name, "dataset")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_dataset_layout(self):
+        with DatasetSink(self.dataset_dir, "run1") as sink:
+            sink.write_rows(ROWS)
+            # Files being written are hidden from the readers
+            sink.flush()
+            self.assertEqual(len(load_history(self.dataset_dir)), 0)
+        self.assertTrue(os.path.exists(os.path.join(self.dataset_dir, "Date=20241104", "Category=Frescos",
+                                                    "part-run1.parquet")))
+        self.assertEqual(history_dates(self.dataset_dir), ["20241104", "20241105"])
+
+    def test_load_history_filters(self):
+        with DatasetSink(self.dataset_dir, "run1") as sink:
+            sink.write_rows(ROWS[:2])
+        # A later run appends new files
+        with DatasetSink(self.dataset_dir, "run2") as sink:
+            sink.write_rows(ROWS[2:])
+
+        df = load_history(self.dataset_dir)
+        self.assertEqual(list(df.columns), COLUMNS)
+        self.assertEqual(len(df), 3)
+
+        df = load_history(self.dataset_dir, categories=["Frescos"], start_date="20241105")
+        self.assertEqual(df["Price"].tolist(), [2.45])
+        self.assertEqual(df["Date"].tolist(), ["20241105"])
+
+        df = load_history(self.dataset_dir, end_date="20241104", columns=["URL", "Price"])
+        self.assertEqual(list(df.columns), ["URL", "Price"])
+        self.assertEqual(sorted(df["Price"].tolist()), [0.5, 2.35])
+
+    def test_csv_to_dataset(self):
+        csv_path = os.path.join(self.tmp_dir.name, "Frescos_20241104_120000.csv")
+        # CSV exported before the quantity was parsed
+        pd.DataFrame(ROWS, columns=COLUMNS)[COLUMNS[:10]].to_csv(csv_path, index=False)
+        csv_to_dataset([csv_path], self.dataset_dir, chunksize=2)
+
+        df = load_history(self.dataset_dir).sort_values(["Date", "Category"], ignore_index=True)
+        expected = pd.DataFrame(ROWS, columns=COLUMNS).sort_values(["Date", "Category"], ignore_index=True)
+        self.assertEqual(df["Product Name"].tolist(), expected["Product Name"].tolist())
+        self.assertEqual(df["Unit Price"].tolist(), expected["Unit Price"].tolist())
+        self.assertTrue(pd.isna(df["Subcategory_2"].iloc[0]))
+
+    def test_csv_rows_without_category(self):
+        csv_path = os.path.join(self.tmp_dir.name, "Frescos_20241104_120000.csv")
+        rows = [ROWS[0], (None,) + ROWS[1][1:]]
+        pd.DataFrame(rows, columns=COLUMNS).to_csv(csv_path, index=False)
+        with self.assertLogs('history', level='INFO'):
+            csv_to_dataset([csv_path], self.dataset_dir)
+
+        self.assertEqual(sorted(os.listdir(os.path.join(self.dataset_dir, "Date=20241104"))),
+                         ["Category=Frescos", "Category=__HIVE_DEFAULT_PARTITION__"])
+        df = load_history(self.dataset_dir).sort_values("Product Name", ignore_index=True)
+        self.assertEqual(df["Product Name"].tolist(), ["Aigua", "Poma"])
+        self.assertTrue(pd.isna(df["Category"].iloc[0]))
+
+
+if __name__ == '__main__':
+    unittest.main()
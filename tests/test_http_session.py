@@ -0,0 +1,73 @@
+import unittest
+from unittest.mock import patch, MagicMock
+import os
+import sys
+# Add the source directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+import requests
+from http_session import HttpSession, FetchError
+from rate_control import RateLimiter
+
+def make_response(status_code, text=""):
+    response = MagicMock()
+    response.status_code = status_code
+    response.text = text
+    response.headers = {}
+    return response
+
+@patch('http_session.time.sleep')
+class TestHttpSession(unittest.TestCase):
+
+    def setUp(self):
+        self.session = HttpSession(pool_size=4, max_retries=2)
+        self.session._session = MagicMock()
+
+    def test_retries_transient_errors(self, mock_sleep):
+        self.session._session.get.side_effect = [
+            make_response(503),
+            requests.Timeout(),
+            make_response(200, "<html></html>"),
+        ]
+        response = self.session.get("https://www.compraonline.bonpreuesclat.cat")
+        self.assertEqual(response.text, "<html></html>")
+        self.assertEqual(self.session._session.get.call_count, 3)
+        self.assertEqual(mock_sleep.call_count, 2)
+
+    def test_raises_fetch_error_after_retries(self, mock_sleep):
+        self.session._session.get.return_value = make_response(429)
+        with self.assertRaises(FetchError) as context:
+            self.session.get("https://www.compraonline.bonpreuesclat.cat")
+        self.assertEqual(context.exception.reason, "HTTP 429")
+        self.assertEqual(self.session._session.get.call_count, 3)
+
+    def test_does_not_retry_client_errors(self, mock_sleep):
+        response = make_response(404)
+        response.raise_for_status.side_effect = requests.HTTPError("404 Client Error")
+        self.session._session.get.return_value = response
+        with self.assertRaises(FetchError):
+            self.session.get("https://www.compraonline.bonpreuesclat.cat")
+        self.assertEqual(self.session._session.get.call_count, 1)
+
+    def test_reports_attempts_to_rate_limiter(self, mock_sleep):
+        self.session.rate_limiter = RateLimiter(rate=None, max_concurrency=4, cooldown=0)
+        self.session._session.get.side_effect = [
+            make_response(429),
+            requests.Timeout(),
+            make_response(200, "<html></html>"),
+        ]
+        self.session.get("https://www.compraonline.bonpreuesclat.cat")
+        stats = self.session.rate_limiter.stats()["www.compraonline.bonpreuesclat.cat"]
+        self.assertEqual((stats['throttled'], stats['timeout'], stats['ok']), (1, 1, 1))
+        self.assertEqual(stats['in_flight'], 0)
+        # Halved from 2 to 1 by the errors, then raised again by the successful response
+        self.assertEqual(stats['concurrency'], 2)
+
+    def test_adaptive_timeout(self, mock_sleep):
+        self.assertEqual(self.session.timeout, self.session.min_timeout)
+        self.session._record_latency(5)
+        self.assertEqual(self.session.timeout, 20)
+        self.session._record_latency(100)
+        self.assertEqual(self.session.timeout, self.session.max_timeout)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+import unittest
+import os
+import sys
+import tempfile
+# Add the source directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+from incremental import page_fingerprint, diff_products, FingerprintStore
+
+CARD = ('<div class="product-card-container"><a aria-label="{name}" href="/products/{slug}/1"></a>'
+        '<span class="_text_16wi0_1 _text--m_16wi0_23 sc-1fkdssq-0 bwsVzh">{price}</span></div>')
+
+class TestIncremental(unittest.TestCase):
+
+    def test_fingerprint_ignores_changes_outside_cards(self):
+        cards = CARD.format(name="Poma", slug="poma", price="2,35\xa0€")
+        page = f'<html><script>token="abc"</script>{cards}</html>'
+        same_cards = f'<html><script>token="xyz"</script>{cards}</html>'
+        new_cards = CARD.format(name="Poma", slug="poma", price="1,99\xa0€")
+        new_price = f'<html><script>token="abc"</script>{new_cards}</html>'
+        self.assertEqual(page_fingerprint(page), page_fingerprint(same_cards))
+        self.assertNotEqual(page_fingerprint(page), page_fingerprint(new_price))
+
+    def test_diff_products(self):
+        previous = [("Poma", 2.35, "1kg", "/products/poma/1"), ("Pera", 1.5, "1kg", "/products/pera/2")]
+        current = [("Poma", 1.99, "1kg", "/products/poma/1"), ("Kiwi", 3.1, "500g", "/products/kiwi/3")]
+        self.assertEqual(diff_products(previous, current), [
+            ("price_changed", ("Poma", 1.99, "1kg", "/products/poma/1"), 2.35),
+            ("added", ("Kiwi", 3.1, "500g", "/products/kiwi/3"), None),
+            ("removed", ("Pera", 1.5, "1kg", "/products/pera/2"), 1.5),
+        ])
+        # The same product with another slug (e.g. read from the embedded state) is not a new product
+        self.assertEqual(diff_products(previous, [("Poma", 2.35, "1kg", "/products/poma-golden/1"), previous[1]]), [])
+
+    def test_store_roundtrip(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            store = FingerprintStore(os.path.join(tmp_dir, "fingerprints.sqlite"))
+            self.assertIsNone(store.get("/fruita"))
+            store.put("/fruita", "abc", [("Poma", 2.35, "1kg", "/products/poma/1")])
+            fingerprint, _, products = store.get("/fruita")
+            self.assertEqual(fingerprint, "abc")
+            self.assertEqual(products, [("Poma", 2.35, "1kg", "/products/poma/1")])
+            store.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import unittest
+import os
+import sys
+import tempfile
+# Add the source directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+from journal import CategoryJournal, RunJournal
+
+
+class TestCategoryJournal(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "Frescos")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_state_survives_reopening(self):
+        journal = CategoryJournal(self.path)
+        journal.save_leaves([["Frescos", "Fruita", None, None, None, "page0"]])
+        journal.record_page(0, "page0", [("Frescos", "Fruita", None, None, None, "Poma", "2024-01-01", 1.5, 1.0, "url")])
+        journal.close()
+
+        reopened = CategoryJournal(self.path)
+        self.assertEqual(reopened.timestamp, journal.timestamp)
+        self.assertEqual(reopened.leaves, [["Frescos", "Fruita", None, None, None, "page0"]])
+        rows, delta_rows = reopened.completed_pages()[0]
+        self.assertEqual(rows, [("Frescos", "Fruita", None, None, None, "Poma", "2024-01-01", 1.5, 1.0, "url")])
+        self.assertEqual(delta_rows, [])
+
+    def test_truncated_last_record_is_ignored(self):
+        journal = CategoryJournal(self.path)
+        journal.record_page(0, "page0", [("a",)])
+        journal.close()
+        with open(os.path.join(self.path, "pages.jsonl"), 'a', encoding='utf-8') as f:
+            f.write('{"index": 1, "url": "pa')
+
+        self.assertEqual(list(CategoryJournal(self.path).completed_pages()), [0])
+
+    def test_mark_done(self):
+        CategoryJournal(self.path).mark_done()
+        self.assertTrue(CategoryJournal(self.path).done)
+
+
+class TestRunJournal(unittest.TestCase):
+
+    def test_resume_restores_settings(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            settings = {'category': ['Frescos'], 'subcategories': None, 'output_format': ['csv'], 'incremental': False}
+            journal = RunJournal.start(settings, runs_dir=tmp_dir)
+            journal.category("Frescos").mark_done()
+            journal.close()
+
+            resumed = RunJournal.resume(journal.run_id, runs_dir=tmp_dir)
+            self.assertEqual(resumed.settings, settings)
+            self.assertTrue(resumed.category("Frescos").done)
+
+    def test_runs_started_in_the_same_second_do_not_collide(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            first = RunJournal.start({'category': ['Frescos']}, runs_dir=tmp_dir)
+            second = RunJournal.start({'category': ['Begudes']}, runs_dir=tmp_dir)
+            self.assertNotEqual(first.run_id, second.run_id)
+            self.assertEqual(RunJournal.resume(first.run_id, runs_dir=tmp_dir).settings, {'category': ['Frescos']})
+
+    def test_completed_run_is_removed(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            journal = RunJournal.start({}, runs_dir=tmp_dir)
+            journal.close(completed=True)
+            with self.assertRaises(FileNotFoundError):
+                RunJournal.resume(journal.run_id, runs_dir=tmp_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,36 @@
+import unittest
+import os
+import sys
+# Add the source directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+from main import build_parser, parse_args
+
+class TestCommandLine(unittest.TestCase):
+
+    def setUp(self):
+        self.parser = build_parser()
+
+    def test_options_before_the_subcommand(self):
+        args = parse_args(self.parser, ['--category', 'Frescos', '--subcategories', 'Fruites i verdures',
+                                        'crawl', '--workers', '4'])
+        self.assertEqual(args.command, 'crawl')
+        self.assertEqual(args.category, ['Frescos'])
+        self.assertEqual(args.subcategories, ['Fruites i verdures'])
+        self.assertEqual(args.workers, 4)
+
+    def test_options_after_the_subcommand(self):
+        args = parse_args(self.parser, ['crawl', '--category', 'Frescos', 'Begudes'])
+        self.assertEqual(args.command, 'crawl')
+        self.assertEqual(args.category, ['Frescos', 'Begudes'])
+
+    def test_without_subcommand(self):
+        args = parse_args(self.parser, ['--category', 'Frescos'])
+        self.assertIsNone(args.command)
+        self.assertEqual(args.category, ['Frescos'])
+        # The options before the subcommand keep the same defaults as without subcommand
+        crawl_args = vars(parse_args(self.parser, ['--category', 'Frescos', 'crawl']))
+        self.assertEqual(crawl_args.pop('command'), 'crawl')
+        self.assertEqual(crawl_args, {k: v for k, v in vars(args).items() if k != 'command'})
+
+if __name__ == '__main__':
+    unittest.main()
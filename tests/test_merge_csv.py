@@ -0,0 +1,82 @@
+import unittest
+import os
+import sys
+import tempfile
+# Add the source directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+import pandas as pd
+from sinks import COLUMNS, LEGACY_COLUMNS
+from merge_csv import SeenKeys, merge_csv
+
+FRESCOS = [
+    ("Frescos", "Fruita", None, None, None, "Poma", "20241104", 2.35, "1kg", "https://x/products/poma/1"),
+    # Same product listed under another subcategory
+    ("Frescos", "Ofertes", None, None, None, "Poma", "20241104", 2.35, "1kg", "https://x/products/poma/1"),
+    ("Frescos", "Fruita", None, None, None, "Poma", "20241105", 2.45, "1kg", "https://x/products/poma/1"),
+]
+BEGUDES = [
+    ("Begudes", "Aigua", None, None, None, "Aigua", "20241104", 0.5, "1,5L", "https://x/products/aigua/2"),
+]
+
+
+class TestMergeCsv(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.data_dir = self.tmp_dir.name
+        pd.DataFrame(FRESCOS, columns=LEGACY_COLUMNS).to_csv(os.path.join(self.data_dir, "Frescos_20241104_120000.csv"), index=False)
+        pd.DataFrame(BEGUDES, columns=LEGACY_COLUMNS).to_csv(os.path.join(self.data_dir, "Begudes_20241104_120000.csv"), index=False)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_merge_deduplicates(self):
+        output = merge_csv(self.data_dir, chunksize=1)
+        df = pd.read_csv(output, dtype={'Date': str})
+        self.assertEqual(list(df.columns), COLUMNS)
+        self.assertEqual(len(df), 3)
+        self.assertEqual(df["Subcategory_1"].tolist(), ["Aigua", "Fruita", "Fruita"])
+
+        # The merged file is ignored by the next merges
+        output = merge_csv(self.data_dir, os.path.join(self.data_dir, "bonpreu_products_all.csv"), dedup=False)
+        self.assertEqual(len(pd.read_csv(output)), 4)
+
+    def test_merge_filters(self):
+        output = merge_csv(self.data_dir, os.path.join(self.tmp_dir.name, "bonpreu_products_1.csv"),
+                           start_date="20241104", end_date="20241104", categories=["Frescos"])
+        df = pd.read_csv(output, dtype={'Date': str})
+        self.assertEqual(df["Date"].tolist(), ["20241104"])
+        self.assertEqual(df["Category"].tolist(), ["Frescos"])
+
+    def test_schema_mismatch_is_skipped(self):
+        pd.DataFrame({"Other": [1]}).to_csv(os.path.join(self.data_dir, "Celler_20241104_120000.csv"), index=False)
+        with self.assertLogs('merge_csv', level='WARNING'):
+            output = merge_csv(self.data_dir)
+        self.assertEqual(len(pd.read_csv(output)), 3)
+
+    def test_merge_deduplicates_by_product_id(self):
+        # The same product read from the embedded state, whose URL has another slug
+        state_rows = [("Frescos", "Fruita", None, None, None, "Poma", "20241104", 2.35, "1kg", "https://x/products/poma-golden/1")]
+        pd.DataFrame(state_rows, columns=LEGACY_COLUMNS).to_csv(os.path.join(self.data_dir, "Frescos_20241104_130000.csv"), index=False)
+        output = merge_csv(self.data_dir, os.path.join(self.tmp_dir.name, "bonpreu_products_1.csv"))
+        self.assertEqual(len(pd.read_csv(output)), 3)
+
+    def test_rows_without_url_are_kept(self):
+        rows = [("Frescos", "Fruita", None, None, None, name, "20241104", 1.0, "1kg", None) for name in ("Kiwi", "Mango")]
+        pd.DataFrame(rows, columns=LEGACY_COLUMNS).to_csv(os.path.join(self.data_dir, "Frescos_20241104_130000.csv"), index=False)
+        output = merge_csv(self.data_dir, os.path.join(self.tmp_dir.name, "bonpreu_products_1.csv"), chunksize=1)
+        df = pd.read_csv(output)
+        self.assertEqual(len(df), 5)
+        self.assertEqual(df["Product Name"].tolist()[-2:], ["Kiwi", "Mango"])
+
+    def test_seen_keys(self):
+        seen_keys = SeenKeys()
+        chunk = pd.DataFrame({'URL': ['a', 'b', 'a'], 'Date': ['1', '1', '1']})
+        self.assertEqual(seen_keys.new_rows(chunk).tolist(), [True, True, False])
+        chunk = pd.DataFrame({'URL': ['a', 'c'], 'Date': ['1', '1']})
+        self.assertEqual(seen_keys.new_rows(chunk).tolist(), [False, True])
+        self.assertEqual(len(seen_keys), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
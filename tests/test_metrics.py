@@ -0,0 +1,85 @@
+import unittest
+import json
+import logging
+import os
+import sys
+import tempfile
+# Add the source directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+from metrics import Histogram, Metrics
+from logging_config import JsonFormatter
+
+
+class TestHistogram(unittest.TestCase):
+
+    def test_buckets_and_quantiles(self):
+        histogram = Histogram(bounds=(0.1, 1, float('inf')))
+        for seconds in (0.05, 0.05, 0.5, 2):
+            histogram.observe(seconds)
+        self.assertEqual(histogram.counts, [2, 1, 1])
+        self.assertEqual(histogram.count, 4)
+        self.assertAlmostEqual(histogram.sum, 2.6)
+        self.assertEqual(histogram.quantile(0.5), 0.1)
+        self.assertEqual(histogram.quantile(0.99), float('inf'))
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_disabled_metrics_record_nothing(self):
+        metrics = Metrics(enabled=False)
+        with metrics.timer('fetch'):
+            pass
+        metrics.increment('pages')
+        metrics.set_gauge('request_rate', 10, {'host': 'example.com'})
+        report = metrics.report()
+        self.assertEqual(report['counters'], {})
+        self.assertEqual(report['stages'], {})
+        self.assertEqual(report['gauges'], {})
+
+    def test_report(self):
+        metrics = Metrics()
+        for _ in range(3):
+            with metrics.timer('parse'):
+                pass
+        metrics.increment('pages', 3)
+        metrics.increment('bytes_downloaded', 3000)
+        report = metrics.report()
+        self.assertEqual(report['stages']['parse']['count'], 3)
+        self.assertEqual(report['counters'], {'pages': 3, 'bytes_downloaded': 3000})
+        self.assertGreater(report['throughput']['pages_per_second'], 0)
+
+    def test_write_reports(self):
+        metrics = Metrics()
+        metrics.observe('fetch', 0.2)
+        metrics.increment('retries')
+        metrics.set_gauge('request_rate', 12.5, {'host': 'example.com'})
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            report_path = os.path.join(tmp_dir, "report.json")
+            metrics.write_json(report_path)
+            with open(report_path) as f:
+                self.assertEqual(json.load(f)['counters'], {'retries': 1})
+
+            prometheus_path = os.path.join(tmp_dir, "metrics.prom")
+            metrics.write_prometheus(prometheus_path)
+            with open(prometheus_path) as f:
+                lines = f.read().splitlines()
+        self.assertIn('bonpreu_stage_seconds_bucket{stage="fetch",le="0.1"} 0', lines)
+        self.assertIn('bonpreu_stage_seconds_bucket{stage="fetch",le="0.25"} 1', lines)
+        self.assertIn('bonpreu_stage_seconds_count{stage="fetch"} 1', lines)
+        self.assertIn('bonpreu_retries_total 1', lines)
+        self.assertIn('bonpreu_request_rate{host="example.com"} 12.5', lines)
+
+
+class TestJsonFormatter(unittest.TestCase):
+
+    def test_includes_extra_fields(self):
+        record = logging.makeLogRecord({'name': 'scraper', 'levelname': 'WARNING', 'msg': 'Skipping %s',
+                                        'args': ('page',), 'url': 'https://example.com'})
+        entry = json.loads(JsonFormatter().format(record))
+        self.assertEqual(entry['message'], 'Skipping page')
+        self.assertEqual(entry['level'], 'WARNING')
+        self.assertEqual(entry['url'], 'https://example.com')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import unittest
+import os
+import sys
+import tempfile
+import json
+# Add the source directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+from navigation import SiteNavigation
+
+BASE_URL = "https://www.compraonline.bonpreuesclat.cat"
+
+class TestSiteNavigation(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "navigation.json")
+        self.navigation = SiteNavigation(BASE_URL)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_links_loaded_once(self):
+        calls = []
+        def loader(url):
+            calls.append(url)
+            return [("Fruita", BASE_URL + "/fruita")]
+        self.navigation.get_links(BASE_URL + "/frescos", loader)
+        links = self.navigation.get_links(BASE_URL + "/frescos", loader)
+        self.assertEqual(links, [("Fruita", BASE_URL + "/fruita")])
+        self.assertEqual(calls, [BASE_URL + "/frescos"])
+
+    def test_failed_loads_are_not_stored(self):
+        def failing_loader(url):
+            raise RuntimeError("timeout")
+        with self.assertRaises(RuntimeError):
+            self.navigation.get_links(BASE_URL + "/frescos", failing_loader)
+        self.assertEqual(self.navigation.get_links(BASE_URL + "/frescos", lambda url: None), None)
+
+    def test_save_and_load(self):
+        self.navigation.get_categories_section_url(lambda: BASE_URL + "/categories")
+        self.navigation.get_links(BASE_URL + "/frescos", lambda url: [("Fruita", BASE_URL + "/fruita")])
+        self.navigation.get_links(BASE_URL + "/fruita", lambda url: None)
+        self.navigation.save(self.path)
+
+        loaded = SiteNavigation.load(BASE_URL, self.path, max_age=3600)
+        self.assertEqual(loaded.created_at, self.navigation.created_at)
+        self.assertEqual(loaded.get_categories_section_url(lambda: None), BASE_URL + "/categories")
+        self.assertEqual(loaded.get_links(BASE_URL + "/frescos", lambda url: None), [("Fruita", BASE_URL + "/fruita")])
+        self.assertEqual(len(loaded), 2)
+
+    def test_load_ignores_old_snapshots(self):
+        self.navigation.get_links(BASE_URL + "/frescos", lambda url: None)
+        self.navigation.save(self.path)
+        with open(self.path) as f:
+            snapshot = json.load(f)
+        snapshot["created_at"] -= 7200
+        with open(self.path, "w") as f:
+            json.dump(snapshot, f)
+        self.assertEqual(len(SiteNavigation.load(BASE_URL, self.path, max_age=3600)), 0)
+        self.assertEqual(len(SiteNavigation.load(BASE_URL, self.path)), 1)
+
+if __name__ == '__main__':
+    unittest.main()
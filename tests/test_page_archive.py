@@ -0,0 +1,137 @@
+import unittest
+import glob
+import os
+import sys
+import tempfile
+import time
+# Add the source directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+import numpy as np
+import pandas as pd
+from page_archive import PageArchive, INDEX_DTYPE
+from reextract import reextract_day
+from merge_csv import merge_csv
+from analytics import PriceHistory
+from price_store import PriceStore
+
+FIXTURE_PATH = os.path.join(os.path.dirname(__file__), 'fixtures', 'subcategory_page.html')
+BASE_URL = "https://www.compraonline.bonpreuesclat.cat"
+# Noon of 2024-01-01, local time
+DAY_TIME = time.mktime((2024, 1, 1, 12, 0, 0, 0, 0, -1))
+
+
+def menu_page(links):
+    return ('<html><body><div class="sc-1wz1hmv-0 cmTtoc">'
+            + "".join(f'<a href="{href}">{text}</a>' for text, href in links) + '</div></body></html>')
+
+
+class TestPageArchive(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.archive = PageArchive(self.tmp_dir.name, compression="gzip")
+
+    def tearDown(self):
+        self.archive.close()
+        self.tmp_dir.cleanup()
+
+    def test_latest_version_of_every_page(self):
+        self.archive.record(f"{BASE_URL}/a", "<html>a1</html>", fetched_at=DAY_TIME)
+        self.archive.record(f"{BASE_URL}/b", "<html>b</html>", fetched_at=DAY_TIME + 1)
+        self.archive.record(f"{BASE_URL}/a", "<html>a2</html>", fetched_at=DAY_TIME + 2)
+        # Unchanged pages are archived once
+        self.archive.record(f"{BASE_URL}/b", "<html>b</html>", fetched_at=DAY_TIME + 3)
+        self.archive.record(f"{BASE_URL}/a", "<html>next day</html>", fetched_at=DAY_TIME + 24 * 3600)
+        self.archive.close()
+
+        self.assertEqual(self.archive.days(), ["20240101", "20240102"])
+        day = self.archive.open_day("20240101")
+        self.assertEqual(len(day), 2)
+        self.assertEqual(day.get(f"{BASE_URL}/a"), "<html>a2</html>")
+        self.assertEqual(day.get(f"{BASE_URL}/b"), "<html>b</html>")
+        self.assertIsNone(day.get(f"{BASE_URL}/c"))
+        self.assertEqual(sorted(day.urls()), [f"{BASE_URL}/a", f"{BASE_URL}/b"])
+        index_paths = glob.glob(os.path.join(self.tmp_dir.name, "20240101", "*.idx"))
+        self.assertEqual(os.path.getsize(index_paths[0]), 3 * INDEX_DTYPE.itemsize)
+        day.close()
+
+    def test_torn_index_record_is_ignored(self):
+        self.archive.record(f"{BASE_URL}/a", "<html>a</html>", fetched_at=DAY_TIME)
+        self.archive.close()
+        index_path = glob.glob(os.path.join(self.tmp_dir.name, "20240101", "*.idx"))[0]
+        with open(index_path, 'ab') as f:
+            f.write(b"\x01\x02\x03")
+
+        day = self.archive.open_day("20240101")
+        self.assertEqual(day.get(f"{BASE_URL}/a"), "<html>a</html>")
+        day.close()
+        with self.assertRaises(FileNotFoundError):
+            self.archive.open_day("20240103")
+
+
+class TestReextract(unittest.TestCase):
+
+    def test_reextract_archived_day(self):
+        with open(FIXTURE_PATH, encoding='utf-8') as f:
+            listing = f.read()
+        pages = {
+            BASE_URL: '<html><body><ul id="nav-menu" aria-labelledby="nav-menu-button" role="menu" '
+                      'class="sc-1w5m3ly-0 aIFnR"><li><a href="/categories">Supermercat</a></li></ul></body></html>',
+            f"{BASE_URL}/categories": menu_page([("Frescos", "/frescos")]),
+            f"{BASE_URL}/frescos": menu_page([("Fruita", "/fruita"), ("Verdura", "/verdura")]),
+            f"{BASE_URL}/fruita": listing,
+        }
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            archive = PageArchive(os.path.join(tmp_dir, "archive"))
+            for url, page in pages.items():
+                archive.record(url, page, fetched_at=DAY_TIME)
+            archive.close()
+
+            failed_urls = reextract_day(archive, "20240101", BASE_URL, ["Frescos"], data_dir=tmp_dir,
+                                        processes=2, parser="bs4")
+            self.assertEqual(failed_urls, [(f"{BASE_URL}/verdura", "not found in the offline cache")])
+            output = pd.read_csv(glob.glob(os.path.join(tmp_dir, "Frescos_reextract_20240101_*.csv"))[0])
+            self.assertEqual(len(output), 3)
+            self.assertEqual(set(output['Date']), {20240101})
+            self.assertEqual(set(output['Subcategory_1']), {"Fruita"})
+
+    def test_reextracted_rows_replace_the_crawl(self):
+        with open(FIXTURE_PATH, encoding='utf-8') as f:
+            listing = f.read()
+        pages = {
+            BASE_URL: '<html><body><ul id="nav-menu" aria-labelledby="nav-menu-button" role="menu" '
+                      'class="sc-1w5m3ly-0 aIFnR"><li><a href="/categories">Supermercat</a></li></ul></body></html>',
+            f"{BASE_URL}/categories": menu_page([("Frescos", "/frescos")]),
+            f"{BASE_URL}/frescos": menu_page([("Fruita", "/fruita")]),
+            f"{BASE_URL}/fruita": listing,
+        }
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            archive = PageArchive(os.path.join(tmp_dir, "archive"))
+            for url, page in pages.items():
+                archive.record(url, page, fetched_at=DAY_TIME)
+            archive.close()
+
+            # The crawl of that day saved broken prices, also to the price store
+            reextract_day(archive, "20240101", BASE_URL, ["Frescos"], data_dir=tmp_dir, processes=1, parser="bs4")
+            [path] = glob.glob(os.path.join(tmp_dir, "Frescos_reextract_20240101_*.csv"))
+            expected = pd.read_csv(path, dtype={'Date': str})
+            os.remove(path)
+            broken = expected.assign(Price=0.01)
+            broken.to_csv(os.path.join(tmp_dir, "Frescos_20240101_120000.csv"), index=False)
+            store = PriceStore(os.path.join(tmp_dir, "prices.sqlite"))
+            store.upsert_rows(broken.itertuples(index=False))
+            store.close()
+
+            reextract_day(archive, "20240101", BASE_URL, ["Frescos"], formats=["csv", "sqlite"], data_dir=tmp_dir,
+                          processes=1, parser="bs4")
+            merged = pd.read_csv(merge_csv(tmp_dir, os.path.join(tmp_dir, "bonpreu_products_all.csv")))
+            pd.testing.assert_series_equal(merged['Price'], expected['Price'])
+            history = PriceHistory.load(tmp_dir)
+            np.testing.assert_allclose(history.prices[0], expected['Price'], rtol=1e-6)
+            store = PriceStore(os.path.join(tmp_dir, "prices.sqlite"))
+            self.assertEqual(store.price_history(expected['URL'][0])['Price'].tolist(), [expected['Price'][0]])
+            store.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
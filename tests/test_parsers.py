@@ -0,0 +1,60 @@
+import unittest
+import os
+import sys
+# Add the source directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+from parsers import PARSER_BACKENDS, convert_price, get_parser
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+BASE_URL = "https://www.compraonline.bonpreuesclat.cat"
+
+
+class TestParsers(unittest.TestCase):
+
+    def setUp(self):
+        with open(os.path.join(FIXTURES_DIR, 'subcategory_page.html'), encoding='utf-8') as f:
+            self.html = f.read()
+
+    def test_backends_extract_the_same_products(self):
+        expected = [
+            ("Poma Golden", 2.35, "1kg", BASE_URL + "/products/poma-golden/123"),
+            ("Plàtan de Canàries", 3.10, "approx. 1kg", BASE_URL + "/products/platan-de-canaries/456"),
+            ("Taronja de taula", None, "2kg", BASE_URL + "/products/taronja-de-taula/789"),
+        ]
+        for name, extract_products in PARSER_BACKENDS.items():
+            with self.subTest(backend=name):
+                self.assertEqual(extract_products(self.html, BASE_URL), expected)
+
+    def test_backends_match_the_same_classes(self):
+        # Card with an extra class, a price span with an extra modifier class and the quantity span after it
+        html = (
+            '<div class="product-card-container promo">'
+            '<a aria-label="Poma" href="/products/poma/1"></a>'
+            '<span class="_text_16wi0_1 _text--m_16wi0_23 sc-1fkdssq-0 bwsVzh _text--strike">2,50\xa0€</span>'
+            '<span class="_text_16wi0_1  _text--m_16wi0_23 sc-1fkdssq-0 bwsVzh">1,99\xa0€</span>'
+            '<span class="_text_16wi0_1 _text--m_16wi0_23 sc-1sjeki5-0 asqfi">1kg</span>'
+            '</div>'
+        )
+        expected = [("Poma", 1.99, "1kg", BASE_URL + "/products/poma/1")]
+        for name, extract_products in PARSER_BACKENDS.items():
+            with self.subTest(backend=name):
+                self.assertEqual(extract_products(html, BASE_URL), expected)
+
+    def test_page_without_cards(self):
+        for name, extract_products in PARSER_BACKENDS.items():
+            with self.subTest(backend=name):
+                self.assertEqual(extract_products("", BASE_URL), [])
+                self.assertEqual(extract_products("<html><body></body></html>", BASE_URL), [])
+
+    def test_get_parser(self):
+        self.assertIs(get_parser("bs4"), PARSER_BACKENDS["bs4"])
+        self.assertIs(get_parser("auto"), next(iter(PARSER_BACKENDS.values())))
+        with self.assertRaises(ValueError):
+            get_parser("unknown")
+
+    def test_convert_price(self):
+        self.assertEqual(convert_price("12,34\xa0€"), 12.34)
+
+
+if __name__ == '__main__':
+    unittest.main()
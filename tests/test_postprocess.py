@@ -0,0 +1,42 @@
+import unittest
+import os
+import sys
+# Add the source directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+import numpy as np
+from postprocess import normalize_text, parse_prices, parse_quantities, product_columns, unit_prices
+
+
+class TestPostprocess(unittest.TestCase):
+
+    def test_parse_prices(self):
+        prices = parse_prices([2.35, "12,34\xa0€", None, "n/a"])
+        np.testing.assert_array_equal(prices, [2.35, 12.34, np.nan, np.nan])
+
+    def test_parse_quantities(self):
+        values, units = parse_quantities(["0.75L", "500g", "4 x 0.12kg", "20 per paquet", "33cl", "1,5L", None, "approx."])
+        np.testing.assert_allclose(values, [0.75, 0.5, 0.48, 20, 0.33, 1.5, np.nan, np.nan])
+        self.assertEqual(units, ["L", "kg", "kg", "unit", "L", "L", None, None])
+
+    def test_unit_prices(self):
+        np.testing.assert_array_equal(unit_prices(np.array([1.5, 2.0, np.nan]), np.array([0.75, np.nan, 1.0])),
+                                      [2.0, np.nan, np.nan])
+
+    def test_normalize_text_is_memoized(self):
+        normalize_text.cache_clear()
+        self.assertEqual(normalize_text("Làctics i ous"), "Lactics i ous")
+        normalize_text("Làctics i ous")
+        self.assertEqual(normalize_text.cache_info().hits, 1)
+        self.assertIsNone(normalize_text(None))
+
+    def test_product_columns(self):
+        columns = product_columns([("Llet sencera", 0.99, "1L", "url1"), ("Pa", None, "0.4kg", "url2")])
+        self.assertEqual(columns['names'], ["Llet sencera", "Pa"])
+        self.assertEqual(columns['prices'], [0.99, None])
+        self.assertEqual(columns['values'], [1.0, 0.4])
+        self.assertEqual(columns['units'], ["L", "kg"])
+        self.assertEqual(columns['unit_prices'], [0.99, None])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import unittest
+import os
+import sys
+import sqlite3
+import tempfile
+# Add the source directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+import pandas as pd
+from sinks import LEGACY_COLUMNS
+from price_store import PriceStore, PriceStoreSink, import_csv
+
+ROWS = [
+    ("Frescos", "Fruita", None, None, None, "Poma", "20241104", 2.35, "1kg", "https://x/products/poma/1"),
+    # Same product listed under another subcategory
+    ("Frescos", "Ofertes", None, None, None, "Poma", "20241104", 2.35, "1kg", "https://x/products/poma/1"),
+    ("Begudes", "Aigua", None, None, None, "Aigua", "20241104", 0.5, "1,5L", "https://x/products/aigua/2"),
+    ("Frescos", "Fruita", None, None, None, "Poma", "20241105", 2.45, "1kg", "https://x/products/poma/1"),
+]
+
+
+class TestPriceStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.store = PriceStore(os.path.join(self.tmp_dir.name, "prices.sqlite"))
+
+    def tearDown(self):
+        self.store.close()
+        self.tmp_dir.cleanup()
+
+    def test_upsert_and_queries(self):
+        with PriceStoreSink(self.store, batch_size=2) as sink:
+            sink.write_rows(ROWS)
+        # Storing the same day again updates the price instead of duplicating it
+        self.store.upsert_rows([ROWS[3][:7] + (2.40,) + ROWS[3][8:]])
+
+        history = self.store.price_history("https://x/products/poma/1")
+        self.assertEqual(history["Date"].tolist(), ["20241104", "20241105"])
+        self.assertEqual(history["Price"].tolist(), [2.35, 2.40])
+        self.assertEqual(len(self.store.price_history("https://x/products/poma/1", start_date="20241105")), 1)
+
+        prices = self.store.category_prices("Frescos", "20241104")
+        self.assertEqual(prices["Product Name"].tolist(), ["Poma"])
+        self.assertEqual(len(self.store.category_prices("Begudes", "20241104")), 1)
+
+    def test_products_identified_by_url_id(self):
+        self.store.upsert_rows(ROWS[:1])
+        # The same product with another slug keeps its history
+        self.store.upsert_rows([ROWS[3][:5] + ("Poma Golden",) + ROWS[3][6:9] + ("https://x/products/poma-golden/1",)])
+        history = self.store.price_history("https://x/products/poma-golden/1")
+        self.assertEqual(history["Price"].tolist(), [2.35, 2.45])
+        self.assertEqual(self.store.category_prices("Frescos", "20241105")["Product Name"].tolist(), ["Poma Golden"])
+
+    def test_database_without_product_keys(self):
+        path = os.path.join(self.tmp_dir.name, "old.sqlite")
+        db = sqlite3.connect(path)
+        db.execute("CREATE TABLE products (id INTEGER PRIMARY KEY, url TEXT NOT NULL UNIQUE, name TEXT, quantity TEXT)")
+        db.execute("INSERT INTO products (url, name, quantity) VALUES ('https://x/products/poma/1', 'Poma', '1kg')")
+        db.commit()
+        db.close()
+        store = PriceStore(path)
+        store.upsert_rows([ROWS[3][:9] + ("https://x/products/poma-golden/1",)])
+        self.assertEqual(store.price_history("https://x/products/poma/1")["Price"].tolist(), [2.45])
+        store.close()
+
+    def test_import_csv(self):
+        csv_path = os.path.join(self.tmp_dir.name, "Frescos_20241104_120000.csv")
+        pd.DataFrame(ROWS, columns=LEGACY_COLUMNS).to_csv(csv_path, index=False)
+        self.assertEqual(import_csv([csv_path], self.store, chunksize=3), 4)
+        # Importing the same snapshot twice does not duplicate the observations
+        import_csv([csv_path], self.store)
+        self.assertEqual(len(self.store.price_history("https://x/products/poma/1")), 2)
+        self.assertEqual(self.store.price_history("https://x/products/aigua/2")["Price"].tolist(), [0.5])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import unittest
+import os
+import sys
+import threading
+import time
+# Add the source directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+from rate_control import AimdController, RateLimiter, TokenBucket
+
+
+class TestTokenBucket(unittest.TestCase):
+
+    def test_spaces_out_requests(self):
+        bucket = TokenBucket(rate=50, burst=1)
+        start = time.monotonic()
+        for _ in range(6):
+            bucket.acquire()
+        # The first token is available at once, the other 5 are generated at 50 per second
+        self.assertGreaterEqual(time.monotonic() - start, 0.09)
+
+    def test_unlimited(self):
+        bucket = TokenBucket(rate=None)
+        self.assertEqual(sum(bucket.acquire() for _ in range(100)), 0)
+
+
+class TestAimdController(unittest.TestCase):
+
+    def test_additive_increase(self):
+        controller = AimdController(rate=10, concurrency=2, max_concurrency=4, rate_step=1)
+        for _ in range(2):
+            controller.acquire()
+            controller.release(0.1, 'ok')
+        self.assertEqual(controller.concurrency, 3)
+        self.assertEqual(controller.rate, 11)
+        for _ in range(20):
+            controller.acquire()
+            controller.release(0.1, 'ok')
+        self.assertEqual(controller.concurrency, 4)
+
+    def test_multiplicative_decrease_with_cooldown(self):
+        controller = AimdController(rate=10, concurrency=8, max_concurrency=8, cooldown=60)
+        for outcome in ('throttled', 'timeout'):
+            controller.acquire()
+            controller.release(0.1, outcome)
+        # Both errors come from the same overload, so the controller backs off once
+        self.assertEqual((controller.concurrency, controller.rate), (4, 5))
+
+    def test_slow_responses_back_off(self):
+        controller = AimdController(rate=10, concurrency=4, max_latency=1, cooldown=0)
+        controller.acquire()
+        controller.release(3, 'ok')
+        self.assertEqual(controller.concurrency, 2)
+
+    def test_limits_requests_in_flight(self):
+        controller = AimdController(rate=None, concurrency=2, max_concurrency=2)
+        in_flight = []
+        lock = threading.Lock()
+
+        def request():
+            controller.acquire()
+            with lock:
+                in_flight.append(controller.stats()['in_flight'])
+            time.sleep(0.01)
+            controller.release(0.01, 'error')
+
+        threads = [threading.Thread(target=request) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertLessEqual(max(in_flight), 2)
+
+
+class TestRateLimiter(unittest.TestCase):
+
+    def test_request_outcomes(self):
+        limiter = RateLimiter(rate=None)
+        with limiter.request("https://a.example/page"):
+            pass
+        with self.assertRaises(ValueError):
+            with limiter.request("https://a.example/other"):
+                raise ValueError()
+        with limiter.request("https://b.example/page") as ticket:
+            ticket.outcome = 'throttled'
+
+        stats = limiter.stats()
+        self.assertEqual((stats["a.example"]['ok'], stats["a.example"]['error']), (1, 1))
+        self.assertEqual(stats["b.example"]['throttled'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import unittest
+from unittest.mock import MagicMock
+import os
+import sys
+import tempfile
+# Add the source directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+import requests
+from http_session import HttpSession, FetchError
+from response_cache import ResponseCache
+
+URL = "https://www.compraonline.bonpreuesclat.cat/categories/frescos"
+
+def make_response(status_code, body=b"", headers=None):
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = body
+    response.encoding = "utf-8"
+    response.headers.update(headers or {})
+    return response
+
+class TestResponseCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache = ResponseCache(self.tmp_dir.name, ttls=[("/categories/", 3600)])
+
+    def tearDown(self):
+        self.cache.close()
+        self.tmp_dir.cleanup()
+
+    def test_store_and_lookup(self):
+        self.cache.store(URL, make_response(200, b"<html>Frescos</html>", {"ETag": '"v1"'}))
+        entry = self.cache.lookup(URL)
+        self.assertEqual(entry.to_response().text, "<html>Frescos</html>")
+        self.assertTrue(entry.fresh)
+        self.assertEqual(entry.validators(), {"If-None-Match": '"v1"'})
+        # URLs without TTL are always revalidated
+        self.cache.store("https://www.compraonline.bonpreuesclat.cat", make_response(200, b"<html></html>"))
+        self.assertFalse(self.cache.lookup("https://www.compraonline.bonpreuesclat.cat").fresh)
+
+    def test_identical_bodies_stored_once(self):
+        self.cache.store(URL, make_response(200, b"<html></html>"))
+        self.cache.store(URL + "/fruita", make_response(200, b"<html></html>"))
+        bodies = [p for p in (self.cache.cache_dir / "bodies").rglob("*.gz")]
+        self.assertEqual(len(bodies), 1)
+
+    def test_evicts_least_recently_used(self):
+        self.cache.max_size = 0
+        self.cache.store(URL, make_response(200, b"a" * 1000))
+        self.assertIsNone(self.cache.lookup(URL))
+
+    def test_size_is_tracked(self):
+        def bodies_size():
+            return sum(p.stat().st_size for p in (self.cache.cache_dir / "bodies").rglob("*.gz"))
+        self.cache.store(URL, make_response(200, b"a" * 1000))
+        self.cache.store(URL + "/fruita", make_response(200, b"a" * 1000))
+        self.cache.store(URL + "/verdura", make_response(200, b"b" * 1000))
+        # A new version of a page replaces its previous body
+        self.cache.store(URL + "/verdura", make_response(200, b"c" * 1000))
+        self.assertEqual(self.cache.size(), bodies_size())
+        self.cache.max_size = self.cache.size() - 1
+        self.cache.store(URL + "/carn", make_response(200, b"d" * 1000))
+        self.assertEqual(self.cache.size(), bodies_size())
+        self.cache.close()
+        self.cache = ResponseCache(self.tmp_dir.name)
+        self.assertEqual(self.cache.size(), bodies_size())
+
+    def test_session_revalidates_stale_entries(self):
+        self.cache.ttls = []
+        self.cache.store(URL, make_response(200, b"<html>cached</html>", {"ETag": '"v1"'}))
+        session = HttpSession(cache=self.cache)
+        session._session = MagicMock()
+        session._session.get.return_value = make_response(304)
+
+        response = session.get(URL, headers={"User-Agent": "test"})
+        self.assertEqual(response.text, "<html>cached</html>")
+        headers = session._session.get.call_args.kwargs["headers"]
+        self.assertEqual(headers["If-None-Match"], '"v1"')
+
+    def test_session_serves_fresh_entries_without_request(self):
+        self.cache.store(URL, make_response(200, b"<html>cached</html>"))
+        session = HttpSession(cache=self.cache)
+        session._session = MagicMock()
+        self.assertEqual(session.get(URL).text, "<html>cached</html>")
+        session._session.get.assert_not_called()
+
+    def test_offline_miss_raises(self):
+        self.cache.offline = True
+        session = HttpSession(cache=self.cache)
+        session._session = MagicMock()
+        with self.assertRaises(FetchError):
+            session.get(URL)
+        session._session.get.assert_not_called()
+
+if __name__ == '__main__':
+    unittest.main()
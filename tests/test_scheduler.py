@@ -0,0 +1,116 @@
+import unittest
+import os
+import sys
+import tempfile
+# Add the source directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+import pandas as pd
+from sinks import COLUMNS
+from daemon import Daemon
+from scheduler import (RevisitScheduler, estimate_rate, products_signature, load_snapshot_history,
+                       history_stats, simulate, DAY)
+
+BASE_URL = "https://www.compraonline.bonpreuesclat.cat"
+
+
+def leaf(category, name):
+    return [category, name, None, None, None, f"{BASE_URL}/{name}"]
+
+
+def snapshot_rows(day, n_days_changing, n_days_static):
+    """Rows of a day: a page whose prices change every day and a page whose prices never change."""
+    return [
+        ["Frescos", "Fruita", "", "", "", "Poma", day, str(n_days_changing), "1 kg", f"{BASE_URL}/p/1", "", "", ""],
+        ["Frescos", "Verdura", "", "", "", "Ceba", day, str(n_days_static), "1 kg", f"{BASE_URL}/p/2", "", "", ""],
+    ]
+
+
+class TestRevisitScheduler(unittest.TestCase):
+
+    def test_estimate_rate(self):
+        prior = estimate_rate(0, 0, 0)
+        self.assertTrue(0.5 / DAY < prior < 1 / DAY)
+        # Never changed in 20 daily visits: lower than the prior. Always changed: higher, but finite
+        self.assertLess(estimate_rate(20, 0, 20 * DAY), prior)
+        self.assertGreater(estimate_rate(20, 20, 20 * DAY), prior)
+
+    def test_products_signature(self):
+        products = [("Poma", "1,00 €", "1 kg", "/p/1"), ("Pera", "2,00 €", "1 kg", "/p/2")]
+        self.assertEqual(products_signature(products), products_signature(products[::-1]))
+        self.assertNotEqual(products_signature(products), products_signature([products[0], ("Pera", "2,10 €", "1 kg", "/p/2")]))
+
+    def test_changing_pages_are_visited_more_often(self):
+        scheduler = RevisitScheduler(budget=10, min_interval=60, max_interval=30 * DAY, path=None)
+        scheduler.sync_leaves("Frescos", [leaf("Frescos", "fruita"), leaf("Frescos", "verdura")], now=0)
+        now = 0
+        for visit in range(30):
+            due = {page.url for page in scheduler.due(now)}
+            for url in due:
+                signature = str(visit) if url.endswith("fruita") else "static"
+                scheduler.record_visit(url, signature, now)
+            now = scheduler.next_due()
+        self.assertGreater(scheduler.rate(f"{BASE_URL}/fruita"), scheduler.rate(f"{BASE_URL}/verdura"))
+        self.assertLess(scheduler.interval(f"{BASE_URL}/fruita"), scheduler.interval(f"{BASE_URL}/verdura"))
+
+    def test_state_is_persisted(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "schedule.sqlite")
+            scheduler = RevisitScheduler(budget=10, path=path)
+            scheduler.sync_leaves("Frescos", [leaf("Frescos", "fruita"), leaf("Frescos", "verdura")], now=0)
+            [page, _] = scheduler.due(0)
+            scheduler.record_visit(page.url, "a", 0)
+            scheduler.record_visit(page.url, "b", DAY)
+            scheduler.close()
+
+            scheduler = RevisitScheduler(budget=10, path=path)
+            self.assertEqual(len(scheduler), 2)
+            self.assertEqual([page.url for page in scheduler.due(0)], [f"{BASE_URL}/verdura"])
+            # Removed from the category tree
+            scheduler.sync_leaves("Frescos", [leaf("Frescos", "verdura")], now=DAY)
+            self.assertEqual(len(scheduler), 1)
+            scheduler.close()
+
+    def test_failed_batch_is_scheduled_again(self):
+        class BrokenScraper():
+            failed_reasons = {}
+
+            def clear_failed_urls(self):
+                pass
+
+            def _iter_product_pages(self, urls):
+                next(urls)
+                raise RuntimeError("driver crashed")
+
+        scheduler = RevisitScheduler(budget=3600, min_interval=60, path=None)
+        scheduler.sync_leaves("Frescos", [leaf("Frescos", "fruita"), leaf("Frescos", "verdura")], now=0)
+        daemon = Daemon(scheduler, lambda category: BrokenScraper(), ["Frescos"])
+        with self.assertLogs('daemon', level='ERROR'):
+            self.assertEqual(daemon.run_once(now=0), 2)
+        # The pages taken by the failed batch are visited again after min_interval
+        self.assertEqual(len(scheduler.due(float('inf'))), 2)
+
+    def test_history_and_simulation(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for i in range(10):
+                day = f"202401{i + 1:02d}"
+                pd.DataFrame(snapshot_rows(day, i, 1), columns=COLUMNS).to_csv(
+                    os.path.join(tmp_dir, f"Frescos_{day}_120000.csv"), index=False)
+            history = load_snapshot_history(tmp_dir)
+            self.assertEqual(len(history), 20)
+            stats = history_stats(history)
+            self.assertEqual(stats[("Frescos", "Fruita", None, None, None)], (9, 9, 9 * DAY))
+            self.assertEqual(stats[("Frescos", "Verdura", None, None, None)], (9, 0, 9 * DAY))
+
+            scheduler = RevisitScheduler(budget=10, path=None)
+            scheduler.sync_leaves("Frescos", [leaf("Frescos", "Fruita"), leaf("Frescos", "Verdura")], now=0)
+            self.assertEqual(scheduler.seed(stats), 2)
+            self.assertGreater(scheduler.rate(f"{BASE_URL}/Fruita"), scheduler.rate(f"{BASE_URL}/Verdura"))
+
+            results = simulate(history, budget=0.25, min_interval=3600, max_interval=10 * DAY)
+            self.assertEqual((results['pages'], results['changes'], results['days']), (2, 9, 10))
+            self.assertEqual(results['adaptive']['visits'], results['uniform']['visits'])
+            self.assertLess(results['adaptive']['mean_delay_hours'], results['uniform']['mean_delay_hours'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,7 +4,14 @@ import os
 import sys
 # Add the parent directory to the Python path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+# Add the source directory to the Python path, as the scraper imports its sibling modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
 from src.scraper import BonpreuScraper
+from http_session import FetchError
+from incremental import FingerprintStore
+from sinks import CsvSink
+from journal import CategoryJournal
+import tempfile
 
 class TestBonpreuScraper(unittest.TestCase):
 
@@ -12,7 +19,7 @@ class TestBonpreuScraper(unittest.TestCase):
         self.scraper = BonpreuScraper(base_url="https://www.compraonline.bonpreuesclat.cat",
                                       category="Frescos")
 
-    @patch('src.scraper.requests.get')
+    @patch('http_session.HttpSession.get')
     def test_parse_html_static(self, mock_get):
         mock_response = MagicMock()
         mock_response.text = "<html></html>"
@@ -21,7 +28,7 @@ class TestBonpreuScraper(unittest.TestCase):
         html = self.scraper._parse_html(url="https://www.compraonline.bonpreuesclat.cat", dynamic_content=False)
         self.assertEqual(html, "<html></html>")
 
-    @patch('src.scraper.webdriver.Chrome')
+    @patch('driver_pool.webdriver.Chrome')
     def test_parse_html_dynamic(self, mock_chrome):
         mock_driver = MagicMock()
         mock_driver.page_source = "<html></html>"
@@ -30,6 +37,25 @@ class TestBonpreuScraper(unittest.TestCase):
         html = self.scraper._parse_html(url="https://www.compraonline.bonpreuesclat.cat", dynamic_content=True)
         self.assertEqual(html, "<html></html>")
 
+    def test_driver_pool_sized_by_workers(self):
+        scraper = BonpreuScraper(base_url="https://www.compraonline.bonpreuesclat.cat", category="Frescos", max_workers=6)
+        self.assertEqual(scraper._get_driver_pool().size, 6)
+        scraper.close()
+
+    @patch('src.scraper.BonpreuScraper._parse_html')
+    def test_categories_section_errors_keep_the_url(self, mock_parse_html):
+        mock_parse_html.side_effect = FetchError(self.scraper.base_url, "not found in the offline cache")
+        with self.assertRaises(FetchError) as context:
+            self.scraper._load_categories_section_url()
+        self.assertEqual(context.exception.url, self.scraper.base_url)
+
+        # Main page without the Supermercat section
+        mock_parse_html.side_effect = None
+        mock_parse_html.return_value = "<html></html>"
+        with self.assertRaises(FetchError) as context:
+            self.scraper.get_subcategories_names()
+        self.assertEqual(context.exception.url, self.scraper.base_url)
+
     def test_get_soup(self):
         html = "<html><body><div>Test</div></body></html>"
         soup = self.scraper._get_soup(html)
@@ -47,6 +73,144 @@ class TestBonpreuScraper(unittest.TestCase):
         subcategories = self.scraper.get_subcategories_names()
         self.assertIsInstance(subcategories, list)
 
+    def test_extract_subcat_structure_order(self):
+        base = "https://www.compraonline.bonpreuesclat.cat"
+        tree = {
+            base + "/frescos": [("Fruita", base + "/fruita"), ("Carn", base + "/carn")],
+            base + "/fruita": [("Temporada", base + "/temporada"), ("Exotica", base + "/exotica")],
+            base + "/temporada": [("Pomes", base + "/pomes")],
+            base + "/pomes": [("Golden", base + "/golden"), ("Fuji", base + "/fuji")],
+        }
+        self.scraper._get_category_url = lambda: base + "/frescos"
+        self.scraper._load_subcategory_links = lambda url: tree.get(url)
+
+        structure = self.scraper._extract_subcat_structure("Fruita")
+        self.assertEqual(structure, [
+            ["Frescos", "Fruita", "Temporada", "Pomes", "Golden", base + "/golden"],
+            ["Frescos", "Fruita", "Temporada", "Pomes", "Fuji", base + "/fuji"],
+            ["Frescos", "Fruita", "Exotica", None, None, base + "/exotica"],
+        ])
+
+    def test_extract_products(self):
+        html = (
+            '<div class="product-card-container">'
+            '<a aria-label="Poma Golden" href="/products/poma-golden/123"></a>'
+            '<span class="_text_16wi0_1 _text--m_16wi0_23 sc-1fkdssq-0 bwsVzh">2,35\xa0€</span>'
+            '<span class="_text_16wi0_1 _text--m_16wi0_23 sc-1sjeki5-0 asqfi">1kg</span>'
+            '</div>'
+        )
+        products = self.scraper._extract_products(html, "https://www.compraonline.bonpreuesclat.cat")
+        self.assertEqual(products, [("Poma Golden", 2.35, "1kg",
+                                     "https://www.compraonline.bonpreuesclat.cat/products/poma-golden/123")])
+
+    @patch('src.scraper.BonpreuScraper._parse_html')
+    def test_iter_product_pages_pipelined_order(self, mock_parse_html):
+        mock_parse_html.side_effect = lambda url, dynamic_content=False: (
+            f'<div class="product-card-container"><a aria-label="{url}" href="/{url}"></a></div>'
+        )
+        url_list = [f"page{i}" for i in range(20)]
+        self.scraper.max_workers = 1
+        sequential = list(self.scraper._iter_product_pages(url_list))
+        self.scraper.max_workers = 4
+        pipelined = list(self.scraper._iter_product_pages(url_list))
+        self.assertEqual(pipelined, sequential)
+        self.assertEqual([page[0][0] for page in pipelined], url_list)
+
+    @patch('src.scraper.BonpreuScraper._parse_html')
+    def test_iter_product_pages_skips_failed_pages(self, mock_parse_html):
+        def parse_html(url, dynamic_content=False):
+            if url == "page1":
+                raise FetchError(url, "HTTP 503")
+            return f'<div class="product-card-container"><a aria-label="{url}" href="/{url}"></a></div>'
+        mock_parse_html.side_effect = parse_html
+        self.scraper.max_workers = 1
+
+        pages = list(self.scraper._iter_product_pages(["page0", "page1", "page2"]))
+        self.assertEqual([len(products) for products in pages], [1, 0, 1])
+        self.assertEqual(self.scraper.failed_urls, [("page1", "HTTP 503")])
+
+    @patch('src.scraper.BonpreuScraper._parse_html')
+    def test_navigation_shared_between_scrapers(self, mock_parse_html):
+        menu = '<div class="sc-1wz1hmv-0 cmTtoc"><a href="/frescos">Frescos</a><a href="/celler">Celler</a></div>'
+        submenu = '<div class="sc-1wz1hmv-0 cmTtoc"><a href="/fruita">Fruita</a></div>'
+        mock_parse_html.side_effect = lambda url, dynamic_content=False: menu if url.endswith("/categories") else submenu
+        self.scraper._load_categories_section_url = lambda: "https://www.compraonline.bonpreuesclat.cat/categories"
+        other_scraper = BonpreuScraper(base_url="https://www.compraonline.bonpreuesclat.cat", category="Celler",
+                                       navigation=self.scraper.navigation)
+        other_scraper._load_categories_section_url = self.scraper._load_categories_section_url
+
+        self.assertEqual(self.scraper.get_subcategories_names(), ["Fruita"])
+        self.assertEqual(self.scraper.get_subcategories_names(), ["Fruita"])
+        self.assertEqual(other_scraper.get_subcategories_names(), ["Fruita"])
+        # Categories page, Frescos page and Celler page, each downloaded once
+        self.assertEqual(mock_parse_html.call_count, 3)
+
+    @patch('src.scraper.BonpreuScraper._parse_html')
+    def test_incremental_mode_skips_unchanged_pages(self, mock_parse_html):
+        mock_parse_html.return_value = '<div class="product-card-container"><a aria-label="Poma" href="/products/poma/1"></a></div>'
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            self.scraper.fingerprints = FingerprintStore(os.path.join(tmp_dir, "fingerprints.sqlite"))
+            self.scraper.max_workers = 1
+            parse = MagicMock(side_effect=lambda page: self.scraper._extract_products(page, self.scraper.base_url))
+
+            first = self.scraper._get_page_products("page0", parse)
+            self.scraper.fingerprints.put("page0", self.scraper._page_fingerprints.pop("page0"), first)
+            second = self.scraper._get_page_products("page0", parse)
+            self.assertEqual(first, second)
+            self.assertEqual(parse.call_count, 1)
+            self.scraper.fingerprints.close()
+
+    @patch('src.scraper.BonpreuScraper._parse_html')
+    @patch('src.scraper.BonpreuScraper._extract_subcat_structure')
+    def test_get_product_info_streams_rows(self, mock_structure, mock_parse_html):
+        mock_structure.return_value = [["Frescos", "Fruita", None, None, None, "page0"],
+                                       ["Frescos", "Verdura", None, None, None, "page1"]]
+        mock_parse_html.side_effect = lambda url, dynamic_content=False: (
+            f'<div class="product-card-container"><a aria-label="{url}" href="/products/{url}"></a></div>'
+        )
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "Frescos.csv")
+            with CsvSink(path) as sink:
+                df = self.scraper.get_product_info("Fruita", sink=sink)
+            with open(path, encoding='utf-8') as f:
+                lines = f.read().splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertEqual(df["Product Name"].tolist(), ["page0", "page1"])
+        self.assertEqual(df["Subcategory_1"].tolist(), ["Fruita", "Verdura"])
+
+    @patch('src.scraper.BonpreuScraper._parse_html')
+    @patch('src.scraper.BonpreuScraper._extract_subcat_structure')
+    def test_get_product_info_resumes_from_journal(self, mock_structure, mock_parse_html):
+        mock_structure.return_value = [["Frescos", "Fruita", None, None, None, "page0"],
+                                       ["Frescos", "Verdura", None, None, None, "page1"]]
+        page = lambda url: f'<div class="product-card-container"><a aria-label="{url}" href="/products/{url}"></a></div>'
+
+        def fail_page1(url, dynamic_content=False):
+            if url == "page1":
+                raise FetchError(url, "timeout")
+            return page(url)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            journal = CategoryJournal(os.path.join(tmp_dir, "Frescos"))
+            mock_parse_html.side_effect = fail_page1
+            with CsvSink(os.path.join(tmp_dir, "first.csv")) as sink:
+                self.scraper.get_product_info("Fruita", sink=sink, journal=journal)
+            self.assertFalse(journal.done)
+
+            # The resumed run only downloads the failed page and does not crawl the tree again
+            resumed = CategoryJournal(os.path.join(tmp_dir, "Frescos"))
+            scraper = BonpreuScraper(base_url="https://www.compraonline.bonpreuesclat.cat", category="Frescos")
+            mock_structure.reset_mock()
+            mock_parse_html.reset_mock()
+            mock_parse_html.side_effect = lambda url, dynamic_content=False: page(url)
+            with CsvSink(os.path.join(tmp_dir, "resumed.csv")) as sink:
+                df = scraper.get_product_info("Fruita", sink=sink, journal=resumed)
+
+        mock_structure.assert_not_called()
+        self.assertEqual([c.args[0] for c in mock_parse_html.call_args_list], ["page1"])
+        self.assertEqual(df["Product Name"].tolist(), ["page0", "page1"])
+        self.assertTrue(resumed.done)
+
     def test_convert_price(self):
         price_str = "12,34\xa0€"
         price = self.scraper._convert_price(price_str)
@@ -0,0 +1,71 @@
+import unittest
+import os
+import sys
+import tempfile
+# Add the source directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+import pandas as pd
+from sinks import COLUMNS, CsvSink, ParquetSink, DataFrameSink, MultiSink, PYARROW_INSTALLED, snapshot_files, open_sinks
+
+ROWS = [
+    ("Frescos", "Fruita", None, None, None, "Poma, golden", "20241104", 2.35, "1kg", "https://x/products/poma/1", 1.0, "kg", 2.35),
+    ("Frescos", "Fruita", None, None, None, "Pera", "20241104", None, "1kg", "https://x/products/pera/2", 1.0, "kg", None),
+]
+
+class TestSinks(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_csv_sink_matches_pandas(self):
+        path = os.path.join(self.tmp_dir.name, "streamed.csv")
+        with CsvSink(path, flush_every=1) as sink:
+            sink.write_rows(ROWS[:1])
+            # The rows are already on disk before the sink is closed
+            self.assertEqual(len(pd.read_csv(path)), 1)
+            sink.write_rows(ROWS[1:])
+
+        expected_path = os.path.join(self.tmp_dir.name, "pandas.csv")
+        pd.DataFrame(ROWS, columns=COLUMNS).to_csv(expected_path, index=False, encoding='utf-8')
+        with open(path, encoding='utf-8') as streamed, open(expected_path, encoding='utf-8') as expected:
+            self.assertEqual(streamed.read(), expected.read())
+
+    @unittest.skipIf(not PYARROW_INSTALLED, "pyarrow is not installed")
+    def test_parquet_sink(self):
+        path = os.path.join(self.tmp_dir.name, "products.parquet")
+        with ParquetSink(path, row_group_size=1) as sink:
+            sink.write_rows(ROWS)
+        df = pd.read_parquet(path)
+        self.assertEqual(list(df.columns), COLUMNS)
+        self.assertEqual(df["Product Name"].tolist(), ["Poma, golden", "Pera"])
+        self.assertEqual(df["Price"].iloc[0], 2.35)
+
+    def test_multi_sink_and_dataframe(self):
+        dataframe_sink = DataFrameSink()
+        path = os.path.join(self.tmp_dir.name, "products.csv")
+        with MultiSink([CsvSink(path), dataframe_sink]) as sink:
+            sink.write_rows(ROWS)
+        pd.testing.assert_frame_equal(dataframe_sink.to_dataframe(), pd.DataFrame(ROWS, columns=COLUMNS))
+        self.assertEqual(len(pd.read_csv(path)), 2)
+
+    def test_open_sinks_without_any_format(self):
+        # The price store does not keep deltas, so nothing would be written
+        with self.assertRaises(ValueError):
+            open_sinks("Frescos", ["sqlite"], suffix="_delta", data_dir=self.tmp_dir.name)
+
+    def test_snapshot_files(self):
+        for name in ["Frescos_20241104_120000.csv", "Frescos_delta_20241104_120000.csv",
+                     "Frescos_details_20241104_120000.csv", "bonpreu_products_20241104_120000.csv",
+                     "Begudes_20241104_120000.csv", "Begudes_20241104_120000.parquet",
+                     "Frescos_reextract_20241104_090000.csv", "Frescos_reextract_20241104_100000.csv"]:
+            open(os.path.join(self.tmp_dir.name, name), 'w').close()
+        # The most recent re-extraction first
+        self.assertEqual(snapshot_files(self.tmp_dir.name),
+                         ["Frescos_reextract_20241104_100000.csv", "Frescos_reextract_20241104_090000.csv",
+                          "Begudes_20241104_120000.csv", "Frescos_20241104_120000.csv"])
+
+if __name__ == '__main__':
+    unittest.main()
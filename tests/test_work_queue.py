@@ -0,0 +1,122 @@
+import unittest
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+# Add the source directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+import pandas as pd
+from scraper import BonpreuScraper
+from http_session import FetchError
+from work_queue import open_queue, SqliteWorkQueue
+from distributed import Worker, merge_job
+
+FIXTURE_PATH = os.path.join(os.path.dirname(__file__), 'fixtures', 'subcategory_page.html')
+BASE_URL = "https://www.compraonline.bonpreuesclat.cat"
+
+
+def leaves(n):
+    return [["Frescos", f"Sub {i}", None, None, None, f"{BASE_URL}/page{i}"] for i in range(n)]
+
+
+class OfflineScraper(BonpreuScraper):
+    """Scraper reading every page from the test fixture, failing on the URLs ending with "fail"."""
+    def _parse_html(self, url=None, dynamic_content=False):
+        if url.endswith("fail"):
+            raise FetchError(url, "HTTP 500")
+        with open(FIXTURE_PATH, encoding='utf-8') as f:
+            return f.read()
+
+
+def run_worker(queue_path, parts_dir, worker_id):
+    queue = open_queue(queue_path)
+    worker = Worker(queue, lambda category: OfflineScraper(BASE_URL, category, max_workers=2, parser="bs4"),
+                    worker_id=worker_id, batch_size=2, lease_seconds=30, parts_dir=parts_dir, poll_interval=0.1)
+    worker.run()
+    queue.close()
+
+
+class TestWorkQueue(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.queue = open_queue(f"sqlite:///{self.tmp_dir.name}/queue.sqlite", max_attempts=2)
+        self.queue.add_job("job", "Frescos", {'output_name': 'Frescos'}, leaves(3))
+
+    def tearDown(self):
+        self.queue.close()
+        self.tmp_dir.cleanup()
+
+    def test_open_queue(self):
+        self.assertIsInstance(self.queue, SqliteWorkQueue)
+        with self.assertRaises(ValueError):
+            open_queue("redis://localhost:6379/0")
+
+    def test_lease_is_exclusive(self):
+        first = self.queue.lease("a", 2, lease_seconds=30)
+        second = self.queue.lease("b", 2, lease_seconds=30)
+        self.assertEqual([task.index for task in first], [0, 1])
+        self.assertEqual([task.index for task in second], [2])
+        self.assertEqual(first[0].structure, leaves(3)[0])
+        self.assertTrue(self.queue.complete(first[0], "a"))
+        self.assertFalse(self.queue.complete(second[0], "a"))
+        self.assertEqual(self.queue.progress("job"), {'pending': 0, 'leased': 2, 'done': 1, 'failed': 0})
+        self.assertEqual(self.queue.owners("job"), {0: "a"})
+
+    def test_expired_lease_is_requeued(self):
+        crashed = self.queue.lease("crashed", 3, lease_seconds=0.05)
+        time.sleep(0.1)
+        tasks = self.queue.lease("b", 3, lease_seconds=30)
+        self.assertEqual([task.index for task in tasks], [0, 1, 2])
+        self.assertEqual(tasks[0].attempts, 2)
+        # The crashed worker lost its lease
+        self.assertFalse(self.queue.complete(crashed[0], "crashed"))
+        self.assertTrue(self.queue.complete(tasks[0], "b"))
+
+    def test_failures_are_retried_up_to_max_attempts(self):
+        task = self.queue.lease("a", 1, lease_seconds=30)[0]
+        self.queue.fail(task, "a", "HTTP 500")
+        task = self.queue.lease("a", 1, lease_seconds=30)[0]
+        self.assertEqual(task.index, 0)
+        self.queue.fail(task, "a", "HTTP 500")
+        self.assertEqual(self.queue.progress("job")['failed'], 1)
+        self.assertEqual(self.queue.failures("job"), [(f"{BASE_URL}/page0", "HTTP 500")])
+
+
+class TestDistributedCrawl(unittest.TestCase):
+
+    def test_workers_and_merge(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            queue_path = os.path.join(tmp_dir, "queue.sqlite")
+            parts_dir = os.path.join(tmp_dir, "parts")
+            queue = open_queue(queue_path, max_attempts=2)
+            pages = leaves(7)
+            pages[3][-1] = f"{BASE_URL}/fail"
+            queue.add_job("Frescos_20240101_000000", "Frescos",
+                          {'output_name': 'Frescos', 'formats': ['csv'], 'timestamp': '20240101_000000'}, pages)
+            # A worker that crashes while holding a lease
+            queue.lease("crashed", 2, lease_seconds=0.5)
+
+            processes = [multiprocessing.Process(target=run_worker, args=(queue_path, parts_dir, f"worker{i}"))
+                         for i in range(3)]
+            for process in processes:
+                process.start()
+            for process in processes:
+                process.join(timeout=60)
+                self.assertEqual(process.exitcode, 0)
+
+            self.assertEqual(queue.progress(), {'pending': 0, 'leased': 0, 'done': 6, 'failed': 1})
+            self.assertNotIn("crashed", queue.owners("Frescos_20240101_000000").values())
+            n_rows = merge_job(queue, "Frescos_20240101_000000", parts_dir, tmp_dir)
+            queue.close()
+
+            merged = pd.read_csv(os.path.join(tmp_dir, "Frescos_20240101_000000.csv"))
+            self.assertEqual(n_rows, 18)
+            self.assertEqual(len(merged), 18)
+            # Same order as the leaf pages, without the failed one
+            self.assertEqual(list(merged['Subcategory_1'].unique()), ["Sub 0", "Sub 1", "Sub 2", "Sub 4", "Sub 5", "Sub 6"])
+
+
+if __name__ == '__main__':
+    unittest.main()